@@ -0,0 +1,125 @@
+"""Tokens/second and padding of the fine-tuning data prep: notebook vs data_prep.
+
+Generates ``--examples`` interview questions shaped like
+juasdexter/interview_questions (a few hundred tokens each, answer lengths
+spread wide) and
+
+- tokenizes them as the notebook does (one process, 1000 prompts per call
+  like ``dataset.map(..., batched=True)``), with ``tokenize_dataset`` on
+  ``--workers`` processes, and again from its cache
+- reports the padding ratio of shuffled batches padded to their longest
+  (the notebook's collator), of length-bucketed batches and of packing into
+  ``--seq-len`` rows
+- checks on the tiny model that a packed batch gives the same loss as its
+  examples one at a time
+
+The tokenizer is the small one from bench_serving.py unless ``--tokenizer``
+names another (e.g. google/gemma-2b-it), so it runs on a CPU offline.
+
+    python day_2/benchmarks/bench_data_prep.py --examples 20000 --workers 4 --seq-len 2048
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from bench_serving import DAY_2, tiny_model
+from gemma_tools import data_prep
+from gemma_tools.prompts import generate_prompt
+
+LANGUAGES = ["Java", "PHP"]
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+
+
+def make_examples(count, seed=0):
+    with open(os.path.join(DAY_2, "README.md"), encoding="utf-8") as readme:
+        words = np.array(readme.read().split())
+    rng = np.random.default_rng(seed)
+    answer_words = np.clip(rng.lognormal(4.5, 0.8, size=count), 5, 1500).astype(int)
+    return [
+        {
+            "qid": i,
+            "language": LANGUAGES[i % len(LANGUAGES)],
+            "level": LEVELS[i % len(LEVELS)],
+            "question": " ".join(rng.choice(words, size=rng.integers(5, 40))),
+            "answer": " ".join(rng.choice(words, size=answer_words[i])),
+        }
+        for i in range(count)
+    ]
+
+
+def notebook_tokenize(examples, tokenizer, batch_size=1000):
+    prompts = [generate_prompt(example) for example in examples]
+    sequences = []
+    for start in range(0, len(prompts), batch_size):
+        sequences.extend(tokenizer(prompts[start:start + batch_size])["input_ids"])
+    return sequences
+
+
+def check_packed_loss(model, tokenizer, tokenized, examples=8):
+    subset = data_prep.TokenizedPrompts.from_lists([tokenized[i].tolist() for i in range(examples)])
+    packed = data_prep.pack(subset, int(subset.lengths.sum()))
+    batch = data_prep.PackedCollator(tokenizer.pad_token_id)([packed[i] for i in range(len(packed))])
+    total = count = 0
+    with torch.no_grad():
+        packed_loss = model(**batch).loss.item()
+        for i in range(examples):
+            ids = torch.as_tensor(subset[i], dtype=torch.long).unsqueeze(0)
+            total += model(input_ids=ids, labels=ids).loss.item() * (ids.shape[1] - 1)
+            count += ids.shape[1] - 1
+    return packed_loss, total / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--examples", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seq-len", type=int, default=2048, help="packed row length")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--tokenizer", help="hub id or path of a tokenizer to use instead of the tiny one")
+    args = parser.parse_args()
+
+    model, tokenizer = tiny_model()
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    examples = make_examples(args.examples)
+
+    started = time.perf_counter()
+    sequences = notebook_tokenize(examples, tokenizer)
+    seconds = time.perf_counter() - started
+    tokens = sum(len(ids) for ids in sequences)
+    print(f"{args.examples:,} examples, {tokens:,} tokens ({tokens / args.examples:.0f} per example), "
+          f"{os.cpu_count()} CPUs")
+    print(f"  notebook map:            {seconds:6.2f}s {tokens / seconds:>12,.0f} tokens/s")
+    with tempfile.TemporaryDirectory(prefix="token-cache-") as cache_dir:
+        for label in (f"tokenize_dataset x{args.workers}:", "tokenize_dataset cached:"):
+            tokenized = data_prep.tokenize_dataset(examples, tokenizer, cache_dir=cache_dir, workers=args.workers)
+            stats = tokenized.stats
+            print(f"  {label:<24} {stats['seconds']:6.2f}s {stats['tokens_per_second']:>12,.0f} tokens/s")
+    assert tokenized.lengths.tolist() == [len(ids) for ids in sequences]
+
+    lengths = tokenized.lengths
+    print(f"  padding ratio {'batch':>5} {'shuffled':>9} {'bucketed':>9}")
+    for batch_size in args.batch_sizes:
+        shuffled = data_prep.padding_ratio(data_prep.random_batches(len(lengths), batch_size), lengths)
+        bucketed = data_prep.padding_ratio(data_prep.bucket_batches(lengths, batch_size), lengths)
+        print(f"  {'':<13} {batch_size:>5} {shuffled:>9.1%} {bucketed:>9.1%}")
+    started = time.perf_counter()
+    packed = data_prep.pack(tokenized, args.seq_len)
+    print(f"  packed into {len(packed):,} rows of {args.seq_len} in {time.perf_counter() - started:.2f}s: "
+          f"{packed.padding_ratio():.1%} padding, {packed.truncated} examples truncated")
+
+    if not args.tokenizer:
+        packed_loss, separate_loss = check_packed_loss(model, tokenizer, tokenized)
+        print(f"  loss of 8 examples packed {packed_loss:.6f}, one at a time {separate_loss:.6f}")
+
+
+if __name__ == "__main__":
+    main()
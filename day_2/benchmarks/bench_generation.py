@@ -0,0 +1,150 @@
+"""Tokens and wall time per query: generate 1000 tokens and split vs stopping early.
+
+Trains the tiny model from bench_serving.py for ``--train-steps`` steps (a
+minute or so on a CPU) to answer like the notebook's model at its worst:
+an ``Answer:`` and an ``Analysis:`` section, then on into made-up
+``Question:``/``Answer:``/``Analysis:`` rounds without ever ending its turn.
+Then each of ``--queries`` queries is answered four ways:
+
+- notebook: ``model.generate(max_new_tokens=1000)``, decode, keep
+  ``split('Analysis:')[-1]``
+- generate+StopOnText: the same call with a ``StopOnText`` stopping criterion
+- Generator: incremental decoding with the ``StopCondition``, no prefix cache
+- Generator+prefix: the same, reusing the template prefix's KV cache
+
+The stop condition ends the text at ``Question:`` or at a second
+``Analysis:``. Decoding is greedy (``--sample`` samples as the notebook
+does), so each early-stopped text is checked to be the start of the
+notebook's full generation.
+
+    python day_2/benchmarks/bench_generation.py --queries 10 --max-new-tokens 1000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import torch
+from transformers import StoppingCriteriaList
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from bench_serving import DAY_2, tiny_model
+from gemma_tools.generation import Generator, StopCondition, StopOnText
+from gemma_tools.prompts import inference_prompt
+
+STOP = StopCondition(stop_strings=["Question:"], section_markers=["Analysis:"], max_sections=1)
+
+
+def readme_sentences():
+    with open(os.path.join(DAY_2, "README.md"), encoding="utf-8") as readme:
+        text = re.sub(r"[`#*\[\]()]", "", readme.read())
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if 20 < len(s.strip()) < 160]
+
+
+def interview_query(question):
+    # As in the notebook's example query
+    return f"\n\n Please answer the following interview question:\n        {question}"
+
+
+def train_rambler(model, tokenizer, steps, seed=0, batch_size=8, max_length=384):
+    """Teach ``model`` to answer in sections and then keep inventing questions."""
+    sentences = readme_sentences()
+    rng = np.random.default_rng(seed)
+
+    def sample():
+        body = f"Answer: {rng.choice(sentences)}\nAnalysis: {rng.choice(sentences)} {rng.choice(sentences)}\n"
+        while len(body) < 1500:
+            body += f"Question: {rng.choice(sentences)}\nAnswer: {rng.choice(sentences)}\nAnalysis: {rng.choice(sentences)}\n"
+        return inference_prompt(interview_query(rng.choice(sentences))) + body
+
+    torch.manual_seed(seed)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=3e-3)
+    model.train()
+    for _ in range(steps):
+        batch = tokenizer([sample() for _ in range(batch_size)], return_tensors="pt", padding=True,
+                          truncation=True, max_length=max_length).to(model.device)
+        labels = batch["input_ids"].masked_fill(batch["attention_mask"] == 0, -100)
+        model(**batch, labels=labels).loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+    return model.eval()
+
+
+def notebook(model, tokenizer, query, max_new_tokens, sample, stopping_criteria=None):
+    inputs = tokenizer(inference_prompt(query), return_tensors="pt", add_special_tokens=True).to(model.device)
+    with torch.no_grad():
+        output = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=sample,
+                                pad_token_id=tokenizer.eos_token_id, stopping_criteria=stopping_criteria)
+    new_tokens = output[0, inputs["input_ids"].shape[1]:]
+    return tokenizer.decode(new_tokens, skip_special_tokens=True), len(new_tokens), inputs["input_ids"].shape[1], 0
+
+
+def with_stop_on_text(model, tokenizer, query, max_new_tokens, sample):
+    prompt_length = len(tokenizer(inference_prompt(query))["input_ids"])
+    criteria = StoppingCriteriaList([StopOnText(tokenizer, prompt_length, STOP)])
+    text, tokens, prompt_tokens, reused = notebook(model, tokenizer, query, max_new_tokens, sample, criteria)
+    cut = STOP.find(text)
+    return (text if cut is None else text[:cut]), tokens, prompt_tokens, reused
+
+
+def with_generator(generator):
+    def answer(model, tokenizer, query, max_new_tokens, sample):
+        result = generator.get_completion(query, max_new_tokens=max_new_tokens, temperature=1.0 if sample else 0)
+        return result.text, len(result.token_ids), result.prompt_tokens, result.reused_tokens
+
+    return answer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--max-new-tokens", type=int, default=1000)
+    parser.add_argument("--train-steps", type=int, default=200)
+    parser.add_argument("--sample", action="store_true", help="sample (do_sample=True) instead of greedy decoding")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    model, tokenizer = tiny_model(hidden_size=128)
+    model.to(args.device)
+    started = time.perf_counter()
+    train_rambler(model, tokenizer, args.train_steps)
+    print(f"trained the tiny model for {args.train_steps} steps in {time.perf_counter() - started:.0f}s")
+    rng = np.random.default_rng(1)
+    queries = [interview_query(q) for q in rng.choice(readme_sentences(), size=args.queries)]
+
+    modes = [
+        ("notebook", notebook),
+        ("generate+StopOnText", with_stop_on_text),
+        ("Generator", with_generator(Generator(model, tokenizer, prefix=None, stop=STOP))),
+        ("Generator+prefix", with_generator(Generator(model, tokenizer, stop=STOP))),
+    ]
+    print(f"  {'mode':<20} {'tokens/query':>12} {'s/query':>8} {'prefill tokens':>15} {'answer':>7} {'prefix of full':>15}")
+    full_texts = None
+    for label, answer in modes:
+        answer(model, tokenizer, queries[0], 8, args.sample)  # warm up
+        tokens = prompt_tokens = reused = 0
+        texts = []
+        started = time.perf_counter()
+        for query in queries:
+            torch.manual_seed(0)
+            text, generated, prompt, from_cache = answer(model, tokenizer, query, args.max_new_tokens, args.sample)
+            texts.append(text)
+            tokens += generated
+            prompt_tokens += prompt
+            reused += from_cache
+        seconds = (time.perf_counter() - started) / len(queries)
+        if full_texts is None:
+            full_texts = texts
+        answers = sum("Analysis:" in text for text in texts)
+        same_start = "-" if args.sample else f"{sum(full.startswith(t) for full, t in zip(full_texts, texts))}/{len(texts)}"
+        print(f"  {label:<20} {tokens / len(queries):>12.0f} {seconds:>8.3f} "
+              f"{(prompt_tokens - reused) / len(queries):>9.0f} of {prompt_tokens / len(queries):>3.0f} "
+              f"{answers:>3}/{len(texts):<3} {same_start:>15}")
+    print("  answer: texts with an Analysis: section to keep with split('Analysis:')[-1]")
+
+
+if __name__ == "__main__":
+    main()
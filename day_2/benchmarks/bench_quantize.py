@@ -0,0 +1,151 @@
+"""Latency, tokens/second, RSS and output agreement: int8 dynamic quantization vs float32 on CPU.
+
+Without ``--model``, builds a Llama of ``--hidden-size``/``--layers`` with
+the tokenizer from bench_serving.py and trains it for ``--train-steps``
+steps with bench_generation.py's rambler. The training gives it confident
+predictions to agree or disagree on. It is saved like the merged model.
+Each of these then runs in a fresh process, so its peak RSS is its own:
+
+- fp32: ``load_model(device="cpu")`` as a CPU node would without quantization
+- quantize: load, ``quantize_model`` and ``save_quantized`` (once per model)
+- int8: ``load_quantized`` from that artifact
+
+fp32 and int8 answer the same ``--queries`` greedily with exactly
+``--max-new-tokens`` tokens each. Their generations are compared (identical,
+and tokens before the first difference), as are their teacher-forced
+next-token predictions on the fp32 outputs.
+
+    python day_2/benchmarks/bench_quantize.py --hidden-size 1024 --layers 4 --queries 4 --max-new-tokens 32
+    python day_2/benchmarks/bench_quantize.py --model merged_model --train-steps 0
+"""
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from bench_generation import interview_query, readme_sentences, train_rambler
+from bench_serving import tiny_model
+from gemma_tools.evaluation import load_model
+from gemma_tools.prompts import inference_prompt
+from gemma_tools.quantize import WEIGHTS, load_quantized, quantize_merged_model
+
+# ru_maxrss is in KiB on Linux and bytes on macOS
+RSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+
+def build_model(path, hidden_size, layers, train_steps):
+    # Runs in a fresh process, so training memory doesn't count towards the others' peak RSS
+    model, tokenizer = tiny_model(hidden_size=hidden_size, layers=layers)
+    started = time.perf_counter()
+    train_rambler(model, tokenizer, train_steps, batch_size=4, max_length=256)
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return sum(p.numel() for p in model.parameters()), time.perf_counter() - started
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_SCALE
+
+
+def run(mode, path, queries, max_new_tokens, reference=None):
+    # Runs in a fresh process
+    started = time.perf_counter()
+    if mode == "int8":
+        model, tokenizer = load_quantized(path)
+    else:
+        model, tokenizer = load_model(path, device="cpu")
+    load_seconds = time.perf_counter() - started
+    outputs = []
+    latencies = []
+    with torch.no_grad():
+        for query in queries:
+            inputs = tokenizer(inference_prompt(query), return_tensors="pt")
+            started = time.perf_counter()
+            output = model.generate(**inputs, max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens,
+                                    do_sample=False, pad_token_id=tokenizer.pad_token_id)
+            latencies.append(time.perf_counter() - started)
+            outputs.append(output[0].tolist())
+        # Next-token predictions along the reference (fp32) sequences
+        predictions = [model(torch.tensor([ids])).logits[0].argmax(-1).tolist() for ids in (reference or outputs)]
+    return {
+        "load_seconds": load_seconds,
+        "latencies": latencies,
+        "outputs": outputs,
+        "predictions": predictions,
+        "rss": peak_rss(),
+    }
+
+
+def quantize(path, out_dir):
+    started = time.perf_counter()
+    quantize_merged_model(path, out_dir)
+    return {"seconds": time.perf_counter() - started, "rss": peak_rss(),
+            "bytes": os.path.getsize(os.path.join(out_dir, WEIGHTS))}
+
+
+def in_fresh_process(fn, *args, **kwargs):
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args, **kwargs).result()
+
+
+def common_prefix(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", help="a saved model (e.g. merged_model) instead of the trained stand-in")
+    parser.add_argument("--hidden-size", type=int, default=1024)
+    parser.add_argument("--layers", type=int, default=6)
+    parser.add_argument("--train-steps", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="quantize-") as tmp:
+        path = args.model
+        if path is None:
+            path = os.path.join(tmp, "fp32")
+            parameters, seconds = in_fresh_process(build_model, path, args.hidden_size, args.layers, args.train_steps)
+            print(f"{parameters / 1e6:.0f}M parameter Llama, trained for {args.train_steps} steps in {seconds:.0f}s")
+        rng = np.random.default_rng(1)
+        queries = [interview_query(q) for q in rng.choice(readme_sentences(), size=args.queries)]
+        int8_path = os.path.join(tmp, "int8")
+
+        fp32 = in_fresh_process(run, "fp32", path, queries, args.max_new_tokens)
+        quantized = in_fresh_process(quantize, path, int8_path)
+        int8 = in_fresh_process(run, "int8", int8_path, queries, args.max_new_tokens, reference=fp32["outputs"])
+
+        print(f"quantized in {quantized['seconds']:.1f}s (peak RSS {quantized['rss'] / 2**20:.0f}MB), "
+              f"artifact {quantized['bytes'] / 2**20:.0f}MB")
+        print(f"  {'mode':<5} {'load':>7} {'p50 latency':>12} {'tokens/s':>9} {'peak RSS':>9}")
+        for label, result in (("fp32", fp32), ("int8", int8)):
+            tokens = args.max_new_tokens * len(queries)
+            print(f"  {label:<5} {result['load_seconds']:>6.2f}s {np.median(result['latencies']):>11.3f}s "
+                  f"{tokens / sum(result['latencies']):>9.1f} {result['rss'] / 2**20:>7.0f}MB")
+        identical = sum(a == b for a, b in zip(fp32["outputs"], int8["outputs"]))
+        prompt_lengths = [len(a) - args.max_new_tokens for a in fp32["outputs"]]
+        agree = [common_prefix(a[n:], b[n:]) for a, b, n in zip(fp32["outputs"], int8["outputs"], prompt_lengths)]
+        matches = sum(int(np.sum(np.array(a) == np.array(b))) for a, b in zip(fp32["predictions"], int8["predictions"]))
+        total = sum(len(a) for a in fp32["predictions"])
+        print(f"  agreement: {identical}/{len(queries)} generations identical, "
+              f"{np.mean(agree):.1f} of {args.max_new_tokens} tokens before the first difference on average, "
+              f"{matches / total:.1%} of teacher-forced next-token predictions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Throughput and latency of the batching server vs one generate() per query.
+
+Gemma-2b is too big to benchmark on every machine, so this builds a tiny,
+randomly initialised Llama (the architecture family Gemma belongs to) and a
+byte-level BPE tokenizer trained on day_2/README.md with Gemma's turn
+markers. It runs offline on a CPU in seconds. ``--requests`` queries with
+``max_new_tokens`` drawn from 16..``--max-new-tokens`` are sent at each
+``--concurrency`` level:
+
+- sequential: the notebook's ``get_completion`` behind a lock, one blocking
+  ``model.generate`` at a time (what serving it as-is gives)
+- batched: ``BatchingEngine``, streaming; through ``InferenceServer`` over
+  HTTP with ``--http``
+
+Requests/s, generated tokens/s and p50/p95 of latency and time to first
+token are reported for each level. Both sides decode greedily, so the
+batched answers are also compared with the sequential ones.
+
+    python day_2/benchmarks/bench_serving.py --concurrency 1 4 16 32 --requests 64
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+DAY_2 = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(DAY_2)
+
+from gemma_tools.prompts import inference_prompt
+from gemma_tools.serving import BatchingEngine, InferenceServer
+
+SPECIAL_TOKENS = ["<pad>", "<eos>", "<bos>", "<unk>", "<start_of_turn>", "<end_of_turn>"]
+
+
+def tiny_model(vocab_size=2000, hidden_size=64, layers=2, seed=0):
+    """A small random Llama and a BPE tokenizer with Gemma's special tokens, built offline."""
+    with open(os.path.join(DAY_2, "README.md"), encoding="utf-8") as readme:
+        corpus = [readme.read(), inference_prompt("")]
+    bpe = Tokenizer(models.BPE(unk_token="<unk>"))
+    bpe.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    bpe.decoder = decoders.ByteLevel()
+    bpe.train_from_iterator(corpus, trainers.BpeTrainer(vocab_size=vocab_size, special_tokens=SPECIAL_TOKENS,
+                                                        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=bpe, pad_token="<pad>", eos_token="<eos>",
+                                        bos_token="<bos>", unk_token="<unk>")
+    torch.manual_seed(seed)
+    config = LlamaConfig(vocab_size=len(tokenizer), hidden_size=hidden_size, intermediate_size=hidden_size * 2,
+                         num_hidden_layers=layers, num_attention_heads=4, num_key_value_heads=2,
+                         max_position_embeddings=4096, pad_token_id=tokenizer.pad_token_id,
+                         bos_token_id=tokenizer.bos_token_id, eos_token_id=tokenizer.eos_token_id)
+    return LlamaForCausalLM(config).eval(), tokenizer
+
+
+def make_queries(count, max_new_tokens, seed=0):
+    """``(query, max_new_tokens)`` pairs of varied lengths, from README words."""
+    with open(os.path.join(DAY_2, "README.md"), encoding="utf-8") as readme:
+        words = readme.read().split()
+    rng = np.random.default_rng(seed)
+    return [
+        (" ".join(rng.choice(words, size=rng.integers(5, 80))), int(rng.integers(16, max_new_tokens + 1)))
+        for _ in range(count)
+    ]
+
+
+def sequential_client(model, tokenizer, stop_token_ids):
+    lock = threading.Lock()
+
+    def ask(query, max_new_tokens):
+        started = time.perf_counter()
+        with lock:
+            inputs = tokenizer(inference_prompt(query), return_tensors="pt").to(model.device)
+            with torch.no_grad():
+                output = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                        pad_token_id=tokenizer.pad_token_id, eos_token_id=sorted(stop_token_ids))
+        new_tokens = output[0, inputs["input_ids"].shape[1]:]
+        new_tokens = new_tokens[~torch.isin(new_tokens, torch.tensor(sorted(stop_token_ids)))]
+        latency = time.perf_counter() - started
+        # Nothing is seen before generate() returns
+        return tokenizer.decode(new_tokens, skip_special_tokens=True), len(new_tokens), latency, latency
+
+    return ask
+
+
+def engine_client(engine):
+    def ask(query, max_new_tokens):
+        started = time.perf_counter()
+        completion = engine.submit(inference_prompt(query), max_new_tokens=max_new_tokens, temperature=0)
+        first = None
+        parts = []
+        for text in completion:
+            if first is None:
+                first = time.perf_counter() - started
+            parts.append(text)
+        latency = time.perf_counter() - started
+        return "".join(parts), len(completion.token_ids), latency, first if first is not None else latency
+
+    return ask
+
+
+def http_client(url):
+    def ask(query, max_new_tokens):
+        started = time.perf_counter()
+        body = json.dumps({"query": query, "max_tokens": max_new_tokens, "temperature": 0, "stream": True})
+        request = urllib.request.Request(f"{url}/completions", body.encode("utf-8"),
+                                         {"Content-Type": "application/json"})
+        first = None
+        parts = []
+        chunks = 0
+        with urllib.request.urlopen(request) as response:
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b"data: ") or line == b"data: [DONE]":
+                    continue
+                text = json.loads(line[6:])["choices"][0]["text"]
+                if text:
+                    if first is None:
+                        first = time.perf_counter() - started
+                    parts.append(text)
+                    chunks += 1
+        latency = time.perf_counter() - started
+        # Streamed chunks stand in for tokens; a chunk can hold a few
+        return "".join(parts), chunks, latency, first if first is not None else latency
+
+    return ask
+
+
+def run_level(ask, queries, concurrency):
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda q: ask(*q), queries))
+    elapsed = time.perf_counter() - started
+    latencies = [r[2] for r in results]
+    firsts = [r[3] for r in results]
+    return {
+        "texts": [r[0] for r in results],
+        "requests_per_second": len(results) / elapsed,
+        "tokens_per_second": sum(r[1] for r in results) / elapsed,
+        "latency": (statistics.median(latencies), float(np.percentile(latencies, 95))),
+        "first_token": (statistics.median(firsts), float(np.percentile(firsts, 95))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--max-batch-tokens", type=int, default=8192)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--hidden-size", type=int, default=64)
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--http", action="store_true", help="go through InferenceServer instead of the engine")
+    args = parser.parse_args()
+
+    model, tokenizer = tiny_model(hidden_size=args.hidden_size, layers=args.layers)
+    model.to(args.device)
+    queries = make_queries(args.requests, args.max_new_tokens)
+    engine = BatchingEngine(model, tokenizer, max_batch_tokens=args.max_batch_tokens,
+                            max_batch_size=args.max_batch_size, temperature=0)
+    server = InferenceServer(engine) if args.http else None
+    (server or engine).start()
+    try:
+        ask_batched = http_client(server.url) if server else engine_client(engine)
+        ask_sequential = sequential_client(model, tokenizer, engine.stop_token_ids)
+        # Warm up both paths
+        ask_sequential(*queries[0])
+        ask_batched(*queries[0])
+        print(f"tiny Llama ({sum(p.numel() for p in model.parameters()) / 1e6:.1f}M parameters) on {args.device}, "
+              f"{args.requests} requests per level{', over HTTP' if server else ''}")
+        print(f"  {'mode':<11} {'conc':>4} {'req/s':>7} {'tok/s':>8} {'p50 lat':>8} {'p95 lat':>8} "
+              f"{'p50 ttft':>9} {'p95 ttft':>9} {'batch':>6}")
+        for concurrency in args.concurrency:
+            sequential = run_level(ask_sequential, queries, concurrency)
+            before = engine.stats.copy()
+            batched = run_level(ask_batched, queries, concurrency)
+            batches = engine.stats["batches"] - before["batches"]
+            mean_batch = (engine.stats["requests"] - before["requests"]) / max(batches, 1)
+            for label, result, batch in (("sequential", sequential, 1.0), ("batched", batched, mean_batch)):
+                print(f"  {label:<11} {concurrency:>4} {result['requests_per_second']:>7.1f} "
+                      f"{result['tokens_per_second']:>8.0f} {result['latency'][0]:>7.2f}s {result['latency'][1]:>7.2f}s "
+                      f"{result['first_token'][0]:>8.3f}s {result['first_token'][1]:>8.3f}s {batch:>6.1f}")
+            same = sum(a == b for a, b in zip(sequential["texts"], batched["texts"]))
+            print(f"  {'':<11} {'':>4} batched answers identical to sequential: {same}/{len(queries)}")
+    finally:
+        (server or engine).stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Shared helpers for the day 2 Gemma notebooks (fine-tuning and inference).
+
+The notebooks run from ``day_2/`` (or put it on ``sys.path``) and import
+from here, e.g. ``from gemma_tools.evaluation import EvaluationEngine``.
+Everything here works with the model on CPU as well as CUDA.
+"""
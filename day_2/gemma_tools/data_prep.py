@@ -0,0 +1,350 @@
+"""Tokenize the fine-tuning prompts once, in parallel, and batch them with little padding.
+
+The fine-tune notebook tokenizes with
+``dataset.map(lambda samples: tokenizer(samples["prompt"]), batched=True)``
+on one process, on every run, and each batch is then padded to its longest
+example. Here:
+
+- ``tokenize_dataset`` builds the prompts with ``generate_prompt`` and
+  tokenizes them on ``workers`` processes; the result is stored under
+  ``cache_dir`` keyed by the tokenizer, ``PROMPT_VERSION`` and the data,
+  so later runs load it instead
+- ``pack`` fills fixed-length sequences with whole examples (best fit,
+  longest first); ``PackedCollator`` gives each one position ids that
+  restart per example and a block-diagonal causal mask, so examples never
+  attend to each other and no loss is taken across a boundary
+- ``bucket_batches`` groups examples of similar length for unpacked
+  training, and ``pad_batch`` pads each batch only to its own longest
+- ``padding_ratio`` and the ``stats`` of a tokenization measure the result
+
+    tokenized = tokenize_dataset(dataset["train"], tokenizer, cache_dir=".token_cache")
+    print(tokenized.stats)  # prompts, tokens, seconds, tokens_per_second, cached
+    packed = pack(tokenized, seq_len=2048)
+    trainer = transformers.Trainer(model=model, train_dataset=packed,
+                                   data_collator=PackedCollator(tokenizer.pad_token_id, torch.bfloat16), ...)
+
+Packed rows hold more than one example, so train with a batch size that
+counts sequences of ``seq_len`` tokens, not examples.
+"""
+import bisect
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+from gemma_tools.prompts import PROMPT_VERSION, generate_prompt
+
+IGNORE_INDEX = -100
+
+
+def tokenizer_fingerprint(tokenizer):
+    """A hash of everything that decides how ``tokenizer`` splits text."""
+    digest = hashlib.sha256()
+    digest.update(type(tokenizer).__name__.encode("utf-8"))
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        digest.update(backend.to_str().encode("utf-8"))
+    else:
+        digest.update(json.dumps(tokenizer.get_vocab(), sort_keys=True).encode("utf-8"))
+    settings = {
+        "name": tokenizer.name_or_path,
+        "special_tokens": tokenizer.special_tokens_map,
+        "add_bos_token": getattr(tokenizer, "add_bos_token", None),
+        "add_eos_token": getattr(tokenizer, "add_eos_token", None),
+    }
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(data_points):
+    digest = hashlib.sha256()
+    for data_point in data_points:
+        digest.update(json.dumps(dict(data_point), sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class TokenizedPrompts:
+    """Token ids of many prompts in one flat array; ``tokenized[i]`` is prompt i's ids."""
+
+    def __init__(self, tokens, offsets, stats=None):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.stats = stats or {}
+
+    @classmethod
+    def from_lists(cls, sequences, stats=None):
+        lengths = np.fromiter((len(ids) for ids in sequences), dtype=np.int64, count=len(sequences))
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        tokens = np.fromiter((t for ids in sequences for t in ids), dtype=np.int32, count=int(offsets[-1]))
+        return cls(tokens, offsets, stats)
+
+    @classmethod
+    def concatenate(cls, parts):
+        tokens = np.concatenate([part.tokens for part in parts]) if parts else np.zeros(0, dtype=np.int32)
+        lengths = np.concatenate([part.lengths for part in parts]) if parts else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(tokens, offsets)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def save(self, path):
+        # Written under a temporary name, so a crash never leaves a truncated cache entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as cache_file:
+                np.savez(cache_file, tokens=self.tokens, offsets=self.offsets)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(arrays["tokens"], arrays["offsets"])
+
+
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer):
+    global _worker_tokenizer
+    # Parallelism comes from the processes; keep each one's tokenizer on one thread
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    _worker_tokenizer = tokenizer
+
+
+def _tokenize_chunk(prompts):
+    return TokenizedPrompts.from_lists(_worker_tokenizer(prompts)["input_ids"])
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def tokenize_prompts(prompts, tokenizer, workers=None, chunk_size=2000):
+    """Tokenize ``prompts`` on ``workers`` processes (1: in this one); returns ``TokenizedPrompts``."""
+    prompts = list(prompts)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    if workers == 1 or len(prompts) <= chunk_size:
+        tokenized = TokenizedPrompts.from_lists(tokenizer(prompts)["input_ids"])
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                    initargs=(tokenizer,)) as pool:
+            tokenized = TokenizedPrompts.concatenate(list(pool.map(_tokenize_chunk, _chunks(prompts, chunk_size))))
+    seconds = time.perf_counter() - started
+    tokenized.stats = {
+        "prompts": len(tokenized),
+        "tokens": len(tokenized.tokens),
+        "seconds": seconds,
+        "tokens_per_second": len(tokenized.tokens) / seconds if seconds else 0.0,
+        "cached": False,
+    }
+    return tokenized
+
+
+def tokenize_dataset(data_points, tokenizer, cache_dir=None, workers=None, prompt_fn=generate_prompt,
+                     prompt_version=PROMPT_VERSION):
+    """``generate_prompt`` for each data point, tokenized, from ``cache_dir`` when it was done before.
+
+    Pass a new ``prompt_version`` with a different ``prompt_fn``; the cache
+    can't tell two prompt functions apart.
+    """
+    data_points = list(data_points)
+    path = None
+    if cache_dir is not None:
+        key = hashlib.sha256(json.dumps({
+            "tokenizer": tokenizer_fingerprint(tokenizer),
+            "prompt_version": prompt_version,
+            "data": dataset_fingerprint(data_points),
+        }, sort_keys=True).encode("utf-8")).hexdigest()
+        path = os.path.join(cache_dir, f"{key}.npz")
+        if os.path.exists(path):
+            started = time.perf_counter()
+            tokenized = TokenizedPrompts.load(path)
+            seconds = time.perf_counter() - started
+            tokenized.stats = {
+                "prompts": len(tokenized),
+                "tokens": len(tokenized.tokens),
+                "seconds": seconds,
+                "tokens_per_second": len(tokenized.tokens) / seconds if seconds else 0.0,
+                "cached": True,
+            }
+            return tokenized
+    tokenized = tokenize_prompts([prompt_fn(data_point) for data_point in data_points], tokenizer, workers=workers)
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tokenized.save(path)
+    return tokenized
+
+
+class PackedSequences:
+    """Examples packed into rows of ``seq_len`` tokens; ``packed[i]`` is a dict of row i's arrays.
+
+    Each row has ``input_ids`` (padding at the end), ``segment_ids`` (1, 2,
+    ... per example, 0 for padding) and ``position_ids`` (restarting at 0
+    for every example).
+    """
+
+    def __init__(self, tokenized, rows, seq_len, truncated):
+        self.tokenized = tokenized
+        self.rows = rows
+        self.seq_len = seq_len
+        self.truncated = truncated
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        input_ids = np.zeros(self.seq_len, dtype=np.int64)
+        segment_ids = np.zeros(self.seq_len, dtype=np.int64)
+        position_ids = np.zeros(self.seq_len, dtype=np.int64)
+        start = 0
+        for segment, example in enumerate(self.rows[i], start=1):
+            ids = self.tokenized[example][:self.seq_len]
+            input_ids[start:start + len(ids)] = ids
+            segment_ids[start:start + len(ids)] = segment
+            position_ids[start:start + len(ids)] = np.arange(len(ids))
+            start += len(ids)
+        return {"input_ids": input_ids, "segment_ids": segment_ids, "position_ids": position_ids}
+
+    @property
+    def used_tokens(self):
+        return int(np.minimum(self.tokenized.lengths, self.seq_len).sum())
+
+    def padding_ratio(self):
+        """The fraction of the packed rows' tokens that are padding."""
+        return 1 - self.used_tokens / (len(self.rows) * self.seq_len) if self.rows else 0.0
+
+
+def pack(tokenized, seq_len):
+    """Pack every example into as few rows of ``seq_len`` tokens as best-fit, longest first, manages.
+
+    Examples longer than ``seq_len`` are cut to it (``truncated`` counts them).
+    """
+    lengths = np.minimum(tokenized.lengths, seq_len)
+    rows = []
+    # (space left, row) for every row that still has room, smallest space first
+    free = []
+    for example in np.argsort(-lengths, kind="stable"):
+        length = int(lengths[example])
+        slot = bisect.bisect_left(free, (length, -1))
+        if slot < len(free):
+            space, row = free.pop(slot)
+        else:
+            space, row = seq_len, len(rows)
+            rows.append([])
+        rows[row].append(int(example))
+        if space - length:
+            bisect.insort(free, (space - length, row))
+    truncated = int((tokenized.lengths > seq_len).sum())
+    return PackedSequences(tokenized, rows, seq_len, truncated)
+
+
+def packed_attention_mask(segment_ids, dtype=torch.float32):
+    """Block-diagonal causal masks, ``(batch, 1, seq, seq)``, in the additive form models take as-is.
+
+    Position i attends to j <= i of its own example; padding attends to
+    padding so no row is fully masked.
+    """
+    seq_len = segment_ids.shape[1]
+    causal = torch.ones(seq_len, seq_len, dtype=torch.bool, device=segment_ids.device).tril()
+    allowed = (segment_ids.unsqueeze(2) == segment_ids.unsqueeze(1)) & causal
+    mask = torch.zeros(allowed.shape, dtype=dtype, device=segment_ids.device)
+    return mask.masked_fill_(~allowed, torch.finfo(dtype).min).unsqueeze(1)
+
+
+class PackedCollator:
+    """Stacks ``PackedSequences`` rows into model inputs with labels.
+
+    Labels skip padding and each example's first token, which would
+    otherwise be predicted from the previous example. With ``flatten`` the
+    4D mask is left out and only ``position_ids`` mark the boundaries, which
+    is what flash-attention-2 models use.
+    """
+
+    def __init__(self, pad_token_id, mask_dtype=torch.float32, flatten=False):
+        self.pad_token_id = pad_token_id
+        self.mask_dtype = mask_dtype
+        self.flatten = flatten
+
+    def __call__(self, rows):
+        segment_ids = torch.from_numpy(np.stack([row["segment_ids"] for row in rows]))
+        input_ids = torch.from_numpy(np.stack([row["input_ids"] for row in rows]))
+        position_ids = torch.from_numpy(np.stack([row["position_ids"] for row in rows]))
+        input_ids = input_ids.masked_fill(segment_ids == 0, self.pad_token_id)
+        labels = input_ids.masked_fill((segment_ids == 0) | (position_ids == 0), IGNORE_INDEX)
+        batch = {"input_ids": input_ids, "labels": labels, "position_ids": position_ids}
+        if not self.flatten:
+            batch["attention_mask"] = packed_attention_mask(segment_ids, self.mask_dtype)
+        return batch
+
+
+def bucket_batches(lengths, batch_size, window=64, seed=0):
+    """Batches of example indices with similar lengths, in random order.
+
+    Examples are shuffled, sorted by length within windows of
+    ``window`` batches and cut into batches, and the batches shuffled, so
+    each epoch (pass another ``seed``) still sees a different order.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = np.asarray(lengths)
+    order = rng.permutation(len(lengths))
+    batches = []
+    span = batch_size * window
+    for start in range(0, len(order), span):
+        chunk = order[start:start + span]
+        chunk = chunk[np.argsort(-lengths[chunk], kind="stable")]
+        batches.extend(chunk[i:i + batch_size].tolist() for i in range(0, len(chunk), batch_size))
+    rng.shuffle(batches)
+    return batches
+
+
+def random_batches(count, batch_size, seed=0):
+    """Batches in plain shuffled order, as a DataLoader with ``shuffle=True`` makes them."""
+    order = np.random.default_rng(seed).permutation(count)
+    return [order[i:i + batch_size].tolist() for i in range(0, count, batch_size)]
+
+
+def pad_batch(sequences, pad_token_id, pad_to_multiple_of=None):
+    """Right-pad ``sequences`` to the longest of them: input_ids, attention_mask and labels."""
+    width = max(len(ids) for ids in sequences)
+    if pad_to_multiple_of:
+        width = -(-width // pad_to_multiple_of) * pad_to_multiple_of
+    input_ids = torch.full((len(sequences), width), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), width), dtype=torch.long)
+    for row, ids in enumerate(sequences):
+        input_ids[row, :len(ids)] = torch.as_tensor(ids, dtype=torch.long)
+        attention_mask[row, :len(ids)] = 1
+    labels = input_ids.masked_fill(attention_mask == 0, IGNORE_INDEX)
+    return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+def padding_ratio(batches, lengths, pad_to_multiple_of=None):
+    """The fraction of padded batch slots that are padding, each batch padded to its longest."""
+    lengths = np.asarray(lengths)
+    slots = 0
+    for batch in batches:
+        width = int(lengths[batch].max())
+        if pad_to_multiple_of:
+            width = -(-width // pad_to_multiple_of) * pad_to_multiple_of
+        slots += width * len(batch)
+    total = int(sum(lengths[batch].sum() for batch in batches))
+    return 1 - total / slots if slots else 0.0
@@ -0,0 +1,310 @@
+"""Generate-once, batched evaluation of the base and fine-tuned Gemma models.
+
+The notebook's ``calculate_semantic_similarity``, ``calculate_bleu``,
+``compute_rouge`` and ``compute_meteor`` each call ``model.generate`` one
+example at a time on ``"cuda"``, so every metric regenerates the same
+outputs. ``EvaluationEngine`` generates once per model instead:
+
+- prompts are tokenized once, sorted by length and generated in
+  left-padded batches of ``batch_size`` (greedy by default, so the outputs
+  are reproducible)
+- every completion is stored in a SQLite file keyed by model id, prompt and
+  generation config, so later metrics, re-runs and restarted notebooks read
+  it back instead of generating again
+- the metrics are computed from those stored completions, and perplexity
+  and the semantic-similarity embeddings run as padded forward passes of at
+  most ``max_batch_tokens`` tokens
+
+The model runs wherever it was loaded (``load_model`` picks CUDA when
+available and falls back to CPU).
+
+    base = EvaluationEngine(base_model, base_tokenizer, base_model_id)
+    tuned = EvaluationEngine(finetuned_model, finetuned_tokenizer, finetuned_model_id)
+    for name, engine in [("Non-finetuned", base), ("Finetuned", tuned)]:
+        print(name, engine.evaluate(test_data_subset))
+
+Generation prompts end at ``<start_of_turn>model`` (see
+``prompts.generation_prompt``); the notebook generated from the full
+training prompt, which already contains the reference answer, and scored the
+decoded prompt together with the completion. Scores are therefore not
+comparable with the notebook's old numbers.
+"""
+import collections
+import contextlib
+import functools
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from gemma_tools.prompts import generation_prompt
+
+DEFAULT_GENERATION = {"max_new_tokens": 1000, "do_sample": False}
+METRICS = ("perplexity", "semantic_similarity", "bleu", "rouge", "meteor")
+
+
+def resolve_device(device=None):
+    """``device`` if given, else ``"cuda"`` when available, else ``"cpu"``."""
+    if device is not None:
+        return str(device)
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def load_model(model_id, device=None, **kwargs):
+    """Load ``model_id`` and its tokenizer for evaluation, in float16 on CUDA and float32 on CPU."""
+    device = resolve_device(device)
+    kwargs.setdefault("torch_dtype", torch.float16 if device.startswith("cuda") else torch.float32)
+    model = AutoModelForCausalLM.from_pretrained(model_id, **kwargs)
+    if "device_map" not in kwargs and "quantization_config" not in kwargs:
+        model.to(device)
+    model.eval()
+    return model, AutoTokenizer.from_pretrained(model_id)
+
+
+def make_key(**parts):
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """Completions on disk, one row per (model id, prompt, generation config)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " key TEXT PRIMARY KEY, model_id TEXT NOT NULL, prompt TEXT NOT NULL,"
+            " config TEXT NOT NULL, completion TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def key(model_id, prompt, config):
+        return make_key(model_id=model_id, prompt=prompt, config=config)
+
+    def get_many(self, keys):
+        """A dict of the completions stored for ``keys``; missing keys are left out."""
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            # Stay under SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, completion FROM generations WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, model_id, config, completions):
+        """Store ``{prompt: completion}`` for ``model_id`` generated with ``config``."""
+        now = time.time()
+        config_json = json.dumps(config, sort_keys=True)
+        rows = [(self.key(model_id, prompt, config), model_id, prompt, config_json, completion, now)
+                for prompt, completion in completions.items()]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+@contextlib.contextmanager
+def _padding_side(tokenizer, side):
+    previous = tokenizer.padding_side
+    tokenizer.padding_side = side
+    try:
+        yield
+    finally:
+        tokenizer.padding_side = previous
+
+
+def _batches(lengths, batch_size=None, max_tokens=None):
+    # Index lists, longest first, so similar lengths share a batch (little
+    # padding) and a batch that doesn't fit in memory fails right away
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    batch = []
+    for i in order:
+        width = lengths[batch[0]] if batch else lengths[i]
+        if batch and ((batch_size and len(batch) >= batch_size)
+                      or (max_tokens and (len(batch) + 1) * width > max_tokens)):
+            yield batch
+            batch = []
+        batch.append(i)
+    if batch:
+        yield batch
+
+
+@functools.lru_cache(maxsize=None)
+def _metric(name):
+    # datasets.load_metric was removed in datasets 3; evaluate replaced it
+    try:
+        import evaluate
+    except ImportError:
+        from datasets import load_metric
+        return load_metric(name), True
+    return evaluate.load(name), False
+
+
+def bleu(predictions, references):
+    """BLEU over whitespace tokens, as the notebook computed it."""
+    metric, legacy = _metric("bleu")
+    if legacy:
+        return metric.compute(predictions=[p.split() for p in predictions],
+                              references=[[r.split()] for r in references])
+    return metric.compute(predictions=predictions, references=[[r] for r in references], tokenizer=str.split)
+
+
+def rouge(predictions, references):
+    return _metric("rouge")[0].compute(predictions=predictions, references=references)
+
+
+def meteor(predictions, references):
+    return _metric("meteor")[0].compute(predictions=predictions, references=references)
+
+
+class EvaluationEngine:
+    def __init__(self, model, tokenizer, model_id, cache="eval_generations.sqlite", batch_size=8,
+                 max_batch_tokens=4096, generation_config=None, prompt_fn=generation_prompt):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.model_id = model_id
+        self.cache = GenerationCache(cache) if isinstance(cache, str) else cache
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.generation_config = dict(DEFAULT_GENERATION, **(generation_config or {}))
+        self.prompt_fn = prompt_fn
+        self.stats = collections.Counter()
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        model.eval()
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def _tokenize(self, texts):
+        return self.tokenizer(list(texts))["input_ids"]
+
+    def _pad(self, ids, side):
+        with _padding_side(self.tokenizer, side):
+            batch = self.tokenizer.pad({"input_ids": ids}, return_tensors="pt")
+        return {name: tensor.to(self.device) for name, tensor in batch.items()}
+
+    def generate(self, prompts):
+        """The completion for each prompt (without the prompt), generating only those not cached."""
+        prompts = list(prompts)
+        keys = [self.cache.key(self.model_id, prompt, self.generation_config) for prompt in prompts]
+        cached = self.cache.get_many(set(keys))
+        missing = list(dict.fromkeys(p for p, k in zip(prompts, keys) if k not in cached))
+        self.stats["cached"] += len(prompts) - len(missing)
+        if missing:
+            started = time.perf_counter()
+            ids = self._tokenize(missing)
+            pad_token_id = self.tokenizer.pad_token_id
+            with torch.no_grad():
+                for batch in _batches([len(i) for i in ids], batch_size=self.batch_size):
+                    inputs = self._pad([ids[i] for i in batch], "left")
+                    outputs = self.model.generate(**inputs, **self.generation_config, pad_token_id=pad_token_id)
+                    texts = self.tokenizer.batch_decode(outputs[:, inputs["input_ids"].shape[1]:],
+                                                        skip_special_tokens=True)
+                    # Stored per batch, so an interrupted run resumes where it stopped
+                    completions = {missing[i]: text.strip() for i, text in zip(batch, texts)}
+                    self.cache.put_many(self.model_id, self.generation_config, completions)
+                    cached.update((self.cache.key(self.model_id, p, self.generation_config), c)
+                                  for p, c in completions.items())
+            self.stats["generated"] += len(missing)
+            self.stats["generate_seconds"] += time.perf_counter() - started
+        return [cached[key] for key in keys]
+
+    def completions(self, dataset):
+        """``(predictions, references)`` for every example of ``dataset``."""
+        examples = list(dataset)
+        predictions = self.generate(self.prompt_fn(example) for example in examples)
+        return predictions, [example["answer"] for example in examples]
+
+    def embed(self, texts):
+        """Mean-pooled last hidden states of ``texts`` (padding excluded), as float32 on the CPU."""
+        ids = self._tokenize(texts)
+        embeddings = [None] * len(ids)
+        with torch.no_grad():
+            for batch in _batches([len(i) for i in ids], max_tokens=self.max_batch_tokens):
+                inputs = self._pad([ids[i] for i in batch], "right")
+                hidden = self.model(**inputs, output_hidden_states=True, return_dict=True).hidden_states[-1]
+                mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1)
+                for i, vector in zip(batch, pooled.float().cpu()):
+                    embeddings[i] = vector
+        return torch.stack(embeddings)
+
+    def calculate_perplexity(self, dataset, field="prompt"):
+        """Perplexity of the model on each example's ``field``, in padded batches.
+
+        Averages the negative log-likelihood over every predicted token; the
+        notebook weighted each example's mean loss by its length instead,
+        which differs by one token per example.
+        """
+        ids = self._tokenize(example[field] for example in dataset)
+        total_loss = 0.0
+        total_tokens = 0
+        with torch.no_grad():
+            for batch in _batches([len(i) for i in ids], max_tokens=self.max_batch_tokens):
+                inputs = self._pad([ids[i] for i in batch], "right")
+                logits = self.model(**inputs).logits[:, :-1]
+                targets = inputs["input_ids"][:, 1:]
+                mask = inputs["attention_mask"][:, 1:].bool()
+                losses = torch.nn.functional.cross_entropy(logits.float().transpose(1, 2), targets, reduction="none")
+                total_loss += losses[mask].sum().item()
+                total_tokens += mask.sum().item()
+        return math.exp(total_loss / total_tokens)
+
+    def calculate_semantic_similarity(self, dataset):
+        """Mean cosine similarity of the model's embeddings of its completion and the reference answer."""
+        predictions, references = self.completions(dataset)
+        embeddings = self.embed(predictions + references)
+        similarity = torch.nn.functional.cosine_similarity(embeddings[:len(predictions)], embeddings[len(predictions):])
+        return similarity.mean().item()
+
+    def calculate_bleu(self, dataset):
+        return bleu(*self.completions(dataset))
+
+    def compute_rouge(self, dataset):
+        return rouge(*self.completions(dataset))
+
+    def compute_meteor(self, dataset):
+        return meteor(*self.completions(dataset))
+
+    def evaluate(self, dataset, metrics=METRICS):
+        """Every metric in ``metrics`` for ``dataset``, from a single round of generation."""
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}; choose from {', '.join(METRICS)}")
+        dataset = list(dataset)
+        results = {}
+        if "perplexity" in metrics:
+            results["perplexity"] = self.calculate_perplexity(dataset)
+        if set(metrics) & {"semantic_similarity", "bleu", "rouge", "meteor"}:
+            predictions, references = self.completions(dataset)
+            if "semantic_similarity" in metrics:
+                results["semantic_similarity"] = self.calculate_semantic_similarity(dataset)
+            for name, score in (("bleu", bleu), ("rouge", rouge), ("meteor", meteor)):
+                if name in metrics:
+                    results[name] = score(predictions, references)
+        return results
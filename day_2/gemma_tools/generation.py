@@ -0,0 +1,284 @@
+"""Generation that stops when the answer is complete and reuses the prompt prefix.
+
+The inference notebook always generates ``max_new_tokens=1000`` with
+``do_sample=True``, decodes everything and keeps
+``result.split('Analysis:')[-1]``, so each query pays for every token after
+the useful answer, and prefills the same ``<start_of_turn>`` boilerplate.
+``Generator`` instead
+
+- stops on the model's stop tokens (``<eos>``, ``<end_of_turn>``) and on a
+  ``StopCondition``: any of ``stop_strings``, or the start of section
+  number ``max_sections + 1`` when ``section_markers`` are given (the text
+  is cut there)
+- computes the KV cache of the fixed template prefix once
+  (``PrefixCache``) and only prefills the rest of each prompt
+- decodes one token at a time with the KV cache, detokenizing
+  incrementally, and passes the text to ``on_text`` as it comes (held back
+  just enough that a stop string is never streamed)
+
+    generator = Generator(model, tokenizer, stop=StopCondition(stop_strings=["Question:"],
+                                                               section_markers=["Analysis:"], max_sections=1))
+    result = generator.get_completion(query, on_text=print)
+    print(result.text, result.finish_reason, len(result.token_ids))
+
+``StopOnText`` applies a ``StopCondition`` to ``model.generate`` instead.
+"""
+import copy
+import inspect
+import re
+import time
+
+import torch
+from transformers import StoppingCriteria
+
+from gemma_tools.prompts import INFERENCE_TEMPLATE, inference_prompt
+
+MAX_NEW_TOKENS = 1000
+# The notebook samples (do_sample=True) at the model's default temperature
+TEMPERATURE = 1.0
+# Everything in the inference prompt before the query
+PROMPT_PREFIX = INFERENCE_TEMPLATE.split("{query}")[0]
+
+
+def default_stop_token_ids(tokenizer):
+    """``<eos>``, plus ``<end_of_turn>`` when the tokenizer has it (Gemma ends its turn with it)."""
+    stop_token_ids = {tokenizer.eos_token_id}
+    end_of_turn = tokenizer.convert_tokens_to_ids("<end_of_turn>")
+    if end_of_turn is not None and end_of_turn != tokenizer.unk_token_id:
+        stop_token_ids.add(end_of_turn)
+    return stop_token_ids - {None}
+
+
+def last_logits_kwargs(model):
+    # Only the last position's logits are needed to pick the next token; a
+    # full prefill's logits are prompt x vocabulary (256k for Gemma)
+    parameters = inspect.signature(model.forward).parameters
+    for name in ("logits_to_keep", "num_logits_to_keep"):
+        if name in parameters:
+            return {name: 1}
+    return {}
+
+
+def pick_tokens(logits, temperatures):
+    """The next token of each row: greedy where the temperature is 0, sampled elsewhere."""
+    greedy = logits.argmax(dim=-1)
+    sampling = temperatures > 0
+    if not sampling.any():
+        return greedy
+    probs = torch.softmax(logits.float() / temperatures.clamp(min=1e-5).unsqueeze(1), dim=-1)
+    sampled = torch.multinomial(probs, 1).squeeze(1)
+    return torch.where(sampling, sampled, greedy)
+
+
+class IncrementalDecoder:
+    """Turns generated token ids into text one token at a time.
+
+    Decoding a token on its own loses the spaces and multi-byte characters
+    that depend on its neighbours, so text is emitted once the tokens since
+    ``prefix_offset`` decode to more than those before ``read_offset`` and
+    don't end in half a character.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.token_ids = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    def _new_text(self):
+        ids = self.token_ids
+        before = self.tokenizer.decode(ids[self._prefix_offset:self._read_offset], skip_special_tokens=True)
+        text = self.tokenizer.decode(ids[self._prefix_offset:], skip_special_tokens=True)
+        return text[len(before):] if len(text) > len(before) else ""
+
+    def add(self, token_id):
+        """The text ``token_id`` completes, possibly empty."""
+        self.token_ids.append(token_id)
+        text = self._new_text()
+        # A trailing U+FFFD is a multi-byte character still missing its other tokens
+        if not text or text.endswith("\ufffd"):
+            return ""
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self.token_ids)
+        return text
+
+    def flush(self):
+        """Whatever the held-back tokens decode to, even an incomplete character."""
+        text = self._new_text()
+        self._prefix_offset = self._read_offset = len(self.token_ids)
+        return text
+
+
+class StopCondition:
+    """Where generated text should end: at a stop string, or before section ``max_sections + 1``."""
+
+    def __init__(self, stop_strings=(), section_markers=(), max_sections=None):
+        self.stop_strings = [s for s in stop_strings if s]
+        self.section_markers = [m for m in section_markers if m]
+        self.max_sections = max_sections
+        if self.section_markers and max_sections is None:
+            raise ValueError("section_markers need max_sections")
+        self._sections = re.compile("|".join(map(re.escape, self.section_markers))) if self.section_markers else None
+        # Streamed text stops this far from the end, in case a stop string is starting
+        self.holdback = max((len(s) for s in self.stop_strings + self.section_markers), default=1) - 1
+
+    def find(self, text):
+        """The index to cut ``text`` at, or None to keep generating."""
+        cut = None
+        for stop_string in self.stop_strings:
+            index = text.find(stop_string)
+            if index >= 0 and (cut is None or index < cut):
+                cut = index
+        if self._sections is not None:
+            for count, match in enumerate(self._sections.finditer(text)):
+                if count == self.max_sections:
+                    if cut is None or match.start() < cut:
+                        cut = match.start()
+                    break
+        return cut
+
+
+class StopOnText(StoppingCriteria):
+    """Ends each row of ``model.generate`` once a ``StopCondition`` matches its generated text."""
+
+    def __init__(self, tokenizer, prompt_length, condition):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.condition = condition
+
+    def __call__(self, input_ids, scores, **kwargs):
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        return torch.tensor([self.condition.find(text) is not None for text in texts], device=input_ids.device)
+
+
+def _crop(past_key_values, length):
+    if hasattr(past_key_values, "crop"):
+        # A negative count drops that many positions from the end, which every
+        # transformers version with crop() accepts
+        excess = past_key_values.get_seq_length() - length
+        if excess:
+            past_key_values.crop(-excess)
+        return past_key_values
+    # Legacy tuple-of-tuples cache: (batch, heads, positions, head_dim) tensors
+    return tuple(tuple(tensor[:, :, :length] for tensor in layer) for layer in past_key_values)
+
+
+class PrefixCache:
+    """The KV cache of a fixed prompt prefix, computed once and reused by every prompt that starts with it.
+
+    Reuse goes by token ids: a prompt reuses as many leading tokens as it
+    shares with the prefix, so a tokenizer that merges the prefix's last
+    token with the query's first just costs that one token.
+    """
+
+    def __init__(self, model, tokenizer, prefix=PROMPT_PREFIX):
+        self.model = model
+        self.token_ids = tokenizer(prefix)["input_ids"]
+        self._last_logits = last_logits_kwargs(model)
+        with torch.no_grad():
+            inputs = torch.tensor([self.token_ids], device=model.device)
+            self._past_key_values = model(input_ids=inputs, use_cache=True, **self._last_logits).past_key_values
+
+    def shared_length(self, prompt_ids):
+        length = 0
+        for cached, token_id in zip(self.token_ids, prompt_ids):
+            if cached != token_id:
+                break
+            length += 1
+        # At least one prompt token has to run to get the next token's logits
+        return min(length, len(prompt_ids) - 1)
+
+    def prefill(self, prompt_ids):
+        """The model outputs for ``prompt_ids`` (a list) and how many of its tokens came from the cache."""
+        reused = self.shared_length(prompt_ids)
+        past_key_values = None
+        if reused:
+            past_key_values = _crop(copy.deepcopy(self._past_key_values), reused)
+        inputs = torch.tensor([prompt_ids[reused:]], device=self.model.device)
+        outputs = self.model(input_ids=inputs, past_key_values=past_key_values, use_cache=True, **self._last_logits)
+        return outputs, reused
+
+
+class Generation:
+    """What ``Generator.generate`` returns."""
+
+    def __init__(self, text, token_ids, finish_reason, prompt_tokens, reused_tokens, seconds):
+        self.text = text
+        self.token_ids = token_ids
+        # "stop" (a stop token), "stop_text" (the StopCondition) or "length"
+        self.finish_reason = finish_reason
+        self.prompt_tokens = prompt_tokens
+        self.reused_tokens = reused_tokens
+        self.seconds = seconds
+
+    def __repr__(self):
+        return (f"Generation({len(self.token_ids)} tokens, finish_reason={self.finish_reason!r}, "
+                f"{self.seconds:.2f}s, text={self.text[:40]!r}...)")
+
+
+class Generator:
+    def __init__(self, model, tokenizer, prefix=PROMPT_PREFIX, stop=None, max_new_tokens=MAX_NEW_TOKENS,
+                 temperature=TEMPERATURE, stop_token_ids=None):
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.stop = stop
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.stop_token_ids = default_stop_token_ids(tokenizer) if stop_token_ids is None else set(stop_token_ids)
+        self.prefix = PrefixCache(model, tokenizer, prefix) if prefix else None
+
+    def generate(self, prompt, max_new_tokens=None, temperature=None, stop=None, on_text=None):
+        """Generate from ``prompt`` until a stop token, the stop condition or ``max_new_tokens``."""
+        started = time.perf_counter()
+        max_new_tokens = self.max_new_tokens if max_new_tokens is None else max_new_tokens
+        temperature = self.temperature if temperature is None else temperature
+        stop = self.stop if stop is None else stop
+        temperatures = torch.tensor([temperature], device=self.model.device, dtype=torch.float32)
+        prompt_ids = self.tokenizer(prompt)["input_ids"]
+        decoder = IncrementalDecoder(self.tokenizer)
+        text = ""
+        streamed = 0
+        finish_reason = "length"
+
+        with torch.no_grad():
+            if self.prefix is not None:
+                outputs, reused = self.prefix.prefill(prompt_ids)
+            else:
+                reused = 0
+                inputs = torch.tensor([prompt_ids], device=self.model.device)
+                outputs = self.model(input_ids=inputs, use_cache=True, **last_logits_kwargs(self.model))
+            for _ in range(max_new_tokens):
+                token_id = pick_tokens(outputs.logits[:, -1], temperatures).item()
+                if token_id in self.stop_token_ids:
+                    finish_reason = "stop"
+                    break
+                text += decoder.add(token_id)
+                cut = stop.find(text) if stop is not None else None
+                if cut is not None:
+                    text = text[:cut]
+                    finish_reason = "stop_text"
+                    break
+                if on_text is not None:
+                    ready = len(text) - (stop.holdback if stop is not None else 0)
+                    if ready > streamed:
+                        on_text(text[streamed:ready])
+                        streamed = ready
+                if len(decoder.token_ids) == max_new_tokens:
+                    break
+                outputs = self.model(input_ids=torch.tensor([[token_id]], device=self.model.device),
+                                     past_key_values=outputs.past_key_values, use_cache=True)
+
+        if finish_reason != "stop_text":
+            text += decoder.flush()
+            cut = stop.find(text) if stop is not None else None
+            if cut is not None:
+                text = text[:cut]
+                finish_reason = "stop_text"
+        if on_text is not None and len(text) > streamed:
+            on_text(text[streamed:])
+        return Generation(text, decoder.token_ids, finish_reason, len(prompt_ids), reused,
+                          time.perf_counter() - started)
+
+    def get_completion(self, query, **options):
+        """The notebook's ``get_completion`` with early stopping; returns a ``Generation``."""
+        return self.generate(inference_prompt(query), **options)
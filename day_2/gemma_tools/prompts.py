@@ -0,0 +1,40 @@
+"""Gemma chat-format prompts used by the fine-tuning and inference notebooks."""
+
+# Bump when generate_prompt's output changes, so cached tokenizations are redone
+PROMPT_VERSION = 1
+PREFIX_TEXT = 'Below is an instruction that describes a task. Write a response that appropriately completes the request.\n\n'
+INFERENCE_TEMPLATE = """
+  <start_of_turn>user
+  Below is an instruction that describes a task. Write a response that appropriately completes the request.
+  {query}
+  <end_of_turn>\n<start_of_turn>model
+
+
+  """
+
+
+def _user_turn(data_point):
+    # Safely retrieve data from the data_point with default values if the key is missing
+    qid_info = f"ID: {data_point.get('qid', 'N/A')}"
+    language_info = f"Language: {data_point.get('language', 'N/A')}"
+    level_info = f"Level: {data_point.get('level', 'N/A')}"
+    question_info = f"Question: {data_point.get('question', 'N/A')}"
+    if data_point.get('question') and data_point.get('answer'):
+        return f"<start_of_turn>user {PREFIX_TEXT} {qid_info}, {language_info}, {level_info}.\n{question_info} <end_of_turn>"
+    return f"<start_of_turn>user {PREFIX_TEXT} {qid_info}, {language_info}, {level_info}. <end_of_turn>"
+
+
+def generate_prompt(data_point):
+    """The training prompt: the user turn followed by the model's answer (as in the notebook)."""
+    answer_info = data_point.get('answer', '')
+    return f"{_user_turn(data_point)}\n<start_of_turn>model {answer_info} <end_of_turn>"
+
+
+def generation_prompt(data_point):
+    """The training prompt cut where the model's answer starts, for generating that answer."""
+    return f"{_user_turn(data_point)}\n<start_of_turn>model "
+
+
+def inference_prompt(query):
+    """The prompt ``get_completion`` in the inference notebook sends for ``query``."""
+    return INFERENCE_TEMPLATE.format(query=query)
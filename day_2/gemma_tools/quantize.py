@@ -0,0 +1,144 @@
+"""CPU deployment of the merged model with int8 dynamic quantization of its Linear layers.
+
+The inference notebook loads the model in float16 with ``device_map="auto"``
+and fine-tuning relies on bitsandbytes 4-bit, both of which need a GPU. On
+a CPU-only node the merged model (``merged_model_path``) is loaded in
+float32, and ``quantize_model`` swaps its ``nn.Linear`` layers for
+PyTorch's dynamically quantized ones: int8 weights (per output channel by
+default), activations quantized on the fly, about a quarter of the
+memory of those layers and faster matmuls on x86 and ARM. ``lm_head`` is
+left in float32 by default: it is often tied to the embeddings, and its
+logits decide every token.
+
+``save_quantized`` writes the quantized weights with the config and
+tokenizer; ``load_quantized`` rebuilds the model without ever allocating
+the float32 Linear weights or quantizing again, so a server's startup skips
+both the float32 peak and the quantization pass:
+
+    python -m gemma_tools.quantize merged_model merged_model-int8
+    model, tokenizer = load_quantized("merged_model-int8")
+"""
+import argparse
+import json
+import os
+import time
+
+import torch
+from torch.ao.nn.quantized.dynamic import Linear as DynamicLinear
+from torch.ao.quantization import default_dynamic_qconfig, per_channel_dynamic_qconfig, quantize_dynamic
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, GenerationConfig
+
+from gemma_tools.evaluation import load_model
+
+FORMAT = 1
+MANIFEST = "quantization.json"
+WEIGHTS = "model.int8.pt"
+SKIP = ("lm_head",)
+
+
+def _linear_names(model, skip):
+    return [name for name, module in model.named_modules()
+            if isinstance(module, torch.nn.Linear) and name.split(".")[-1] not in skip and name not in skip]
+
+
+def quantize_model(model, skip=SKIP, per_channel=True):
+    """Quantize every ``nn.Linear`` of ``model`` (a float32 CPU model) except ``skip``, in place."""
+    qconfig = per_channel_dynamic_qconfig if per_channel else default_dynamic_qconfig
+    names = _linear_names(model, skip)
+    quantize_dynamic(model, {name: qconfig for name in names}, dtype=torch.qint8, inplace=True)
+    model.quantized_modules = names
+    model.quantization_per_channel = per_channel
+    return model
+
+
+def save_quantized(model, tokenizer, out_dir, source=None):
+    """Write a ``quantize_model`` model, its config and tokenizer to ``out_dir``."""
+    os.makedirs(out_dir, exist_ok=True)
+    model.config.save_pretrained(out_dir)
+    if model.generation_config is not None:
+        model.generation_config.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+    # Non-persistent buffers (rotary frequencies) aren't in the state dict
+    # but can't be rebuilt on the meta device, so they are saved alongside
+    persistent = model.state_dict()
+    buffers = {name: buffer for name, buffer in model.named_buffers() if name not in persistent}
+    path = os.path.join(out_dir, WEIGHTS)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save({"state_dict": persistent, "buffers": buffers}, tmp_path)
+    os.replace(tmp_path, path)
+    manifest = {
+        "format": FORMAT,
+        "dtype": "qint8",
+        "per_channel": model.quantization_per_channel,
+        "quantized_modules": model.quantized_modules,
+        "source": source,
+        "torch": torch.__version__,
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+def load_quantized(path):
+    """The model and tokenizer ``save_quantized`` wrote to ``path``, ready for CPU inference."""
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest["format"] != FORMAT:
+        raise ValueError(f"{path} has quantization format {manifest['format']}, expected {FORMAT}")
+    config = AutoConfig.from_pretrained(path)
+    # The skeleton lives on the meta device, so no float32 weights are allocated
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(config)
+    model.float()
+    for name in manifest["quantized_modules"]:
+        parent_name, _, child = name.rpartition(".")
+        parent = model.get_submodule(parent_name)
+        linear = getattr(parent, child)
+        # Built 1x1: the constructor packs a zero weight of the given size,
+        # which load_state_dict would only pack again with the real one
+        quantized = DynamicLinear(1, 1, bias_=linear.bias is not None, dtype=torch.qint8)
+        quantized.in_features = linear.in_features
+        quantized.out_features = linear.out_features
+        setattr(parent, child, quantized)
+    model.to_empty(device="cpu")
+    saved = torch.load(os.path.join(path, WEIGHTS), weights_only=True)
+    model.load_state_dict(saved["state_dict"], strict=True)
+    for name, buffer in saved["buffers"].items():
+        module_name, _, buffer_name = name.rpartition(".")
+        model.get_submodule(module_name).register_buffer(buffer_name, buffer, persistent=False)
+    # to_empty() gave tied parameters separate storage; share it again
+    # (a quantized lm_head has its own int8 copy and stays untied)
+    if isinstance(model.get_output_embeddings(), torch.nn.Linear):
+        model.tie_weights()
+    if os.path.exists(os.path.join(path, "generation_config.json")):
+        model.generation_config = GenerationConfig.from_pretrained(path)
+    model.quantized_modules = manifest["quantized_modules"]
+    model.quantization_per_channel = manifest["per_channel"]
+    return model.eval(), AutoTokenizer.from_pretrained(path)
+
+
+def quantize_merged_model(model_path, out_dir, skip=SKIP, per_channel=True):
+    """Load ``model_path`` in float32 on the CPU, quantize it and save it to ``out_dir``."""
+    model, tokenizer = load_model(model_path, device="cpu")
+    quantize_model(model, skip=skip, per_channel=per_channel)
+    save_quantized(model, tokenizer, out_dir, source=model_path)
+    return model, tokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("model_path", help="merged model directory or hub id, e.g. merged_model")
+    parser.add_argument("out_dir")
+    parser.add_argument("--per-tensor", action="store_true", help="one scale per weight matrix instead of per row")
+    parser.add_argument("--quantize-lm-head", action="store_true")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    quantize_merged_model(args.model_path, args.out_dir, skip=() if args.quantize_lm_head else SKIP,
+                          per_channel=not args.per_tensor)
+    size = os.path.getsize(os.path.join(args.out_dir, WEIGHTS))
+    print(f"Quantized {args.model_path} into {args.out_dir} ({size / 2**20:.0f}MB) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
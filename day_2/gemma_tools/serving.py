@@ -0,0 +1,426 @@
+"""Dynamic-batching local inference server for the fine-tuned Gemma model.
+
+``get_completion`` in the inference notebook runs one blocking
+``model.generate`` per query on ``cuda:0``. ``BatchingEngine`` instead
+queues requests and runs them on one background thread:
+
+- waiting requests are taken in arrival order, up to ``max_batch_size`` of
+  them and ``max_batch_tokens`` tokens (prompt plus ``max_new_tokens``,
+  the most a request can put in the KV cache); a request over the budget
+  on its own still runs, alone
+- after the first request arrives the engine waits ``max_wait`` seconds
+  for others to share the batch
+- the batch is prefilled once (left-padded) and decoded a token at a time
+  with the KV cache; rows that finish are dropped from the batch and the
+  cache, so short answers don't pay for long ones
+- every new token is decoded and pushed to its request's stream as it is
+  generated
+
+The model runs wherever it was loaded, CPU or CUDA (see
+``evaluation.load_model``).
+
+    with BatchingEngine(model, tokenizer) as engine:
+        completion = engine.submit(inference_prompt(query), max_new_tokens=1000)
+        for text in completion:
+            print(text, end="", flush=True)
+
+``InferenceServer`` puts the engine behind ``POST /v1/completions`` (JSON,
+or server-sent events with ``"stream": true``):
+
+    python -m gemma_tools.serving --model alpharomercoma/gemma-2b-instruct-ft-coding-interview --port 8000
+"""
+import argparse
+import collections
+import json
+import queue
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import torch
+
+from gemma_tools.evaluation import load_model
+from gemma_tools.generation import (MAX_NEW_TOKENS, TEMPERATURE, IncrementalDecoder, default_stop_token_ids,
+                                    last_logits_kwargs, pick_tokens)
+from gemma_tools.prompts import inference_prompt
+
+
+class Completion:
+    """One queued request: iterate it for text as it is generated, or call ``result()``."""
+
+    def __init__(self, prompt, prompt_ids, max_new_tokens, temperature, tokenizer):
+        self.id = f"cmpl-{uuid.uuid4().hex[:12]}"
+        self.prompt = prompt
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.finish_reason = None
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self._parts = []
+        self._events = queue.Queue()
+        self._done = threading.Event()
+        self._decoder = IncrementalDecoder(tokenizer)
+
+    @property
+    def cost(self):
+        return len(self.prompt_ids) + self.max_new_tokens
+
+    @property
+    def token_ids(self):
+        return self._decoder.token_ids
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def __iter__(self):
+        while True:
+            text = self._events.get()
+            if text is None:
+                break
+            yield text
+        if self.error is not None:
+            raise self.error
+
+    def result(self, timeout=None):
+        """The whole completion, once it has finished."""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.id} did not finish within {timeout}s")
+        if self.error is not None:
+            raise self.error
+        return "".join(self._parts)
+
+    def _add_token(self, token_id):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        text = self._decoder.add(token_id)
+        if text:
+            self._emit(text)
+
+    def _emit(self, text):
+        self._parts.append(text)
+        self._events.put(text)
+
+    def _finish(self, reason, error=None):
+        if self._done.is_set():
+            return
+        if error is None:
+            text = self._decoder.flush()
+            if text:
+                self._emit(text)
+        self.finish_reason = reason
+        self.error = error
+        self.finished_at = time.perf_counter()
+        self._done.set()
+        self._events.put(None)
+
+
+def _select_rows(past_key_values, rows):
+    if hasattr(past_key_values, "batch_select_indices"):
+        past_key_values.batch_select_indices(rows)
+        return past_key_values
+    # Legacy tuple-of-tuples cache
+    return tuple(tuple(tensor[rows] for tensor in layer) for layer in past_key_values)
+
+
+class BatchingEngine:
+    def __init__(self, model, tokenizer, max_batch_tokens=8192, max_batch_size=16, max_wait=0.01,
+                 max_new_tokens=MAX_NEW_TOKENS, temperature=TEMPERATURE, stop_token_ids=None):
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.stop_token_ids = default_stop_token_ids(tokenizer) if stop_token_ids is None else set(stop_token_ids)
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        self.stats = collections.Counter()
+        self._queue = queue.Queue()
+        self._held = collections.deque()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._last_logits = last_logits_kwargs(model)
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def submit(self, prompt, max_new_tokens=None, temperature=None):
+        """Queue ``prompt`` and return its ``Completion`` straight away."""
+        if self._thread is None:
+            raise RuntimeError("The engine is not running; call start() or use it as a context manager")
+        prompt_ids = self.tokenizer(prompt)["input_ids"]
+        completion = Completion(prompt, prompt_ids,
+                                self.max_new_tokens if max_new_tokens is None else max_new_tokens,
+                                self.temperature if temperature is None else temperature, self.tokenizer)
+        self._queue.put(completion)
+        return completion
+
+    def get_completion(self, query, **options):
+        """The notebook's ``get_completion`` through the queue; returns only the generated text."""
+        return self.submit(inference_prompt(query), **options).result()
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name="batching-engine", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Anything still waiting will never run
+        for completion in list(self._held) + list(self._drain()):
+            completion._finish("cancelled", error=RuntimeError("The engine stopped before this request ran"))
+        self._held.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _drain(self):
+        while True:
+            try:
+                yield self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._run(batch)
+
+    def _next_batch(self):
+        if not self._held:
+            try:
+                self._held.append(self._queue.get(timeout=0.1))
+            except queue.Empty:
+                return []
+            deadline = time.perf_counter() + self.max_wait
+            while len(self._held) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    self._held.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        self._held.extend(self._drain())
+
+        batch = [self._held.popleft()]
+        tokens = batch[0].cost
+        while self._held and len(batch) < self.max_batch_size:
+            if tokens + self._held[0].cost > self.max_batch_tokens:
+                break
+            tokens += self._held[0].cost
+            batch.append(self._held.popleft())
+        return batch
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(batch)
+        active = list(batch)
+        try:
+            width = max(len(c.prompt_ids) for c in batch)
+            input_ids = torch.tensor([[self.pad_token_id] * (width - len(c.prompt_ids)) + c.prompt_ids for c in batch],
+                                     device=self.device)
+            attention_mask = torch.tensor([[0] * (width - len(c.prompt_ids)) + [1] * len(c.prompt_ids) for c in batch],
+                                          device=self.device)
+            # Left padding shifts the prompts, so positions come from the mask
+            position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+            temperatures = torch.tensor([c.temperature for c in batch], device=self.device, dtype=torch.float32)
+            past_key_values = None
+            with torch.no_grad():
+                while active:
+                    outputs = self.model(input_ids=input_ids, attention_mask=attention_mask, position_ids=position_ids,
+                                         past_key_values=past_key_values, use_cache=True, **self._last_logits)
+                    past_key_values = outputs.past_key_values
+                    next_ids = pick_tokens(outputs.logits[:, -1], temperatures).tolist()
+                    self.stats["tokens"] += len(active)
+                    keep = []
+                    for row, (completion, token_id) in enumerate(zip(active, next_ids)):
+                        if token_id in self.stop_token_ids:
+                            completion._finish("stop")
+                            continue
+                        completion._add_token(token_id)
+                        if len(completion.token_ids) >= completion.max_new_tokens:
+                            completion._finish("length")
+                        else:
+                            keep.append(row)
+                    if len(keep) < len(active):
+                        if not keep:
+                            break
+                        rows = torch.tensor(keep, device=self.device)
+                        past_key_values = _select_rows(past_key_values, rows)
+                        attention_mask = attention_mask[rows]
+                        position_ids = position_ids[rows]
+                        temperatures = temperatures[rows]
+                        active = [active[row] for row in keep]
+                    input_ids = torch.tensor([[next_ids[row]] for row in keep], device=self.device)
+                    attention_mask = torch.cat([attention_mask, attention_mask.new_ones((len(keep), 1))], dim=1)
+                    position_ids = position_ids[:, -1:] + 1
+        except Exception as error:
+            self.stats["errors"] += 1
+            for completion in batch:
+                completion._finish("error", error=error)
+        finally:
+            self.stats["busy_seconds"] += time.perf_counter() - started
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/completions":
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            prompt = payload["prompt"] if "prompt" in payload else inference_prompt(payload["query"])
+        except (ValueError, KeyError):
+            self._send_json(400, {"error": {"message": "Send JSON with a 'prompt' or a 'query'"}})
+            return
+        completion = self.server.engine.submit(prompt, max_new_tokens=payload.get("max_tokens"),
+                                               temperature=payload.get("temperature"))
+        if payload.get("stream"):
+            self._stream(completion)
+            return
+        try:
+            text = completion.result()
+        except Exception as error:
+            self._send_json(500, {"error": {"message": str(error)}})
+            return
+        self._send_json(200, _completion_body(completion, text))
+
+    def _stream(self, completion):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for text in completion:
+                self._send_event(_chunk_body(completion, text, None))
+            self._send_event(_chunk_body(completion, "", completion.finish_reason))
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading; the request still runs to completion
+            return
+        except Exception as error:
+            self._send_event({"error": {"message": str(error)}})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_event(self, body):
+        self.wfile.write(b"data: " + json.dumps(body).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _completion_body(completion, text):
+    return {
+        "id": completion.id,
+        "object": "text_completion",
+        "choices": [{"index": 0, "text": text, "finish_reason": completion.finish_reason}],
+        "usage": {
+            "prompt_tokens": len(completion.prompt_ids),
+            "completion_tokens": len(completion.token_ids),
+            "total_tokens": len(completion.prompt_ids) + len(completion.token_ids),
+        },
+    }
+
+
+def _chunk_body(completion, text, finish_reason):
+    return {
+        "id": completion.id,
+        "object": "text_completion",
+        "choices": [{"index": 0, "text": text, "finish_reason": finish_reason}],
+    }
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """HTTP front end for a ``BatchingEngine``; use as a context manager or call start()/stop()."""
+
+    daemon_threads = True
+
+    def __init__(self, engine, host="127.0.0.1", port=0):
+        super().__init__((host, port), _CompletionHandler)
+        self.engine = engine
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.engine.start()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        self.engine.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="alpharomercoma/gemma-2b-instruct-ft-coding-interview",
+                        help="hub id or local path, e.g. merged_model")
+    parser.add_argument("--device", help="cuda, cpu, ... (default: cuda when available)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-tokens", type=int, default=8192)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait", type=float, default=0.01, help="seconds to wait for a batch to fill")
+    args = parser.parse_args()
+
+    model, tokenizer = load_model(args.model, device=args.device)
+    engine = BatchingEngine(model, tokenizer, max_batch_tokens=args.max_batch_tokens,
+                            max_batch_size=args.max_batch_size, max_wait=args.max_wait)
+    server = InferenceServer(engine, args.host, args.port)
+    print(f"Serving {args.model} on {model.device} at {server.url}/completions")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,54 @@
+import atexit
 import os
+import sys
+import asyncio
+import queue
 import openai
-import numpy as np
-import pandas as pd
 import json
-from langchain.chat_models import ChatOpenAI
-from langchain.document_loaders import CSVLoader
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.prompts import ChatPromptTemplate
-from langchain.vectorstores import Chroma
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableLambda, RunnablePassthrough
-from openai.embeddings_utils import get_embedding
-import faiss
 import streamlit as st
 import warnings
 from streamlit_option_menu import option_menu
-from streamlit_extras.mention import mention
-import requests
-from bs4 import BeautifulSoup
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get('MIJIKAI_CACHE_DIR', os.path.join(APP_DIR, '.cache'))
+
+sys.path.append(os.path.join(APP_DIR, os.pardir))
+from appkit.assets import load_image
+from appkit.dedup import NearDuplicateIndex, OpenAIEmbedder
+from appkit.fetcher import ArticleFetcher
+from appkit.ratelimit import RateLimiter
+from appkit.scheduler import SchedulerBusy, current_session_id, get_scheduler
+from bulk_summarize import read_urls, summarize_urls
+from news_summarizer import DUPLICATE_THRESHOLD, EMBEDDING_DIM, EMBEDDING_MODEL, metrics, summarize_url
 
 warnings.filterwarnings("ignore")
 
 
 st.set_page_config(page_title="News Summarizer Tool", page_icon="", layout="wide")
 
+# One connection pool and article cache for every session in the process
+@st.cache_resource
+def get_fetcher():
+    return ArticleFetcher(os.path.join(CACHE_DIR, 'articles'))
+
+# Summaries of stories already seen, so syndicated copies are summarized once
+@st.cache_resource
+def get_dedup_index():
+    index = NearDuplicateIndex(
+        os.path.join(CACHE_DIR, 'summaries'),
+        OpenAIEmbedder(EMBEDDING_MODEL, EMBEDDING_DIM),
+        EMBEDDING_DIM,
+        threshold=DUPLICATE_THRESHOLD
+    )
+    index.evict_expired()
+    # Saves are batched; write whatever is left when the server stops
+    atexit.register(index.flush)
+    return index
+
 with st.sidebar :
-    st.image('day_3/ai-first-day-3-activity-4/images/White_AI Republic.png')
+    with metrics.stage('asset_load'):
+        logo = load_image('day_3/ai-first-day-3-activity-4/images/White_AI Republic.png', max_width=600)
+    st.image(logo.data)
     openai.api_key = st.text_input('Enter OpenAI API token:', type='password')
     if not (openai.api_key.startswith('sk-') and len(openai.api_key)==164):
         st.warning('Please enter your OpenAI API token!', icon='⚠️')
@@ -37,18 +60,31 @@ with st.sidebar :
         with m : st.empty()
         with r : st.empty()
 
+    # ?page=Model opens a page directly (links, headless load tests)
+    pages = ["Home", "About Me", "Model"]
+    requested_page = st.query_params.get('page')
     options = option_menu(
         "Dashboard",
-        ["Home", "About Me", "Model"],
+        pages,
         icons = ['book', 'globe', 'tools'],
         menu_icon = "book",
-        default_index = 0,
+        default_index = pages.index(requested_page) if requested_page in pages else 0,
         styles = {
             "icon" : {"color" : "#dec960", "font-size" : "20px"},
             "nav-link" : {"font-size" : "17px", "text-align" : "left", "margin" : "5px", "--hover-color" : "#262730"},
             "nav-link-selected" : {"background-color" : "#262730"}
         })
 
+    # Add ?debug=1 to the URL for per-stage timings, tokens and cost
+    if st.query_params.get('debug'):
+        with st.expander('Timings', expanded=True):
+            st.dataframe(metrics.debug_rows(), hide_index=True)
+            for model, usage in metrics.usage().items():
+                st.caption(
+                    f"{model}: {usage['prompt_tokens']} prompt + {usage['completion_tokens']} "
+                    f"completion tokens · ${usage['cost_usd']:.4f} on this server"
+                )
+
 
 if 'messages' not in st.session_state:
     st.session_state.messages = []
@@ -56,6 +92,20 @@ if 'messages' not in st.session_state:
 if 'chat_session' not in st.session_state:
     st.session_state.chat_session = None  # Placeholder for your chat session initialization
 
+if 'rate_limiter' not in st.session_state:
+    # Per session, since each session brings its own API key and quota
+    st.session_state.rate_limiter = RateLimiter(requests_per_minute=500, tokens_per_minute=200_000)
+
+# Summaries run on the process-wide worker pool; a rerun cancels this session's earlier calls
+llm_queue = get_scheduler().session(current_session_id())
+
+def show_queue(placeholder):
+    # Called on the script thread while the summary runs on other threads. Each
+    # Streamlit call is where a rerun or closed tab stops the script, which
+    # cancels this session's queued and running calls
+    stats = get_scheduler().stats()
+    placeholder.caption(f"{stats['running']} summaries running, {stats['queued']} waiting for a worker")
+
 if options == "Home" :
     st.title('Mijikai News - Summarizer Tool')
     st.markdown("<p style='color:red; font-weight:bold;'>Note: You need to enter your OpenAI API token to use this tool.</p>", unsafe_allow_html=True)
@@ -129,97 +179,93 @@ elif options == "Model" :
         News_Article = st.text_input("News Article URL", placeholder="Enter article URL: ")
         submit_button = st.button("Generate Summary")
 
+        with st.expander("Bulk summarize"):
+            bulk_urls = st.text_area("Article URLs", placeholder="One URL per line")
+            url_file = st.file_uploader("Or upload a list of URLs", type=['txt', 'csv'])
+            bulk_button = st.button("Summarize All")
+
     if submit_button:
         with st.spinner("Generating Summary"):
+            status = st.empty()
             try:
-                # Fetch the article content
-                response = requests.get(News_Article)
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # Extract text from paragraphs
-                paragraphs = soup.find_all('p')
-                article_text = ' '.join([p.get_text() for p in paragraphs])
-
-                # OpenAI-based summarization
-                system_prompt = """
-<Role>
-You are a highly skilled AI News Analyst, trained to extract and convey crucial information from various news sources with precision and speed. Your expertise lies in distilling complex articles into concise, accurate summaries that capture the essence of the original content.
-</Role>
-
-<Instructions>
-Your primary task is to analyze news articles and generate comprehensive yet succinct summaries. When presented with a news article URL or text, follow these steps:
-
-1. Read and comprehend the entire article thoroughly.
-2. Identify the main topic, key events, and significant figures mentioned.
-3. Extract the most important information, focusing on factual content rather than opinion pieces.
-4. Organize the extracted information into a structured summary format.
-5. Generate a clear, objective summary that adheres to the following guidelines.
-</Instructions>
-
-<Context>
-As an AI News Analyst, you operate in a fast-paced environment where timely and accurate information dissemination is crucial. Your summaries will be used by busy professionals, researchers, and individuals seeking quick insights into current events across various domains, including politics, economics, science, technology, and global affairs.
-</Context>
-
-<Constraints>
-1. Maintain strict objectivity and avoid any form of bias or personal opinion.
-2. Ensure all information in your summary is verifiable within the original article.
-3. Do not speculate or infer information not explicitly stated in the source material.
-4. Keep your summaries concise, typically between 150-250 words.
-5. Use clear, professional language accessible to a general audience.
-6. Avoid technical jargon unless absolutely necessary for understanding the topic.
-7. Include proper attribution to the original source when providing statistics or quotes.
-</Constraints>
-
-<Examples>
-## Example 1: Economic News
-
-User Input: [URL to an article about a recent stock market fluctuation]
-
-Your Response:
-```
-Headline: Tech Stocks Plummet Amid Global Economic Uncertainty
-
-Brief Overview: The tech sector experienced a significant downturn yesterday, with major companies seeing substantial losses in share value. This shift comes amid growing concerns about global economic stability and potential interest rate hikes.
-
-Key Points:
-- Apple shares dropped by 5%, while Google saw a 4% decline.
-- Analysts attribute the fall to investor fears of an impending recession.
-- The Dow Jones Industrial Average closed 300 points lower than the previous day.
-
-Impact: This sudden drop may signal a broader market correction, potentially affecting consumer spending and business investment decisions in the coming months.
-```
-
-## Example 2: Scientific Breakthrough
-
-User Input: [Text excerpt about a recent medical discovery]
-
-Your Response:
-```
-Headline: Researchers Discover Novel Gene Therapy Approach for Treating Rare Genetic Disorder
-
-Brief Overview: Scientists at Harvard Medical School have made a groundbreaking discovery in gene therapy, developing a new method to treat a previously incurable genetic condition affecting thousands worldwide.
-
-Key Points:
-- The therapy involves using CRISPR technology to edit specific genes responsible for the disorder.
-- Initial clinical trials show promising results, with significant improvement in patient symptoms.
-- Researchers estimate widespread availability within the next five years if further testing proves successful.
-
-Impact: This breakthrough has the potential to revolutionize treatment options for patients suffering from this rare genetic disorder, offering hope for improved quality of life and increased lifespan.
-</Examples>
-```
-
-By following these guidelines and examples, you will provide high-quality summaries that effectively capture the essence of news articles while maintaining accuracy and objectivity.
-"""
-                user_message = f"Please summarize the following news article: {article_text}"
-                struct = [{'role': 'system', 'content': system_prompt}]
-                struct.append({"role": "user", "content": user_message})
-                chat = openai.ChatCompletion.create(model="gpt-4-mini", messages=struct)
-                summary = chat.choices[0].message.content
-                struct.append({"role": "assistant", "content": summary})
+                # Fetch the article, extract the story paragraphs (leaving out navigation and
+                # footer boilerplate) and summarize them. Long articles are chunked and
+                # summarized in parallel; stories already seen on another site reuse that summary.
+                result = llm_queue.call(
+                    summarize_url,
+                    News_Article,
+                    get_fetcher(),
+                    st.session_state.rate_limiter,
+                    dedup=get_dedup_index(),
+                    queue=llm_queue,
+                    api_key=openai.api_key,
+                    on_wait=lambda: show_queue(status)
+                )
+                status.empty()
+                summary = result['summary']
 
                 st.success("Summary generated successfully!")
-
-                st.subheader("Article Summary:")
-                st.write(summary)
+                if result['mode'] == 'duplicate':
+                    st.caption(f"Same story as {result['duplicate_of']} (similarity {result['similarity']:.2f}); reused its summary.")
+
+                with metrics.stage('render'):
+                    st.subheader("Article Summary:")
+                    st.write(summary)
+            except SchedulerBusy:
+                st.warning("The summarizer is busy right now. Please try again in a moment.", icon='⏳')
             except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
\ No newline at end of file
+                st.error(f"An error occurred: {str(e)}")
+
+    if bulk_button:
+        lines = bulk_urls.splitlines()
+        if url_file is not None:
+            lines += url_file.getvalue().decode('utf-8').splitlines()
+        urls = read_urls(lines)
+
+        if not urls:
+            st.warning("Please enter at least one article URL.")
+        else:
+            progress = st.progress(0.0)
+            status = st.empty()
+            records = []
+            finished = queue.SimpleQueue()
+
+            # Show each summary as soon as it is ready
+            def show_result(record):
+                records.append(record)
+                progress.progress(len(records) / len(urls), text=f"{len(records)} of {len(urls)} articles")
+                if record['ok']:
+                    with st.expander(record['url']):
+                        st.write(record['summary'])
+                else:
+                    st.error(f"{record['url']}: {record['error']}")
+
+            # The batch runs on a helper thread; its results are shown from the script thread
+            def show_finished():
+                while not finished.empty():
+                    show_result(finished.get())
+                show_queue(status)
+
+            # Four articles at a time, each mapping up to four chunks, stays within the
+            # scheduler's per-session queue limit
+            llm_queue.call(asyncio.run, summarize_urls(
+                urls,
+                get_fetcher(),
+                st.session_state.rate_limiter,
+                concurrency=4,
+                on_result=finished.put,
+                dedup=get_dedup_index(),
+                queue=llm_queue,
+                api_key=openai.api_key
+            ), on_wait=show_finished)
+            show_finished()
+            status.empty()
+
+            failed = sum(not record['ok'] for record in records)
+            st.success(f"Summarized {len(records) - failed} of {len(records)} articles.")
+            st.download_button(
+                label="Download Summaries (JSONL)",
+                data="\n".join(json.dumps(record, ensure_ascii=False) for record in records),
+                file_name="summaries.jsonl",
+                mime="application/jsonl"
+            )
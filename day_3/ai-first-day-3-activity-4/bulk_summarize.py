@@ -0,0 +1,112 @@
+"""Bulk summarization of many article URLs.
+
+Pages are fetched concurrently from an asyncio event loop (through the
+pooled, cached ``ArticleFetcher`` on worker threads) and every LLM call goes
+through a shared requests/tokens-per-minute limiter. Each result is written
+as one JSON line as soon as it finishes; a failing URL produces an
+``"ok": false`` record instead of aborting the batch.
+
+    OPENAI_API_KEY=sk-... python day_3/ai-first-day-3-activity-4/bulk_summarize.py urls.txt -o summaries.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(APP_DIR, os.pardir))
+
+from appkit.dedup import NearDuplicateIndex, OpenAIEmbedder
+from appkit.fetcher import ArticleFetcher
+from appkit.ratelimit import RateLimiter
+from appkit.scheduler import JobCancelled
+from news_summarizer import DUPLICATE_THRESHOLD, EMBEDDING_DIM, EMBEDDING_MODEL, summarize_url
+
+
+def read_urls(lines):
+    # One URL per line; blank lines, comments and duplicates are skipped
+    seen, urls = set(), []
+    for line in lines:
+        url = line.strip()
+        if url and not url.startswith("#") and url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+async def summarize_urls(urls, fetcher, limiter, concurrency=8, on_result=None, **options):
+    """Summarize ``urls`` concurrently, calling ``on_result(record)`` as each one completes."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(url):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(summarize_url, url, fetcher, limiter, **options)
+            except JobCancelled:
+                # The session's queue was cancelled (a rerun); stop the batch rather than fail every URL
+                raise
+            except Exception as e:
+                return {"url": url, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    results = []
+    for finished in asyncio.as_completed([run(url) for url in urls]):
+        record = await finished
+        results.append(record)
+        if on_result is not None:
+            on_result(record)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a list of news article URLs to JSONL.")
+    parser.add_argument("urls", nargs="?", help="file with one URL per line (default: stdin)")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=500, help="max LLM requests per minute")
+    parser.add_argument("--tpm", type=int, default=200_000, help="max LLM tokens per minute")
+    parser.add_argument("--no-dedup", action="store_true", help="summarize near-duplicate stories again")
+    parser.add_argument("--cache-dir", default=os.environ.get("MIJIKAI_CACHE_DIR", os.path.join(APP_DIR, ".cache")))
+    args = parser.parse_args()
+
+    if args.urls:
+        with open(args.urls, encoding="utf-8") as url_file:
+            urls = read_urls(url_file)
+    else:
+        urls = read_urls(sys.stdin)
+
+    fetcher = ArticleFetcher(os.path.join(args.cache_dir, "articles"))
+    limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    dedup = None
+    if not args.no_dedup:
+        dedup = NearDuplicateIndex(
+            os.path.join(args.cache_dir, "summaries"),
+            OpenAIEmbedder(EMBEDDING_MODEL, EMBEDDING_DIM),
+            EMBEDDING_DIM,
+            threshold=DUPLICATE_THRESHOLD,
+        )
+        dedup.evict_expired()
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    def write(record):
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(summarize_urls(urls, fetcher, limiter, args.concurrency, on_result=write, dedup=dedup))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if dedup is not None:
+            dedup.flush()
+        fetcher.close()
+    elapsed = time.perf_counter() - started
+    failed = sum(not record["ok"] for record in results)
+    print(f"{len(results)} URLs in {elapsed:.1f}s ({len(results) / elapsed:.2f}/s), {failed} failed, "
+          f"{limiter.waited:.1f}s spent waiting on rate limits", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
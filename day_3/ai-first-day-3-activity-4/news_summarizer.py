@@ -0,0 +1,191 @@
+"""Summarization pipeline for the Mijikai News summarizer tool."""
+import functools
+import time
+
+import openai
+
+from appkit.extract import extract_article_text
+from appkit.metrics import get_metrics
+from appkit.summarize import count_tokens, map_reduce_summarize
+
+SUMMARY_MODEL = "gpt-4o-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+# Cosine similarity above which two articles are treated as the same story
+DUPLICATE_THRESHOLD = 0.92
+# Reserved per call when rate limiting, before the real usage is known
+COMPLETION_TOKENS_ESTIMATE = 500
+
+# Shared with the app, which shows these timings in its debug panel
+metrics = get_metrics("mijikai")
+
+SYSTEM_PROMPT = """
+<Role>
+You are a highly skilled AI News Analyst, trained to extract and convey crucial information from various news sources with precision and speed. Your expertise lies in distilling complex articles into concise, accurate summaries that capture the essence of the original content.
+</Role>
+
+<Instructions>
+Your primary task is to analyze news articles and generate comprehensive yet succinct summaries. When presented with a news article URL or text, follow these steps:
+
+1. Read and comprehend the entire article thoroughly.
+2. Identify the main topic, key events, and significant figures mentioned.
+3. Extract the most important information, focusing on factual content rather than opinion pieces.
+4. Organize the extracted information into a structured summary format.
+5. Generate a clear, objective summary that adheres to the following guidelines.
+</Instructions>
+
+<Context>
+As an AI News Analyst, you operate in a fast-paced environment where timely and accurate information dissemination is crucial. Your summaries will be used by busy professionals, researchers, and individuals seeking quick insights into current events across various domains, including politics, economics, science, technology, and global affairs.
+</Context>
+
+<Constraints>
+1. Maintain strict objectivity and avoid any form of bias or personal opinion.
+2. Ensure all information in your summary is verifiable within the original article.
+3. Do not speculate or infer information not explicitly stated in the source material.
+4. Keep your summaries concise, typically between 150-250 words.
+5. Use clear, professional language accessible to a general audience.
+6. Avoid technical jargon unless absolutely necessary for understanding the topic.
+7. Include proper attribution to the original source when providing statistics or quotes.
+</Constraints>
+
+<Examples>
+## Example 1: Economic News
+
+User Input: [URL to an article about a recent stock market fluctuation]
+
+Your Response:
+```
+Headline: Tech Stocks Plummet Amid Global Economic Uncertainty
+
+Brief Overview: The tech sector experienced a significant downturn yesterday, with major companies seeing substantial losses in share value. This shift comes amid growing concerns about global economic stability and potential interest rate hikes.
+
+Key Points:
+- Apple shares dropped by 5%, while Google saw a 4% decline.
+- Analysts attribute the fall to investor fears of an impending recession.
+- The Dow Jones Industrial Average closed 300 points lower than the previous day.
+
+Impact: This sudden drop may signal a broader market correction, potentially affecting consumer spending and business investment decisions in the coming months.
+```
+
+## Example 2: Scientific Breakthrough
+
+User Input: [Text excerpt about a recent medical discovery]
+
+Your Response:
+```
+Headline: Researchers Discover Novel Gene Therapy Approach for Treating Rare Genetic Disorder
+
+Brief Overview: Scientists at Harvard Medical School have made a groundbreaking discovery in gene therapy, developing a new method to treat a previously incurable genetic condition affecting thousands worldwide.
+
+Key Points:
+- The therapy involves using CRISPR technology to edit specific genes responsible for the disorder.
+- Initial clinical trials show promising results, with significant improvement in patient symptoms.
+- Researchers estimate widespread availability within the next five years if further testing proves successful.
+
+Impact: This breakthrough has the potential to revolutionize treatment options for patients suffering from this rare genetic disorder, offering hope for improved quality of life and increased lifespan.
+</Examples>
+```
+
+By following these guidelines and examples, you will provide high-quality summaries that effectively capture the essence of news articles while maintaining accuracy and objectivity.
+"""
+
+
+def complete(messages, limiter=None, queue=None, api_key=None):
+    """One summary completion; with an ``appkit.scheduler.SessionQueue`` it runs on the shared pool."""
+    # Worker threads are shared between sessions, so the caller's key is passed along
+    api_key = openai.api_key if api_key is None else api_key
+    estimate = 0
+    if limiter is not None:
+        estimate = sum(count_tokens(m["content"], SUMMARY_MODEL) for m in messages) + COMPLETION_TOKENS_ESTIMATE
+        limiter.acquire(estimate)
+    with metrics.stage("completion"):
+        if queue is not None:
+            chat = queue.run(openai.ChatCompletion.create, model=SUMMARY_MODEL, messages=messages, api_key=api_key)
+        else:
+            chat = openai.ChatCompletion.create(model=SUMMARY_MODEL, messages=messages, api_key=api_key)
+    usage = chat.get("usage")
+    if usage:
+        metrics.record_usage(SUMMARY_MODEL, usage["prompt_tokens"], usage["completion_tokens"])
+    if limiter is not None and usage:
+        limiter.adjust(usage["total_tokens"] - estimate)
+    return chat.choices[0].message.content
+
+
+def create_embedding(limiter=None, queue=None, **request):
+    """``openai.Embedding.create`` behind the same limiter, queue and metrics as ``complete``."""
+    tokens = 0
+    if limiter is not None:
+        tokens = sum(count_tokens(text, EMBEDDING_MODEL) for text in request["input"])
+        limiter.acquire(tokens)
+    with metrics.stage("embedding"):
+        if queue is not None:
+            response = queue.run(openai.Embedding.create, **request)
+        else:
+            response = openai.Embedding.create(**request)
+    usage = response.get("usage")
+    if usage:
+        metrics.record_usage(request["model"], usage["prompt_tokens"], 0)
+    if limiter is not None and usage:
+        limiter.adjust(usage["total_tokens"] - tokens)
+    return response
+
+
+def summarize_article(article_text, limiter=None, queue=None, api_key=None, **options):
+    """Summarize extracted article text; see ``map_reduce_summarize`` for ``options``."""
+    return map_reduce_summarize(
+        article_text,
+        SYSTEM_PROMPT,
+        functools.partial(complete, limiter=limiter, queue=queue, api_key=api_key),
+        model=SUMMARY_MODEL,
+        **options
+    )
+
+
+def summarize_url(url, fetcher, limiter=None, dedup=None, queue=None, api_key=None, **options):
+    """Fetch, extract and summarize one URL, returning a JSON-serializable record.
+
+    With a ``NearDuplicateIndex`` as ``dedup`` (embedding with an
+    ``OpenAIEmbedder``), a story already summarized from another site reuses
+    that summary instead of calling the LLM.
+    """
+    started = time.perf_counter()
+    with metrics.stage("fetch", url=url):
+        response = fetcher.fetch(url)
+    fetched = time.perf_counter()
+    with metrics.stage("extraction"):
+        article_text = extract_article_text(response.content)
+    if not article_text.strip():
+        raise ValueError("No article text found on the page")
+    record = {
+        "url": url,
+        "ok": True,
+        "from_cache": response.from_cache,
+        "fetch_seconds": round(fetched - started, 4),
+    }
+
+    match = vector = None
+    if dedup is not None:
+        embed_options = {"api_key": api_key, "create": functools.partial(create_embedding, limiter=limiter, queue=queue)}
+        with metrics.stage("dedup_lookup"):
+            match, vector = dedup.match(article_text, **embed_options)
+    if match is not None:
+        entry, similarity = match
+        record.update({
+            "summary": entry["summary"],
+            "mode": "duplicate",
+            "duplicate_of": entry["source"],
+            "similarity": round(similarity, 4),
+        })
+    else:
+        result = summarize_article(article_text, limiter=limiter, queue=queue, api_key=api_key, **options)
+        record.update({
+            "summary": result.summary,
+            "mode": result.mode,
+            "chunks": result.chunks,
+            "input_tokens": result.input_tokens,
+        })
+        if dedup is not None:
+            # The lookup's embedding, so a new story is embedded once
+            dedup.add(article_text, result.summary, source=url, vector=vector, **embed_options)
+    record["summarize_seconds"] = round(time.perf_counter() - fetched, 4)
+    return record
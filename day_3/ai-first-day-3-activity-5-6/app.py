@@ -1,9 +1,35 @@
 import os
+import re
+import sys
+import unicodedata
 import openai
 import streamlit as st
-import base64
 from streamlit_option_menu import option_menu
 
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, 'static')
+
+sys.path.append(os.path.join(APP_DIR, os.pardir))
+from appkit.assets import image_url, load_image, minify_css
+from appkit.context import count_messages
+from appkit.key_cache import invalidate_api_key, validate_api_key
+from appkit.metrics import get_metrics
+from appkit.response_cache import ResponseCache, make_key
+from appkit.scheduler import SchedulerBusy, current_session_id, get_scheduler
+from appkit.streaming import blocking_chat_completion, stream_chat_completion
+from appkit.summarize import count_tokens
+from chat_history import ChatHistory, render_chat_history
+
+MIX_MODEL = "gpt-4o-mini"
+# Bump whenever the mixing prompt in get_ai_response changes so cached mixes are not reused
+MIX_PROMPT_VERSION = 1
+CACHE_DIR = os.environ.get('VERSEFORGE_CACHE_DIR', os.path.join(APP_DIR, '.cache'))
+# Messages redrawn on every rerun; older ones are paged in on request
+RECENT_MESSAGES = 20
+
+# Stage timings, tokens and cost; add ?debug=1 to the URL for the timings panel
+metrics = get_metrics('verseforge')
+
 # Set up the page configuration
 st.set_page_config(
     page_title="VerseForge - AI Lyrics Mixer",
@@ -14,8 +40,10 @@ st.set_page_config(
 
 # Function to set the background image
 def set_background(image_path):
-    with open(image_path, "rb") as image_file:
-        image_data = base64.b64encode(image_file.read()).decode("utf-8")
+    # The background is dimmed and blurred, so a small JPEG looks the same.
+    # It is encoded once per process and served by URL when static serving is on.
+    static_dir = STATIC_DIR if st.get_option('server.enableStaticServing') else None
+    background_url = image_url(image_path, static_dir, max_width=1600, max_bytes=250_000)
 
     background_style = f"""
     <style>
@@ -27,7 +55,7 @@ def set_background(image_path):
         left: 0;
         width: 100%;
         height: 100%;
-        background-image: url("data:image/jpg;base64,{image_data}");
+        background-image: url("{background_url}");
         background-size: cover;
         background-position: center;
         background-repeat: no-repeat;
@@ -82,7 +110,27 @@ def set_background(image_path):
     }}
     </style>
     """
-    st.markdown(background_style, unsafe_allow_html=True)
+    st.markdown(minify_css(background_style), unsafe_allow_html=True)
+
+# Shared by every session in the process
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(os.path.join(CACHE_DIR, 'mixes.sqlite'))
+
+def normalize_text(text, casefold=False):
+    # Ignore differences that don't change the request: unicode forms, spacing, blank lines
+    text = unicodedata.normalize('NFC', text)
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in text.splitlines()]
+    text = '\n'.join(line for line in lines if line)
+    return text.casefold() if casefold else text
+
+def mix_cache_key(song_lyrics, direction):
+    return make_key(
+        lyrics=[normalize_text(lyrics) for lyrics in song_lyrics],
+        direction=normalize_text(direction, casefold=True),
+        model=MIX_MODEL,
+        prompt_version=MIX_PROMPT_VERSION
+    )
 
 # Custom CSS for enhanced styling
 def load_custom_css():
@@ -157,20 +205,29 @@ def load_custom_css():
     }
     </style>
     """
-    st.markdown(custom_css, unsafe_allow_html=True)
+    st.markdown(minify_css(custom_css), unsafe_allow_html=True)
 
 # Main application class
 class VerseForgeApp:
     def __init__(self):
         # Initialize session state variables
         if 'chat_history' not in st.session_state:
-            st.session_state.chat_history = []
+            st.session_state.chat_history = ChatHistory()
         if 'song_lyrics' not in st.session_state:
+            # References into the chat history, which already holds the pasted lyrics
             st.session_state.song_lyrics = []
         if 'current_stage' not in st.session_state:
             st.session_state.current_stage = 'start'
         if 'total_songs' not in st.session_state:
             st.session_state.total_songs = 0
+        if 'stream_responses' not in st.session_state:
+            st.session_state.stream_responses = True
+        if 'last_metrics' not in st.session_state:
+            st.session_state.last_metrics = None
+        if 'fresh_mix' not in st.session_state:
+            st.session_state.fresh_mix = False
+        # Completions run on the shared worker pool; a rerun cancels the previous run's
+        self.llm = get_scheduler().session(current_session_id())
 
     def system_prompt(self):
         return """
@@ -185,18 +242,79 @@ Your task is to guide the user through the lyric mixing process:
 Be conversational, encouraging, and help users explore their musical creativity!
 """
 
-    def chat_message(self, content, role='assistant'):
-        # Add message to chat history
-        st.session_state.chat_history.append({
-            'role': role,
-            'content': content
-        })
+    def chat_message(self, content, role='assistant', keep=True):
+        # Add message to chat history, unless it is only shown for this run
+        if keep:
+            st.session_state.chat_history.append(role, content)
 
         # Display message
         with st.chat_message(role):
             st.markdown(content)
 
-    def get_ai_response(self, user_input):
+    def stream_chat_message(self, generate, role='assistant', keep=True):
+        # Render the reply token by token, then keep the final text in history.
+        # generate(on_token) produces the reply and returns the final text.
+        with st.chat_message(role):
+            placeholder = st.empty()
+            streamed = ''
+
+            def on_token(token):
+                nonlocal streamed
+                streamed += token
+                placeholder.markdown(streamed + '▌')
+
+            content = generate(on_token)
+            placeholder.markdown(content)
+
+        if keep:
+            st.session_state.chat_history.append(role, content)
+        return content
+
+    def clear_song_lyrics(self):
+        for ref in st.session_state.song_lyrics:
+            st.session_state.chat_history.release(ref)
+        st.session_state.song_lyrics = []
+
+    def show_latency(self):
+        last = st.session_state.last_metrics
+        if last and last.get('cached'):
+            st.caption("Served from the mix cache · tick 'Fresh mix' for a new take")
+        elif last:
+            st.caption(
+                f"First token after {last['time_to_first_token']:.2f}s · "
+                f"complete after {last['total_latency']:.2f}s"
+                f"{' (streamed)' if last['streamed'] else ''} · "
+                f"prompt {last['prompt_size']} tokens"
+            )
+
+    def mix_songs(self, song_lyrics, direction, on_token=None):
+        # Reuse an earlier mix of the same songs and direction unless a fresh one is asked for
+        cache = get_response_cache()
+        key = mix_cache_key(song_lyrics, direction)
+        if not st.session_state.fresh_mix:
+            cached = cache.get(key)
+            if cached is not None:
+                st.session_state.last_metrics = {'cached': True}
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+
+        combined_input = "\n\n".join(song_lyrics) + f"\n\nCreative Direction: {direction}"
+        mixed_song = self.get_ai_response(combined_input, on_token=on_token)
+
+        last = st.session_state.last_metrics
+        cache.set(
+            key,
+            mixed_song,
+            latency=last['total_latency'],
+            prompt_tokens=last['prompt_tokens'] or 0,
+            completion_tokens=last['completion_tokens'] or 0
+        )
+        return mixed_song
+
+    def get_ai_response(self, user_input, on_token=None):
+        # A mix is sent on its own, without the chat history: the lyrics and
+        # direction are all it needs, and identical requests can share the cache.
         # System prompt for lyric generation
         system_prompt = """
 <MusicMixerPrompt>
@@ -281,21 +399,57 @@ Be conversational, encouraging, and help users explore their musical creativity!
 </MusicMixerPrompt>
         """
 
-        # Generate mixed song
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[
+        with metrics.stage('prompt_build'):
+            messages = [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_input}
             ]
-        )
+            prompt_size = count_messages(messages, MIX_MODEL)
+
+        # Generate mixed song, streaming tokens to the caller when asked. The key is
+        # passed explicitly since the call runs on a worker shared with other sessions.
+        waiting = st.empty()
 
-        return response.choices[0].message.content
+        def show_queue(job):
+            if job.status == 'queued':
+                waiting.caption(f"Waiting for a free mixer · {get_scheduler().stats()['queued']} requests queued")
+            else:
+                waiting.empty()
+
+        try:
+            with metrics.stage('completion', streamed=on_token is not None):
+                if on_token is None:
+                    content, completion = self.llm.run(
+                        blocking_chat_completion, messages, model=MIX_MODEL, api_key=openai.api_key, on_wait=show_queue
+                    )
+                else:
+                    content, completion = self.llm.run(
+                        stream_chat_completion, messages, model=MIX_MODEL, api_key=openai.api_key,
+                        on_token=on_token, on_wait=show_queue
+                    )
+        except openai.error.AuthenticationError:
+            # The key was revoked since it was validated; re-probe next rerun
+            invalidate_api_key(openai.api_key)
+            raise
+        finally:
+            waiting.empty()
+
+        # Streamed replies carry no usage block, so count those tokens locally
+        estimated = completion.prompt_tokens is None
+        if estimated:
+            completion.prompt_tokens = prompt_size
+            completion.completion_tokens = count_tokens(content, MIX_MODEL)
+        metrics.record_usage(MIX_MODEL, completion.prompt_tokens, completion.completion_tokens, estimated=estimated)
+
+        st.session_state.last_metrics = dict(completion.as_dict(), prompt_size=prompt_size)
+        return content
 
     def run(self):
         # Sidebar for API key and navigation
         with st.sidebar:
-            st.image('day_3/ai-first-day-3-activity-5-6/images/logo.jpg')
+            with metrics.stage('asset_load'):
+                logo = load_image('day_3/ai-first-day-3-activity-5-6/images/logo.jpg', max_width=512)
+            st.image(logo.data)
 
             # API key input
             api_key_container = st.empty()
@@ -310,32 +464,61 @@ Be conversational, encouraging, and help users explore their musical creativity!
                 st.warning('Please enter your OpenAI API token!', icon='⚠️')
             else:
                 try:
-                    openai.ChatCompletion.create(
-                        model="gpt-4o-mini",
-                        messages=[{"role": "user", "content": "test"}],
-                        max_tokens=5
-                    )
-                    st.success('Ready to mix some melodies!', icon='🎵')
-                except openai.error.AuthenticationError:
-                    st.error('Invalid API key. Please check your token and try again.', icon='🚫')
+                    # Cached per key, so reruns don't send a probe completion
+                    with metrics.stage('key_validation'):
+                        key_valid = validate_api_key(openai.api_key)
+                    if key_valid:
+                        st.success('Ready to mix some melodies!', icon='🎵')
+                    else:
+                        st.error('Invalid API key. Please check your token and try again.', icon='🚫')
                 except openai.error.APIError as e:
                     st.error(f'OpenAI API error: {str(e)}', icon='❌')
                 except Exception as e:
                     st.error(f'An error occurred: {str(e)}', icon='⚠️')
 
-            # Navigation menu
+            st.session_state.stream_responses = st.checkbox(
+                'Stream responses',
+                value=st.session_state.stream_responses,
+                help='Show the mixed song as it is being written'
+            )
+            st.session_state.fresh_mix = st.checkbox(
+                'Fresh mix',
+                value=st.session_state.fresh_mix,
+                help='Skip the cache and generate a new take even for songs mixed before'
+            )
+            with st.expander('Mix cache'):
+                stats = get_response_cache().stats()
+                st.caption(
+                    f"{stats['hits']} hits · {stats.get('misses', 0)} misses · "
+                    f"{stats['hit_rate']:.0%} hit rate\n\n"
+                    f"Saved {stats.get('saved_seconds', 0.0):.1f}s and "
+                    f"{stats.get('saved_prompt_tokens', 0) + stats.get('saved_completion_tokens', 0)} tokens"
+                )
+
+            # Navigation menu; ?page=Mix Songs opens a page directly (links, headless load tests)
+            pages = ["Home", "Mix Songs", "About"]
+            requested_page = st.query_params.get('page')
             options = option_menu(
                 "VerseForge",
-                ["Home", "Mix Songs", "About"],
+                pages,
                 icons=['house', 'music-note', 'info-circle'],
                 menu_icon="list",
-                default_index=0,
+                default_index=pages.index(requested_page) if requested_page in pages else 0,
                 styles={
                     "icon": {"color": "#dec960"},
                     "nav-link-selected": {"background-color": "#262730"}
                 }
             )
 
+            if st.query_params.get('debug'):
+                with st.expander('Timings', expanded=True):
+                    st.dataframe(metrics.debug_rows(), hide_index=True)
+                    for model, usage in metrics.usage().items():
+                        st.caption(
+                            f"{model}: {usage['prompt_tokens']} prompt + {usage['completion_tokens']} "
+                            f"completion tokens · ${usage['cost_usd']:.4f} on this server"
+                        )
+
         # Main content area
         st.markdown("<h1 style='text-align:center; color:#dec960;'>VerseForge - AI Music Mixer</h1>", unsafe_allow_html=True)
 
@@ -360,10 +543,9 @@ Be conversational, encouraging, and help users explore their musical creativity!
             chat_container = st.container()
 
             with chat_container:
-                # Display chat history
-                for message in st.session_state.chat_history:
-                    with st.chat_message(message['role']):
-                        st.markdown(message['content'])
+                # Display the latest messages; older ones only when paged in
+                with metrics.stage('render'):
+                    render_chat_history(st.session_state.chat_history, recent=RECENT_MESSAGES)
 
             # User input
             user_input = st.chat_input("Let's mix some music!")
@@ -382,7 +564,7 @@ Be conversational, encouraging, and help users explore their musical creativity!
                         total_songs = int(user_input)
                         if 2 <= total_songs <= 5:
                             st.session_state.total_songs = total_songs
-                            st.session_state.song_lyrics = []
+                            self.clear_song_lyrics()
                             self.chat_message(f"Great! We'll mix {total_songs} songs. Please provide the lyrics for Song 1.")
                             st.session_state.current_stage = 'collecting_lyrics'
                         else:
@@ -391,7 +573,7 @@ Be conversational, encouraging, and help users explore their musical creativity!
                         self.chat_message("Please enter a valid number between 2 and 5.")
 
                 elif st.session_state.current_stage == 'collecting_lyrics':
-                    st.session_state.song_lyrics.append(user_input)
+                    st.session_state.song_lyrics.append(st.session_state.chat_history.store(user_input))
 
                     if len(st.session_state.song_lyrics) < st.session_state.total_songs:
                         self.chat_message(f"Lyrics for Song {len(st.session_state.song_lyrics)} added. Please provide lyrics for Song {len(st.session_state.song_lyrics) + 1}.")
@@ -400,15 +582,32 @@ Be conversational, encouraging, and help users explore their musical creativity!
                         st.session_state.current_stage = 'creative_direction'
 
                 elif st.session_state.current_stage == 'creative_direction':
-                    # Combine lyrics with creative direction
-                    combined_input = "\n\n".join(st.session_state.song_lyrics) + f"\n\nCreative Direction: {user_input}"
-
-                    # Generate mixed song
-                    mixed_song = self.get_ai_response(combined_input)
-
-                    # Display mixed song
-                    self.chat_message("Here's your mixed song masterpiece!")
-                    self.chat_message(mixed_song)
+                    # Generate and display mixed song from the lyrics and creative direction
+                    history = st.session_state.chat_history
+                    song_lyrics = [history.text(ref) for ref in st.session_state.song_lyrics]
+                    # Shown before the mix, but only kept in history once the song is there
+                    # to follow it, so a failed mix doesn't leave it behind on its own
+                    intro = "Here's your mixed song masterpiece!"
+                    self.chat_message(intro, keep=False)
+                    try:
+                        if st.session_state.stream_responses:
+                            mixed_song = self.stream_chat_message(
+                                lambda on_token: self.mix_songs(song_lyrics, user_input, on_token=on_token),
+                                keep=False
+                            )
+                        else:
+                            mixed_song = self.mix_songs(song_lyrics, user_input)
+                            self.chat_message(mixed_song, keep=False)
+                    except openai.error.AuthenticationError:
+                        st.error('Your API key was rejected. Please check your token and try again.', icon='🚫')
+                        return
+                    except SchedulerBusy:
+                        # Keep the lyrics so the same direction can simply be sent again
+                        st.warning('VerseForge is busy mixing for other listeners. Please send your direction again in a moment.', icon='⏳')
+                        return
+                    history.append('assistant', intro)
+                    history.append('assistant', mixed_song)
+                    self.show_latency()
 
                     # Add download button
                     st.download_button(
@@ -420,13 +619,14 @@ Be conversational, encouraging, and help users explore their musical creativity!
 
                     # Reset for next mixing session
                     st.session_state.current_stage = 'start'
-                    st.session_state.song_lyrics = []
+                    self.clear_song_lyrics()
 
 # Main app execution
 def main():
     # Set background and load custom CSS
-    set_background("day_3/ai-first-day-3-activity-5-6/images/studio.jpg")
-    load_custom_css()
+    with metrics.stage('asset_load'):
+        set_background("day_3/ai-first-day-3-activity-5-6/images/studio.jpg")
+        load_custom_css()
 
     # Initialize and run the app
     app = VerseForgeApp()
@@ -0,0 +1,99 @@
+"""Session chat history for VerseForge with de-duplicated storage and windowed rendering.
+
+Message texts live once in a content-addressed store; messages and the
+lyrics being collected only hold references to them, so a song pasted as a
+chat message and kept for mixing is stored a single time. When the stored
+text exceeds ``max_bytes`` the oldest messages are dropped.
+
+``render_chat_history`` draws only the newest messages on each rerun; older
+ones are rendered one page at a time, and only while the reader has asked
+to see them.
+"""
+import hashlib
+import math
+
+import streamlit as st
+
+
+class ChatHistory:
+    def __init__(self, max_bytes=2 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._messages = []
+        self._texts = {}
+        self._refs = {}
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return (self._message(entry) for entry in self._messages)
+
+    @property
+    def stored_bytes(self):
+        return self._bytes
+
+    def append(self, role, content):
+        self._messages.append((role, self.store(content)))
+        self._enforce_cap()
+
+    def store(self, text):
+        """Keep ``text`` (once) and return a reference; pair with ``release``."""
+        ref = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if ref not in self._texts:
+            self._texts[ref] = text
+            self._refs[ref] = 0
+            self._bytes += len(text.encode("utf-8"))
+        self._refs[ref] += 1
+        return ref
+
+    def release(self, ref):
+        self._refs[ref] -= 1
+        if not self._refs[ref]:
+            self._bytes -= len(self._texts.pop(ref).encode("utf-8"))
+            del self._refs[ref]
+
+    def text(self, ref):
+        return self._texts[ref]
+
+    def recent(self, count):
+        return [self._message(entry) for entry in self._messages[-count:]] if count else []
+
+    def older_count(self, recent):
+        return max(0, len(self._messages) - recent)
+
+    def page(self, number, page_size, recent):
+        """Messages of page ``number`` (0 = oldest) among those not in the recent window."""
+        older = self._messages[:self.older_count(recent)]
+        return [self._message(entry) for entry in older[number * page_size:(number + 1) * page_size]]
+
+    def _message(self, entry):
+        role, ref = entry
+        return {'role': role, 'content': self._texts[ref]}
+
+    def _enforce_cap(self):
+        # Never drop the newest message, even if it alone is over the cap
+        while self._bytes > self.max_bytes and len(self._messages) > 1:
+            _, ref = self._messages.pop(0)
+            self.release(ref)
+            self.dropped += 1
+
+
+def render_chat_history(history, recent=20, page_size=20):
+    older = history.older_count(recent)
+    if older:
+        pages = math.ceil(older / page_size)
+        with st.expander(f"{older} earlier messages"):
+            # Nothing older is rendered (or re-sent to the browser) unless asked for
+            if st.checkbox('Show earlier messages', key='show_earlier_messages'):
+                page = st.number_input('Page', min_value=1, max_value=pages, value=pages, key='history_page')
+                for message in history.page(page - 1, page_size, recent):
+                    with st.chat_message(message['role']):
+                        st.markdown(message['content'])
+    if history.dropped:
+        st.caption(f"{history.dropped} older messages were cleared to keep this session light.")
+
+    for message in history.recent(recent):
+        with st.chat_message(message['role']):
+            st.markdown(message['content'])
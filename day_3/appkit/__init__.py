@@ -0,0 +1,5 @@
+"""Shared helpers for the day 3 Streamlit apps (VerseForge and Mijikai News).
+
+The apps are launched from the repository root with ``streamlit run``, so
+each ``app.py`` puts ``day_3/`` on ``sys.path`` before importing from here.
+"""
@@ -0,0 +1,131 @@
+"""Static assets (images and CSS) prepared once per process.
+
+Streamlit re-emits every element on each rerun, so inlining a multi-MB
+base64 background in a ``<style>`` block re-ships it on every click. Images
+loaded here are read, optionally downscaled/recompressed to a byte budget,
+and cached for the life of the process (keyed on path, mtime and options).
+With ``server.enableStaticServing`` the result is written to the app's
+``static/`` folder once and referenced by URL, otherwise a cached data URI
+is used. Pillow is optional; without it images are passed through as-is.
+"""
+import base64
+import functools
+import hashlib
+import io
+import os
+import re
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow ships with Streamlit
+    Image = None
+
+
+MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+MIN_WIDTH = 320
+
+
+class ImageAsset:
+    def __init__(self, data, mime, source):
+        self.data = data
+        self.mime = mime
+        self.source = source
+        self.digest = hashlib.sha256(data).hexdigest()
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @functools.cached_property
+    def data_uri(self):
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+    @property
+    def file_name(self):
+        stem = os.path.splitext(os.path.basename(self.source))[0].replace(" ", "_")
+        return f"{stem}-{self.digest[:12]}{EXTENSIONS.get(self.mime, '.bin')}"
+
+
+def load_image(path, max_width=None, max_bytes=None):
+    """Return the (possibly shrunk) image at ``path``, computed once per process."""
+    path = os.path.abspath(path)
+    return _load_image(path, os.stat(path).st_mtime_ns, max_width, max_bytes)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_image(path, mtime_ns, max_width, max_bytes):
+    with open(path, "rb") as image_file:
+        data = image_file.read()
+    mime = MIME_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+    if Image is not None and (max_width or (max_bytes and len(data) > max_bytes)):
+        shrunk, shrunk_mime = _shrink(data, max_width, max_bytes)
+        if len(shrunk) < len(data):
+            data, mime = shrunk, shrunk_mime
+    return ImageAsset(data, mime, path)
+
+
+def _shrink(data, max_width, max_bytes):
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if max_width and image.width > max_width:
+        image = _resize(image, max_width)
+
+    # Transparent images stay PNG; everything else is re-encoded as JPEG
+    if image.mode in ("RGBA", "LA", "P"):
+        return _encode(image, "PNG"), "image/png"
+
+    image = image.convert("RGB")
+    while True:
+        for quality in (85, 75, 65, 55):
+            encoded = _encode(image, "JPEG", quality=quality, optimize=True, progressive=True)
+            if not max_bytes or len(encoded) <= max_bytes:
+                return encoded, "image/jpeg"
+        if image.width <= MIN_WIDTH:
+            return encoded, "image/jpeg"
+        image = _resize(image, max(MIN_WIDTH, int(image.width * 0.75)))
+
+
+def _resize(image, width):
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _encode(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def publish_static(asset, static_dir):
+    """Write ``asset`` under ``static_dir`` (once) and return its served URL."""
+    target = os.path.join(static_dir, asset.file_name)
+    if not os.path.exists(target):
+        os.makedirs(static_dir, exist_ok=True)
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as static_file:
+            static_file.write(asset.data)
+        os.replace(temp_path, target)
+    return f"app/static/{asset.file_name}"
+
+
+def image_url(path, static_dir=None, max_width=None, max_bytes=None):
+    """URL for use in CSS: a static-file URL when ``static_dir`` is given, else a data URI."""
+    asset = load_image(path, max_width=max_width, max_bytes=max_bytes)
+    if static_dir:
+        return publish_static(asset, static_dir)
+    return asset.data_uri
+
+
+@functools.lru_cache(maxsize=64)
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
@@ -0,0 +1,124 @@
+"""Token-bounded conversation context with a rolling summary.
+
+Keeps the most recent turns verbatim while they fit in ``budget`` tokens
+(counted with tiktoken). Older turns are folded into a running summary by
+``summarize(previous_summary, turns)``, or simply dropped when no
+summarizer is given, so the prompt stops growing with the conversation.
+Folding happens when the next prompt is built, not when a reply is added,
+and a summary that fails leaves its turns to be folded on the next try.
+
+    context = ConversationContext(system_prompt, budget=3000, summarize=llm_summarizer())
+    context.add("user", user_message)
+    messages = context.messages()
+    print(f"prompt: {context.record_prompt(messages)} tokens")
+"""
+from appkit.summarize import count_tokens
+
+# Approximate per-message overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the previous summary with the new turns into one updated summary of at most {words} words. "
+    "Keep names, decisions, preferences, requests and any content the user may refer back to. "
+    "Reply with the summary only."
+)
+
+
+def count_messages(messages, model="gpt-4o-mini"):
+    """Approximate prompt tokens of a chat request."""
+    # Replies are primed with a few extra tokens
+    return sum(count_tokens(m["content"], model) + MESSAGE_OVERHEAD_TOKENS for m in messages) + 3
+
+
+def llm_summarizer(model="gpt-4o-mini", words=150, complete=None):
+    """Return a ``summarize(previous_summary, turns)`` function backed by a chat completion.
+
+    ``complete(messages)`` performs the completion and returns its text
+    (e.g. on a scheduler queue, with metrics); by default it calls
+    ``openai.ChatCompletion.create`` directly.
+    """
+    if complete is None:
+        import openai
+
+        def complete(messages):
+            chat = openai.ChatCompletion.create(model=model, temperature=0, messages=messages)
+            return chat.choices[0].message.content
+
+    def summarize(previous_summary, turns):
+        transcript = "\n\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        return complete([
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=words)},
+            {"role": "user", "content": f"Previous summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"},
+        ]).strip()
+
+    return summarize
+
+
+class ConversationContext:
+    def __init__(self, system_prompt=None, budget=3000, min_recent=2, summarize=None, model="gpt-4o-mini"):
+        self.system_prompt = system_prompt
+        self.budget = budget
+        self.min_recent = min_recent
+        self.summarize = summarize
+        self.model = model
+        self.summary = ""
+        self.turns = []
+        self.folded_turns = 0
+        self.summary_errors = 0
+        self.prompt_sizes = []
+        # Folded out of the window but not yet in the summary
+        self._unsummarized = []
+
+    def add(self, role, content):
+        self.turns.append({"role": role, "content": content, "tokens": self.count(content)})
+
+    def messages(self):
+        """System prompt, summary of folded turns, then the recent turns verbatim."""
+        self._fold()
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        messages.extend({"role": turn["role"], "content": turn["content"]} for turn in self.turns)
+        return messages
+
+    def count(self, text):
+        return count_tokens(text, self.model)
+
+    def count_messages(self, messages):
+        return count_messages(messages, self.model)
+
+    def record_prompt(self, messages):
+        """Count the tokens of a prompt about to be sent and remember it for ``report()``."""
+        tokens = self.count_messages(messages)
+        self.prompt_sizes.append(tokens)
+        return tokens
+
+    def report(self):
+        return {
+            "turns_kept": len(self.turns),
+            "turns_folded": self.folded_turns,
+            "summary_errors": self.summary_errors,
+            "window_tokens": self._window_tokens(),
+            "summary_tokens": self.count(self.summary) if self.summary else 0,
+            "prompt_tokens_per_turn": list(self.prompt_sizes),
+        }
+
+    def _window_tokens(self):
+        return sum(turn["tokens"] + MESSAGE_OVERHEAD_TOKENS for turn in self.turns)
+
+    def _fold(self):
+        while len(self.turns) > self.min_recent and self._window_tokens() > self.budget:
+            self._unsummarized.append(self.turns.pop(0))
+            self.folded_turns += 1
+        if not self._unsummarized:
+            return
+        if self.summarize is not None:
+            try:
+                self.summary = self.summarize(self.summary, self._unsummarized)
+            except Exception:
+                # The prompt goes out with the previous summary; these turns are retried next time
+                self.summary_errors += 1
+                return
+        self._unsummarized = []
@@ -0,0 +1,221 @@
+"""Persistent near-duplicate index of summarized texts.
+
+Texts are embedded, L2-normalized and kept in a FAISS inner-product index
+(so scores are cosine similarities) next to a JSON file with each entry's
+summary, source and age. ``lookup`` returns the stored entry for the most
+similar text above ``threshold``; byte-identical texts are matched by hash
+without embedding. ``match`` also returns the text's vector, which ``add``
+takes back so a new text is embedded once. Entries are added
+incrementally and dropped once older than ``max_age`` seconds; changes are
+written to disk at most every ``save_interval`` seconds and on ``flush``.
+
+``embed(text)`` must return a 1-D vector of length ``dim``; keyword
+arguments given to ``lookup`` and ``add`` are passed on to it for that
+call. ``HashingEmbedder`` is a deterministic local stand-in for tests and
+benchmarks; ``OpenAIEmbedder`` is what the app uses.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import openai
+
+from appkit.lazy import lazy_import
+
+# Only needed once an index is opened, so the apps start without them
+faiss = lazy_import("faiss")
+np = lazy_import("numpy")
+
+
+class HashingEmbedder:
+    """Feature-hashed word and word-pair counts; deterministic and offline."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def __call__(self, text):
+        words = re.findall(r"\w+", text.lower())
+        vector = np.zeros(self.dim, dtype="float32")
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+
+class OpenAIEmbedder:
+    """Embeddings from the API, called with the caller's ``api_key``.
+
+    The index is shared by every session in the process, so each call names
+    its key instead of relying on ``openai.api_key``. ``create`` stands in
+    for ``openai.Embedding.create`` to route the call (rate limits, the
+    scheduler, metrics).
+    """
+
+    def __init__(self, model="text-embedding-3-small", dim=1536, max_tokens=8000):
+        self.model = model
+        self.dim = dim
+        self.max_tokens = max_tokens
+
+    def __call__(self, text, api_key=None, create=None):
+        import tiktoken
+
+        # The embeddings endpoint rejects inputs over ~8k tokens
+        encoding = tiktoken.get_encoding("cl100k_base")
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) > self.max_tokens:
+            text = encoding.decode(tokens[:self.max_tokens])
+        # Called directly: openai.embeddings_utils drags in pandas, scipy, sklearn and matplotlib
+        create = openai.Embedding.create if create is None else create
+        response = create(input=[text], model=self.model, api_key=api_key)
+        return np.asarray(response["data"][0]["embedding"], dtype="float32")
+
+
+class NearDuplicateIndex:
+    def __init__(self, path, embed, dim, threshold=0.92, max_age=7 * 24 * 3600, clock=time.time, save_interval=30.0):
+        self.path = path
+        self.embed = embed
+        self.dim = dim
+        self.threshold = threshold
+        self.max_age = max_age
+        self.clock = clock
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        # Held while writing, so two saves from this process don't interleave
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(self._index_path) and os.path.exists(self._entries_path):
+            self.index = faiss.read_index(self._index_path)
+            with open(self._entries_path, encoding="utf-8") as entries_file:
+                state = json.load(entries_file)
+            self.entries = {int(key): value for key, value in state["entries"].items()}
+            self.next_id = state["next_id"]
+        else:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+            self.entries = {}
+            self.next_id = 0
+        self._by_hash = {entry["text_hash"]: entry_id for entry_id, entry in self.entries.items()}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, text, **embed_options):
+        """Return ``(entry, similarity)`` for the closest fresh match above threshold, else None."""
+        return self.match(text, **embed_options)[0]
+
+    def match(self, text, **embed_options):
+        """Like ``lookup``, but returns ``(match, vector)``; pass ``vector`` to ``add``.
+
+        ``vector`` is None when the text was matched by hash or the index is
+        empty, since then nothing was embedded.
+        """
+        now = self.clock()
+        with self._lock:
+            entry_id = self._by_hash.get(_text_hash(text))
+            if entry_id is not None and now - self.entries[entry_id]["added_at"] < self.max_age:
+                return (self.entries[entry_id], 1.0), None
+            if not self.entries:
+                return None, None
+
+        vector = self._normalized(text, **embed_options)
+        with self._lock:
+            scores, ids = self.index.search(vector, min(4, len(self.entries)))
+            for score, entry_id in zip(scores[0], ids[0]):
+                entry = self.entries.get(int(entry_id))
+                if entry is None or score < self.threshold:
+                    continue
+                if now - entry["added_at"] < self.max_age:
+                    return (entry, float(score)), vector
+        return None, vector
+
+    def add(self, text, summary, source=None, vector=None, **embed_options):
+        """Store ``summary`` for ``text``; ``vector`` from ``match`` saves embedding it again."""
+        if vector is None:
+            vector = self._normalized(text, **embed_options)
+        with self._lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+            text_hash = _text_hash(text)
+            self.entries[entry_id] = {
+                "summary": summary,
+                "source": source,
+                "text_hash": text_hash,
+                "added_at": self.clock(),
+            }
+            self._by_hash[text_hash] = entry_id
+            self._dirty = True
+        self._save_if_due()
+        return entry_id
+
+    def evict_expired(self):
+        """Remove entries older than ``max_age``; returns how many were dropped."""
+        cutoff = self.clock() - self.max_age
+        with self._lock:
+            expired = [entry_id for entry_id, entry in self.entries.items() if entry["added_at"] < cutoff]
+            if not expired:
+                return 0
+            self.index.remove_ids(np.array(expired, dtype="int64"))
+            for entry_id in expired:
+                entry = self.entries.pop(entry_id)
+                if self._by_hash.get(entry["text_hash"]) == entry_id:
+                    del self._by_hash[entry["text_hash"]]
+            self._dirty = True
+        self._save_if_due()
+        return len(expired)
+
+    def flush(self):
+        """Write any unsaved changes now."""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                # Copied under the lock, written outside it so lookups aren't held up
+                index_bytes = faiss.serialize_index(self.index)
+                state = json.dumps({"next_id": self.next_id, "entries": self.entries})
+                self._dirty = False
+                self._saved_at = time.monotonic()
+            _write_atomic(self._index_path, index_bytes.tobytes())
+            _write_atomic(self._entries_path, state.encode("utf-8"))
+
+    @property
+    def _index_path(self):
+        return self.path + ".faiss"
+
+    @property
+    def _entries_path(self):
+        return self.path + ".json"
+
+    def _normalized(self, text, **embed_options):
+        vector = np.asarray(self.embed(text, **embed_options), dtype="float32").reshape(1, self.dim).copy()
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _save_if_due(self):
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self.flush()
+
+
+def _write_atomic(path, data):
+    # A temp file of its own, so processes sharing the directory don't write over each other's
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp", delete=False) as out_file:
+        out_file.write(data)
+    try:
+        os.replace(out_file.name, path)
+    except BaseException:
+        os.remove(out_file.name)
+        raise
+
+
+def _text_hash(text):
+    normalized = " ".join(text.split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
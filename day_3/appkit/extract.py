@@ -0,0 +1,89 @@
+"""Article text extraction engines.
+
+``lxml`` is the fast path: it parses with libxml2, drops non-content
+subtrees (scripts, navigation, footers, share bars, ...) before walking the
+text, and skips link-dense paragraphs. ``html.parser`` is the original
+BeautifulSoup behaviour (every ``<p>`` joined) and is used as the fallback
+when lxml is missing or cannot parse the page. New engines register with
+``@register_extractor``.
+"""
+import re
+
+EXTRACTORS = {}
+
+PRUNED_TAGS = frozenset([
+    "script", "style", "noscript", "template", "iframe", "svg", "canvas", "form", "button",
+    "select", "nav", "header", "footer", "aside", "figure",
+])
+BOILERPLATE = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|breadcrumbs?|footer|masthead|sidebar|related|recommended|"
+    r"share|sharing|social|newsletter|subscribe|cookie|consent|promo|advert|ads?|sponsored|"
+    r"comments?|popup|modal)($|[\s_-])",
+    re.I,
+)
+# Containers whose class names commonly mention "header"/"share" but hold the story
+PROTECTED_TAGS = frozenset(["html", "body", "main", "article"])
+MAX_LINK_DENSITY = 0.5
+
+
+def register_extractor(name):
+    def decorator(function):
+        EXTRACTORS[name] = function
+        return function
+    return decorator
+
+
+@register_extractor("html.parser")
+def extract_with_soup(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    return " ".join(p.get_text() for p in soup.find_all("p"))
+
+
+@register_extractor("lxml")
+def extract_with_lxml(html):
+    import lxml.html
+
+    root = lxml.html.fromstring(html)
+    doomed = []
+    for element in root.iter():
+        tag = element.tag if isinstance(element.tag, str) else None
+        if tag is None:
+            # Comments and processing instructions
+            doomed.append(element)
+        elif tag in PRUNED_TAGS:
+            doomed.append(element)
+        elif tag not in PROTECTED_TAGS and BOILERPLATE.search(
+            f"{element.get('class', '')} {element.get('id', '')} {element.get('role', '')}"
+        ):
+            doomed.append(element)
+    for element in doomed:
+        if element.getparent() is not None:
+            element.drop_tree()
+
+    paragraphs = []
+    for paragraph in root.iter("p"):
+        text = " ".join(paragraph.text_content().split())
+        if not text:
+            continue
+        link_text = sum(len(link.text_content()) for link in paragraph.iter("a"))
+        if link_text / len(text) > MAX_LINK_DENSITY:
+            continue
+        paragraphs.append(text)
+    return " ".join(paragraphs)
+
+
+def extract_article_text(html, engine="auto"):
+    """Return the article text of ``html`` (bytes or str).
+
+    ``engine="auto"`` tries lxml and falls back to html.parser if lxml is not
+    installed, fails to parse, or finds no paragraphs.
+    """
+    if engine != "auto":
+        return EXTRACTORS[engine](html)
+    try:
+        text = extract_with_lxml(html)
+    except Exception:
+        text = ""
+    return text or extract_with_soup(html)
@@ -0,0 +1,170 @@
+"""Pooled HTTP fetcher with timeouts and a revalidating on-disk cache.
+
+One ``requests.Session`` (and its keep-alive connection pool) is shared by
+every caller, and every request has connect/read timeouts so a slow site
+cannot hang the script thread. Bodies are stored content-addressed under
+``blobs/`` (identical pages share one file) with per-URL metadata under
+``meta/``. A cached page is served without any request while fresh
+(``Cache-Control: max-age`` or ``default_max_age``); after that it is
+revalidated with ``If-None-Match``/``If-Modified-Since`` so an unchanged page
+costs a 304 instead of a full download.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = "Mozilla/5.0 (compatible; MijikaiNews/1.0; +https://github.com/alphacoma18/AI-Republic-Bootcamp)"
+
+
+class FetchResult:
+    def __init__(self, url, content, content_type, from_cache, revalidated, elapsed):
+        self.url = url
+        self.content = content
+        self.content_type = content_type
+        self.from_cache = from_cache
+        self.revalidated = revalidated
+        self.elapsed = elapsed
+
+    @property
+    def content_hash(self):
+        return hashlib.sha256(self.content).hexdigest()
+
+
+class ArticleFetcher:
+    def __init__(self, cache_dir, connect_timeout=3.05, read_timeout=15, pool_maxsize=16,
+                 max_retries=2, default_max_age=15 * 60, clock=time.time):
+        self.cache_dir = cache_dir
+        self.timeout = (connect_timeout, read_timeout)
+        self.default_max_age = default_max_age
+        self.clock = clock
+        self.stats = {"network": 0, "fresh_hits": 0, "revalidated": 0}
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        os.makedirs(os.path.join(cache_dir, "meta"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "blobs"), exist_ok=True)
+
+    def fetch(self, url, force_refresh=False):
+        """Return a FetchResult for ``url``, raising ``requests`` errors on failure."""
+        started = time.perf_counter()
+        meta = self._read_meta(url)
+        if meta is not None and not force_refresh and self._is_fresh(meta):
+            content = self._read_blob(meta["content_hash"])
+            if content is not None:
+                self._count("fresh_hits")
+                return FetchResult(url, content, meta["content_type"], True, False,
+                                   time.perf_counter() - started)
+
+        headers = {}
+        if meta is not None and os.path.exists(self._blob_path(meta["content_hash"])):
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        self._count("network")
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and headers:
+            meta.update(self._freshness(response, meta))
+            self._write_meta(url, meta)
+            self._count("revalidated")
+            return FetchResult(url, self._read_blob(meta["content_hash"]), meta["content_type"],
+                               True, True, time.perf_counter() - started)
+
+        response.raise_for_status()
+        content = response.content
+        content_type = response.headers.get("Content-Type", "")
+        if "no-store" not in response.headers.get("Cache-Control", ""):
+            content_hash = self._write_blob(content)
+            meta = {
+                "url": url,
+                "content_hash": content_hash,
+                "content_type": content_type,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            meta.update(self._freshness(response, meta))
+            self._write_meta(url, meta)
+        return FetchResult(url, content, content_type, False, False, time.perf_counter() - started)
+
+    def close(self):
+        self.session.close()
+
+    def _freshness(self, response, meta):
+        cache_control = response.headers.get("Cache-Control", "")
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        if "no-cache" in cache_control:
+            ttl = 0
+        elif max_age:
+            ttl = int(max_age.group(1))
+        else:
+            ttl = self.default_max_age
+        # A 304 may refresh the validators
+        etag = response.headers.get("ETag") or meta.get("etag")
+        last_modified = response.headers.get("Last-Modified") or meta.get("last_modified")
+        return {"stored_at": self.clock(), "max_age": ttl, "etag": etag, "last_modified": last_modified}
+
+    def _is_fresh(self, meta):
+        return self.clock() - meta["stored_at"] < meta["max_age"]
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _meta_path(self, url):
+        return os.path.join(self.cache_dir, "meta", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.cache_dir, "blobs", content_hash[:2], content_hash)
+
+    def _read_meta(self, url):
+        try:
+            with open(self._meta_path(url), encoding="utf-8") as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, url, meta):
+        _atomic_write(self._meta_path(url), json.dumps(meta).encode("utf-8"))
+
+    def _read_blob(self, content_hash):
+        try:
+            with open(self._blob_path(content_hash), "rb") as blob_file:
+                return blob_file.read()
+        except OSError:
+            return None
+
+    def _write_blob(self, content):
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, content)
+        return content_hash
+
+
+def _atomic_write(path, data):
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as temp_file:
+        temp_file.write(data)
+    os.replace(temp_path, path)
@@ -0,0 +1,118 @@
+"""Process-wide cache of OpenAI API-key validation results.
+
+Streamlit reruns the whole script on every interaction, so probing the key
+with a test completion each time costs a round trip and tokens per click.
+Results are kept per SHA-256 of the key (the key itself is never stored):
+valid keys for ``ttl`` seconds, rejected keys for ``negative_ttl`` seconds.
+Transient failures (network, 5xx) are not cached. At most ``max_entries``
+keys are remembered, least recently used first out, and expired entries are
+dropped as new ones come in. The module-level cache is shared by every
+session served by the process.
+"""
+import collections
+import hashlib
+import threading
+import time
+import weakref
+
+import openai
+
+
+def key_fingerprint(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def probe_api_key(api_key):
+    # Cheapest real request that proves the key works
+    openai.ChatCompletion.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": "test"}],
+        max_tokens=5,
+        api_key=api_key,
+    )
+
+
+class KeyValidationCache:
+    def __init__(self, ttl=15 * 60, negative_ttl=60, probe=probe_api_key, clock=time.monotonic, max_entries=1024):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.probe = probe
+        self.clock = clock
+        self.max_entries = max_entries
+        self.probes = 0
+        # Fingerprint -> (valid, expires_at), least recently used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Only kept while some thread is probing that key
+        self._key_locks = weakref.WeakValueDictionary()
+
+    def validate(self, api_key):
+        """Return True/False for the key, probing only on a cache miss.
+
+        Errors other than ``AuthenticationError`` propagate uncached so a
+        flaky network does not mark a good key as invalid.
+        """
+        fingerprint = key_fingerprint(api_key)
+        cached = self._lookup(fingerprint)
+        if cached is not None:
+            return cached
+
+        # One probe per key even when several sessions submit it at once
+        with self._key_lock(fingerprint):
+            cached = self._lookup(fingerprint)
+            if cached is not None:
+                return cached
+            self.probes += 1
+            try:
+                self.probe(api_key)
+            except openai.error.AuthenticationError:
+                self._store(fingerprint, False, self.negative_ttl)
+                return False
+            self._store(fingerprint, True, self.ttl)
+            return True
+
+    def invalidate(self, api_key):
+        with self._lock:
+            self._entries.pop(key_fingerprint(api_key), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, fingerprint):
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            valid, expires_at = entry
+            if self.clock() >= expires_at:
+                del self._entries[fingerprint]
+                return None
+            self._entries.move_to_end(fingerprint)
+            return valid
+
+    def _store(self, fingerprint, valid, ttl):
+        with self._lock:
+            now = self.clock()
+            self._entries[fingerprint] = (valid, now + ttl)
+            self._entries.move_to_end(fingerprint)
+            if len(self._entries) > self.max_entries:
+                for expired in [key for key, (_, expires_at) in self._entries.items() if now >= expires_at]:
+                    del self._entries[expired]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _key_lock(self, fingerprint):
+        with self._lock:
+            return self._key_locks.setdefault(fingerprint, threading.Lock())
+
+
+_cache = KeyValidationCache()
+
+
+def validate_api_key(api_key):
+    return _cache.validate(api_key)
+
+
+def invalidate_api_key(api_key):
+    _cache.invalidate(api_key)
@@ -0,0 +1,48 @@
+"""Modules that are imported on first use instead of at import time.
+
+``np = lazy_import("numpy")`` binds a placeholder; the real import happens
+the first time an attribute is looked up, e.g. ``np.zeros``, so a code path
+that never touches numpy never pays for it. The import runs once, under a
+lock, even when several sessions reach it at the same moment.
+"""
+import importlib
+import sys
+import threading
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self.__dict__["_module"] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.load(), attr, value)
+
+    def __dir__(self):
+        return dir(self.load())
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """A ``LazyModule`` for ``name`` (or the module itself if already imported)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
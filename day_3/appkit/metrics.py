@@ -0,0 +1,228 @@
+"""Stage timings, token counts and estimated cost for the Streamlit apps.
+
+Wrap each stage of a request in ``metrics.stage(name)`` and report LLM
+usage with ``record_usage``. The last ``window`` durations of every stage
+are kept for percentiles, alongside running totals. Every event is
+appended as one JSON line to ``log_path``, and the totals are written in
+the Prometheus text format to ``textfile_path`` at most every
+``export_interval`` seconds, for node_exporter's textfile collector or
+anything else that scrapes a file.
+"""
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+# USD per million (prompt, completion) tokens; dated model names match by prefix
+PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost of one call, or 0.0 for models without a known price."""
+    matches = [name for name in PRICES_PER_MILLION if model.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = PRICES_PER_MILLION[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+class Metrics:
+    def __init__(self, app, log_path=None, textfile_path=None, window=1000, export_interval=15.0,
+                 clock=time.time):
+        self.app = app
+        self.log_path = log_path
+        self.textfile_path = textfile_path
+        self.export_interval = export_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._durations = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._counts = collections.Counter()
+        self._errors = collections.Counter()
+        self._seconds = collections.Counter()
+        self._tokens = collections.Counter()
+        self._cost = collections.Counter()
+        self._exported_at = None
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        """Time the enclosed block as ``name``; an exception counts as an error and propagates."""
+        started = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, ok=ok, **fields)
+
+    def observe(self, name, seconds, ok=True, **fields):
+        with self._lock:
+            self._durations[name].append(seconds)
+            self._counts[name] += 1
+            self._seconds[name] += seconds
+            if not ok:
+                self._errors[name] += 1
+        self._log(dict(fields, event="stage", stage=name, seconds=round(seconds, 6), ok=ok))
+
+    def record_usage(self, model, prompt_tokens, completion_tokens, estimated=False, **fields):
+        """Count the tokens of one call and return its estimated cost in USD.
+
+        ``estimated`` marks counts made locally (e.g. for streamed replies,
+        which come without a usage block) rather than reported by the API.
+        """
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            self._tokens[model, "prompt"] += prompt_tokens
+            self._tokens[model, "completion"] += completion_tokens
+            self._cost[model] += cost
+        self._log(dict(
+            fields,
+            event="usage",
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            estimated=estimated,
+            cost_usd=round(cost, 8),
+        ))
+        return cost
+
+    def summary(self):
+        """Per stage: count, errors, total seconds and p50/p95 over the recent window."""
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+            return {
+                name: {
+                    "count": self._counts[name],
+                    "errors": self._errors[name],
+                    "seconds": self._seconds[name],
+                    "p50": _percentile(values, 0.5),
+                    "p95": _percentile(values, 0.95),
+                }
+                for name, values in durations.items()
+            }
+
+    def usage(self):
+        with self._lock:
+            models = {model for model, _ in self._tokens}
+            return {
+                model: {
+                    "prompt_tokens": self._tokens[model, "prompt"],
+                    "completion_tokens": self._tokens[model, "completion"],
+                    "cost_usd": self._cost[model],
+                }
+                for model in sorted(models)
+            }
+
+    def debug_rows(self):
+        """Rows for a table in the apps' debug panel, slowest stage first."""
+        rows = [
+            {
+                "stage": name,
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "p50 (ms)": round(stats["p50"] * 1000, 1),
+                "p95 (ms)": round(stats["p95"] * 1000, 1),
+            }
+            for name, stats in self.summary().items()
+        ]
+        return sorted(rows, key=lambda row: row["p95 (ms)"], reverse=True)
+
+    def prometheus_text(self):
+        app = self.app
+        lines = [
+            "# HELP appkit_stage_seconds Time spent in each stage of a request.",
+            "# TYPE appkit_stage_seconds summary",
+        ]
+        summary = self.summary()
+        for name, stats in summary.items():
+            for quantile in ("0.5", "0.95"):
+                value = stats["p50"] if quantile == "0.5" else stats["p95"]
+                lines.append(f"appkit_stage_seconds{{{_labels(app=app, stage=name, quantile=quantile)}}} {value:.6f}")
+            lines.append(f"appkit_stage_seconds_sum{{{_labels(app=app, stage=name)}}} {stats['seconds']:.6f}")
+            lines.append(f"appkit_stage_seconds_count{{{_labels(app=app, stage=name)}}} {stats['count']}")
+        lines += [
+            "# HELP appkit_stage_errors_total Stages that ended with an exception.",
+            "# TYPE appkit_stage_errors_total counter",
+        ]
+        for name, stats in summary.items():
+            lines.append(f"appkit_stage_errors_total{{{_labels(app=app, stage=name)}}} {stats['errors']}")
+        usage = self.usage()
+        lines += [
+            "# HELP appkit_tokens_total Tokens sent to and received from the LLM.",
+            "# TYPE appkit_tokens_total counter",
+        ]
+        for model, totals in usage.items():
+            for kind in ("prompt", "completion"):
+                lines.append(f"appkit_tokens_total{{{_labels(app=app, model=model, kind=kind)}}} {totals[kind + '_tokens']}")
+        lines += [
+            "# HELP appkit_cost_usd_total Estimated LLM spend in US dollars.",
+            "# TYPE appkit_cost_usd_total counter",
+        ]
+        for model, totals in usage.items():
+            lines.append(f"appkit_cost_usd_total{{{_labels(app=app, model=model)}}} {totals['cost_usd']:.8f}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path=None):
+        path = path or self.textfile_path
+        # Write then rename, so a scraper never reads a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as textfile:
+            textfile.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def _log(self, event):
+        if self.log_path is not None:
+            line = json.dumps(dict(event, app=self.app, ts=round(self.clock(), 3)), ensure_ascii=False)
+            with self._lock:
+                with open(self.log_path, "a", encoding="utf-8") as log_file:
+                    log_file.write(line + "\n")
+        if self.textfile_path is not None:
+            now = self.clock()
+            with self._lock:
+                due = self._exported_at is None or now - self._exported_at >= self.export_interval
+                if due:
+                    self._exported_at = now
+            if due:
+                self.write_textfile()
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def get_metrics(app):
+    """The process-wide ``Metrics`` for ``app``.
+
+    Set ``APPKIT_METRICS_DIR`` to also write ``<app>.jsonl`` event logs and a
+    ``<app>.prom`` text file there; otherwise metrics are kept in memory only.
+    """
+    with _metrics_lock:
+        if app not in _metrics:
+            metrics_dir = os.environ.get("APPKIT_METRICS_DIR")
+            paths = {}
+            if metrics_dir:
+                os.makedirs(metrics_dir, exist_ok=True)
+                paths = {
+                    "log_path": os.path.join(metrics_dir, f"{app}.jsonl"),
+                    "textfile_path": os.path.join(metrics_dir, f"{app}.prom"),
+                }
+            _metrics[app] = Metrics(app, **paths)
+        return _metrics[app]
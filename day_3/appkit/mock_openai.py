@@ -0,0 +1,270 @@
+"""Local stand-in for the OpenAI ChatCompletion and Embedding APIs.
+
+Speaks just enough of ``POST /v1/chat/completions`` (blocking JSON and
+``stream=True`` server-sent events) and ``POST /v1/embeddings`` for the apps
+and benchmarks to run without network access or real tokens. Point the
+0.28 client at it with ``openai.api_base = server.url``.
+
+Latency, jitter and failures are configurable, so load tests can see how
+the apps behave when the API is slow, rate limited or rejects a key.
+"""
+import collections
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_REPLY = (
+    "Verse 1:\nUnder city lights we wander slow\n"
+    "Chorus:\nHold on, hold on, the night is ours to know\n"
+)
+
+# Error bodies as the API returns them; the 0.28 client maps the status to
+# AuthenticationError, RateLimitError and APIError respectively
+ERRORS = {
+    401: ("Incorrect API key provided.", "invalid_request_error", "invalid_api_key"),
+    429: ("Rate limit reached for requests.", "requests", "rate_limit_exceeded"),
+    500: ("The server had an error while processing your request.", "server_error", None),
+    503: ("The engine is currently overloaded, please try again later.", "server_error", None),
+}
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't let Nagle delay keep-alive replies
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if not path.endswith(("/chat/completions", "/embeddings")):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.record_request(payload)
+
+        api_key = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        status = self.server.pick_error(api_key)
+        if status is not None:
+            time.sleep(self.server.first_token_latency)
+            self._send_error(status)
+            return
+        if path.endswith("/embeddings"):
+            self._send_json(200, _embedding_body(payload, self.server.embedding_dim))
+            return
+
+        reply = self.server.reply_for(payload)
+        tokens = _split_tokens(reply)
+        max_tokens = payload.get("max_tokens")
+        if max_tokens:
+            tokens = tokens[:max_tokens]
+
+        time.sleep(self.server.first_token_latency + self.server.jitter())
+        if payload.get("stream"):
+            self._stream(payload, tokens)
+        else:
+            time.sleep(self.server.token_latency * len(tokens))
+            self._send_json(200, _completion_body(payload, "".join(tokens), len(tokens)))
+
+    def _stream(self, payload, tokens):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        self.close_connection = True
+        try:
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(self.server.token_latency)
+                self._send_event(_chunk_body(payload, completion_id, {"content": token}, None))
+            self._send_event(_chunk_body(payload, completion_id, {}, "stop"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. a cancelled generation
+            self.server.record_disconnect()
+
+    def _send_event(self, body):
+        self.wfile.write(b"data: " + json.dumps(body).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, body, headers=()):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status):
+        message, error_type, code = ERRORS.get(status, ERRORS[500])
+        headers = [("Retry-After", "1")] if status == 429 else []
+        self._send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": code}}, headers)
+
+
+class MockCompletionServer(ThreadingHTTPServer):
+    """Threaded mock server; use as a context manager or call start()/stop().
+
+    ``first_token_latency`` is the delay before anything is sent, plus up to
+    ``latency_jitter`` seconds at random, and ``token_latency`` the delay
+    between streamed tokens (a blocking call pays the sum of both before it
+    gets its response). ``reply`` may be a string or a callable taking the
+    request payload.
+
+    ``error_rates`` maps HTTP statuses (429, 500, 503) to the fraction of
+    requests that fail with them; keys in ``reject_keys`` always get a 401.
+    ``seed`` makes the jitter and injected errors repeatable.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, reply=DEFAULT_REPLY,
+                 first_token_latency=0.2, token_latency=0.02, latency_jitter=0.0,
+                 error_rates=None, reject_keys=(), embedding_dim=1536, seed=None):
+        super().__init__((host, port), _CompletionHandler)
+        self.reply = reply
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.latency_jitter = latency_jitter
+        self.error_rates = dict(error_rates or {})
+        self.reject_keys = set(reject_keys)
+        self.embedding_dim = embedding_dim
+        self.requests = []
+        self.disconnects = 0
+        self.errors = collections.Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reply_for(self, payload):
+        if callable(self.reply):
+            return self.reply(payload)
+        return self.reply
+
+    def record_request(self, payload):
+        with self._lock:
+            self.requests.append(payload)
+
+    def pick_error(self, api_key):
+        """Status of the error to inject for this request, or None to serve it."""
+        with self._lock:
+            status = None
+            if api_key in self.reject_keys:
+                status = 401
+            else:
+                roll = self._random.random()
+                for candidate, rate in self.error_rates.items():
+                    if roll < rate:
+                        status = candidate
+                        break
+                    roll -= rate
+            if status is not None:
+                self.errors[status] += 1
+            return status
+
+    def jitter(self):
+        if not self.latency_jitter:
+            return 0.0
+        with self._lock:
+            return self._random.uniform(0, self.latency_jitter)
+
+    def record_disconnect(self):
+        with self._lock:
+            self.disconnects += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _split_tokens(text):
+    # Rough word-level "tokens" that keep their trailing whitespace
+    tokens, current = [], ""
+    for char in text:
+        current += char
+        if char.isspace():
+            tokens.append(current)
+            current = ""
+    if current:
+        tokens.append(current)
+    return tokens
+
+
+def _completion_body(payload, content, completion_tokens):
+    prompt_tokens = sum(len(_split_tokens(m.get("content", ""))) for m in payload.get("messages", []))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _embedding_body(payload, dim):
+    # Deterministic pseudo-embeddings: equal inputs get equal vectors
+    inputs = payload.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    data = []
+    for index, text in enumerate(inputs):
+        seed = int.from_bytes(hashlib.sha256(str(text).encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        data.append({"object": "embedding", "index": index, "embedding": [rng.gauss(0, 1) for _ in range(dim)]})
+    tokens = sum(len(_split_tokens(str(text))) for text in inputs)
+    return {
+        "object": "list",
+        "data": data,
+        "model": payload.get("model", "mock"),
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def _chunk_body(payload, completion_id, delta, finish_reason):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": payload.get("model", "mock"),
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
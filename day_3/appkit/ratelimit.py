@@ -0,0 +1,67 @@
+"""Requests-per-minute and tokens-per-minute limiter.
+
+Two token buckets refilled continuously; ``acquire(tokens)`` blocks the
+calling thread until both have room. Thread-safe, so it can gate calls made
+from worker pools (including ``asyncio.to_thread`` workers).
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self._requests = requests_per_minute or 0.0
+        self._tokens = tokens_per_minute or 0.0
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, tokens=0):
+        """Take one request and ``tokens`` tokens, waiting as long as needed."""
+        if self.tokens_per_minute:
+            # A single call larger than the whole budget would otherwise wait forever
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                wait = max(
+                    self._deficit(self._requests, 1, self.requests_per_minute),
+                    self._deficit(self._tokens, tokens, self.tokens_per_minute),
+                )
+                if wait <= 0:
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    if self.tokens_per_minute:
+                        self._tokens -= tokens
+                    return
+                self.waited += wait
+            self.sleep(wait)
+
+    def adjust(self, tokens):
+        """Correct an earlier estimate once the real usage is known (positive = used more)."""
+        if self.tokens_per_minute and tokens:
+            with self._lock:
+                self._refill()
+                self._tokens -= tokens
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute,
+                                 self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute,
+                               self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    @staticmethod
+    def _deficit(available, needed, per_minute):
+        if not per_minute or available >= needed:
+            return 0.0
+        return (needed - available) * 60 / per_minute
@@ -0,0 +1,135 @@
+"""Two-level cache for generated responses: in-memory LRU over SQLite.
+
+Keys are opaque strings (see ``make_key``). Entries expire after ``ttl``
+seconds; the memory tier holds at most ``max_entries`` items and the disk
+tier at most ``max_bytes`` of values, evicting least recently used first.
+Each entry can carry the latency and token counts of the call it replaced,
+so ``stats()`` can report what the hits saved.
+"""
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def make_key(**parts):
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=256, max_bytes=64 * 1024 * 1024,
+                 clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL, meta TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    def get(self, key):
+        """Return the cached value or None, counting the hit or miss."""
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._record_hit("memory_hits", entry[2])
+                return entry[0]
+            self._memory.pop(key, None)
+
+            row = self._db.execute(
+                "SELECT value, created_at, meta FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            value, created_at, meta = row[0], row[1], json.loads(row[2])
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._remember(key, value, created_at, meta)
+            self._record_hit("disk_hits", meta)
+            return value
+
+    def set(self, key, value, **meta):
+        """Store ``value``; ``meta`` (e.g. latency, tokens) is kept for savings stats."""
+        now = self.clock()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at, meta)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, size, now, now, json.dumps(meta)),
+            )
+            self._remember(key, value, now, meta)
+            self._stats["stores"] += 1
+            self._evict_disk()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"], stats["disk_bytes"] = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        hits = stats.get("memory_hits", 0) + stats.get("disk_hits", 0)
+        lookups = hits + stats.get("misses", 0)
+        stats["hits"] = hits
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _remember(self, key, value, created_at, meta):
+        self._memory[key] = (value, created_at, meta)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _record_hit(self, tier, meta):
+        self._stats[tier] += 1
+        self._stats["saved_seconds"] += meta.get("latency", 0.0)
+        self._stats["saved_prompt_tokens"] += meta.get("prompt_tokens", 0)
+        self._stats["saved_completion_tokens"] += meta.get("completion_tokens", 0)
+
+    def _evict_disk(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until the store is back under budget
+        for key, size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            self._stats["evictions"] += 1
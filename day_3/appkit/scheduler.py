@@ -0,0 +1,357 @@
+"""Process-wide scheduler for the LLM calls made by Streamlit sessions.
+
+Script threads hand their completions to one shared ``LLMScheduler``
+instead of calling OpenAI themselves. A dispatcher on its own asyncio loop
+starts queued calls on a fixed pool of worker threads, at most
+``max_concurrency`` at a time, taking turns between sessions so one user's
+bulk job cannot starve everyone else. Submissions beyond ``max_queue`` (or
+``max_queue_per_session``) fail straight away with ``SchedulerBusy``.
+
+Each script run submits through its own ``SessionQueue``. Opening the next
+one for the same session (on a rerun) cancels whatever the previous run
+left queued or streaming, and ``Job.wait`` cancels its job when the
+waiting script is stopped. Work that submits from threads of its own
+(map-reduce pools, ``asyncio.to_thread``) runs through
+``SessionQueue.call``, so the script thread keeps reaching Streamlit, where
+a rerun or disconnect stops it, while it waits.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+import uuid
+import weakref
+
+_DONE = object()
+
+
+class SchedulerBusy(RuntimeError):
+    """The request was not queued because too many are already waiting."""
+
+
+class JobCancelled(Exception):
+    """The job was cancelled before it produced a result."""
+
+
+class Job:
+    """One queued call; ``fn(*args, **kwargs)`` runs on a worker thread."""
+
+    def __init__(self, session_id, fn, args, kwargs, stream=False, on_cancel=None):
+        self.session_id = session_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.stream = stream
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+        self._future = concurrent.futures.Future()
+        self._cancelled = threading.Event()
+        self._events = queue.SimpleQueue()
+        self._on_cancel = on_cancel
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def status(self):
+        if self.finished_at is not None or self._future.cancelled():
+            return "done"
+        return "running" if self.started_at is not None else "queued"
+
+    @property
+    def queue_seconds(self):
+        if self.started_at is None:
+            return None
+        return self.started_at - self.submitted_at
+
+    def done(self):
+        return self._future.done()
+
+    def cancel(self):
+        """Drop the job if still queued; a streaming job stops at its next token."""
+        self._cancelled.set()
+        if self._future.cancel():
+            self._events.put(_DONE)
+            if self._on_cancel is not None:
+                self._on_cancel(self)
+
+    def emit(self, token):
+        # Passed to streaming jobs as ``on_token``; raising here ends the stream
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self._events.put(token)
+
+    def wait(self, on_token=None, on_wait=None, poll=0.1, timeout=None):
+        """Block until the job finishes and return its result.
+
+        Streamed tokens are handed to ``on_token`` on the calling thread, where
+        Streamlit calls are allowed, and ``on_wait(job)`` is called every
+        ``poll`` seconds without a token. If the caller is interrupted (a
+        rerun stops the script with an exception) the job is cancelled.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    event = self._events.get(timeout=poll)
+                except queue.Empty:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("Timed out waiting for the completion")
+                    if on_wait is not None:
+                        on_wait(self)
+                    continue
+                if event is _DONE:
+                    break
+                if on_token is not None:
+                    on_token(event)
+        except BaseException:
+            self.cancel()
+            raise
+        if self._future.cancelled():
+            raise JobCancelled()
+        return self._future.result()
+
+
+class SessionQueue:
+    """Submits jobs on behalf of one script run of one session."""
+
+    def __init__(self, scheduler, session_id):
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.closed = False
+        self._jobs = weakref.WeakSet()
+
+    def submit(self, fn, *args, stream=False, **kwargs):
+        if self.closed:
+            raise JobCancelled("A newer run of this session took over")
+        job = self.scheduler.submit(self.session_id, fn, *args, stream=stream, **kwargs)
+        self._jobs.add(job)
+        return job
+
+    def run(self, fn, *args, on_token=None, on_wait=None, **kwargs):
+        """Submit and wait; with ``on_token`` the job is called with ``on_token=`` and streamed."""
+        job = self.submit(fn, *args, stream=on_token is not None, **kwargs)
+        return job.wait(on_token=on_token, on_wait=on_wait)
+
+    def call(self, fn, *args, on_wait=None, poll=0.1, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on a helper thread and wait for it on this one.
+
+        For work that submits through this queue from other threads, whose
+        waits never reach Streamlit. ``on_wait()`` is called on the calling
+        thread every ``poll`` seconds; if it raises (a Streamlit call stops
+        the script on a rerun or disconnect) every job of this queue is
+        cancelled, which ends ``fn`` at its next call, and the exception
+        propagates.
+        """
+        future = concurrent.futures.Future()
+
+        def target():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        threading.Thread(target=target, name="llm-call", daemon=True).start()
+        try:
+            while not concurrent.futures.wait([future], timeout=poll).done:
+                if on_wait is not None:
+                    on_wait()
+        except BaseException:
+            self.cancel()
+            raise
+        return future.result()
+
+    def cancel(self):
+        self.closed = True
+        for job in list(self._jobs):
+            job.cancel()
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=8, max_queue=64, max_queue_per_session=16):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_session = max_queue_per_session
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        # Session id -> its queued jobs, in the order sessions take their turn
+        self._pending = collections.OrderedDict()
+        self._queued = 0
+        self._running = 0
+        # Queued plus running jobs per session
+        self._active = collections.Counter()
+        self._sessions = weakref.WeakValueDictionary()
+        self._closed = False
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_concurrency, thread_name_prefix="llm-worker")
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = asyncio.Event()
+        self._thread = threading.Thread(target=self._serve, name="llm-scheduler", daemon=True)
+        self._thread.start()
+
+    def session(self, session_id):
+        """A queue for the current run of ``session_id``, cancelling the previous run's jobs."""
+        handle = SessionQueue(self, session_id)
+        with self._lock:
+            previous = self._sessions.get(session_id)
+            self._sessions[session_id] = handle
+        if previous is not None:
+            previous.cancel()
+        return handle
+
+    def submit(self, session_id, fn, *args, stream=False, **kwargs):
+        job = Job(session_id, fn, args, kwargs, stream=stream, on_cancel=self._discard)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The scheduler has been closed")
+            if self._queued >= self.max_queue or self._active[session_id] >= self.max_queue_per_session:
+                self.rejected += 1
+                raise SchedulerBusy(f"{self._queued} requests are already waiting; try again shortly")
+            self._pending.setdefault(session_id, collections.deque()).append(job)
+            self._queued += 1
+            self._active[session_id] += 1
+            self.submitted += 1
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queued,
+                "running": self._running,
+                "sessions": len(self._active),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected,
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            pending = [job for jobs in self._pending.values() for job in jobs]
+        for job in pending:
+            job.cancel()
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+        self._loop.close()
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._dispatch())
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        while True:
+            # Pick the next job only once a worker is free, so sessions that
+            # arrive while all workers are busy still get their turn
+            await slots.acquire()
+            job = self._next_job()
+            while job is None:
+                if self._closed:
+                    return
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                job = self._next_job()
+            loop.run_in_executor(self._pool, self._run, job).add_done_callback(lambda _: slots.release())
+
+    def _next_job(self):
+        with self._lock:
+            if not self._pending:
+                return None
+            session_id, jobs = next(iter(self._pending.items()))
+            job = jobs.popleft()
+            if jobs:
+                self._pending.move_to_end(session_id)
+            else:
+                del self._pending[session_id]
+            self._queued -= 1
+            self._running += 1
+            return job
+
+    def _run(self, job):
+        if not job._future.set_running_or_notify_cancel():
+            self._finish(job, "cancelled")
+            return
+        job.started_at = time.perf_counter()
+        kwargs = dict(job.kwargs, on_token=job.emit) if job.stream else job.kwargs
+        try:
+            result = job.fn(*job.args, **kwargs)
+        except JobCancelled as e:
+            job._future.set_exception(e)
+            self._finish(job, "cancelled")
+        except Exception as e:
+            job._future.set_exception(e)
+            self._finish(job, "failed")
+        else:
+            job._future.set_result(result)
+            self._finish(job, "completed")
+
+    def _finish(self, job, outcome):
+        job.finished_at = time.perf_counter()
+        with self._lock:
+            self._running -= 1
+            self._release(job.session_id)
+            setattr(self, outcome, getattr(self, outcome) + 1)
+        job._events.put(_DONE)
+
+    def _discard(self, job):
+        # A queued job was cancelled; free its place in the queue
+        with self._lock:
+            jobs = self._pending.get(job.session_id)
+            if not jobs or job not in jobs:
+                return
+            jobs.remove(job)
+            if not jobs:
+                del self._pending[job.session_id]
+            self._queued -= 1
+            self._release(job.session_id)
+            self.cancelled += 1
+
+    def _release(self, session_id):
+        self._active[session_id] -= 1
+        if not self._active[session_id]:
+            del self._active[session_id]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """The scheduler shared by every session in this process, sized from the environment."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 8)),
+                max_queue=int(os.environ.get("LLM_MAX_QUEUE", 64)),
+                max_queue_per_session=int(os.environ.get("LLM_MAX_QUEUE_PER_SESSION", 16)),
+            )
+        return _scheduler
+
+
+def current_session_id():
+    """Id of the Streamlit session running the calling script."""
+    import streamlit as st
+
+    # Kept in session state rather than read from the script run context,
+    # whose id is the same for every session under streamlit.testing
+    if "llm_session_id" not in st.session_state:
+        st.session_state.llm_session_id = uuid.uuid4().hex
+    return st.session_state.llm_session_id
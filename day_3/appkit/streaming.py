@@ -0,0 +1,77 @@
+"""Blocking and streaming chat completions with latency metrics.
+
+Both helpers return ``(text, metrics)`` so callers can switch between modes
+without changing how they store the result.
+"""
+import time
+
+import openai
+
+
+class CompletionMetrics:
+    """Wall-clock timings for one completion, in seconds."""
+
+    def __init__(self, streamed):
+        self.streamed = streamed
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+
+    def mark_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+        # A blocking call shows nothing until the whole response is back
+        if self.first_token_at is None:
+            self.first_token_at = self.finished_at
+
+    @property
+    def time_to_first_token(self):
+        return self.first_token_at - self.started_at
+
+    @property
+    def total_latency(self):
+        return self.finished_at - self.started_at
+
+    def as_dict(self):
+        return {
+            "streamed": self.streamed,
+            "time_to_first_token": self.time_to_first_token,
+            "total_latency": self.total_latency,
+            "chunks": self.chunks,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+def blocking_chat_completion(messages, model="gpt-4o-mini", **kwargs):
+    metrics = CompletionMetrics(streamed=False)
+    response = openai.ChatCompletion.create(model=model, messages=messages, **kwargs)
+    metrics.finish()
+    usage = response.get("usage")
+    if usage:
+        metrics.prompt_tokens = usage["prompt_tokens"]
+        metrics.completion_tokens = usage["completion_tokens"]
+    return response.choices[0].message.content, metrics
+
+
+def stream_chat_completion(messages, model="gpt-4o-mini", on_token=None, **kwargs):
+    """Stream a completion, calling ``on_token(token)`` for each content delta."""
+    metrics = CompletionMetrics(streamed=True)
+    parts = []
+    for chunk in openai.ChatCompletion.create(model=model, messages=messages, stream=True, **kwargs):
+        token = chunk["choices"][0]["delta"].get("content")
+        if not token:
+            continue
+        metrics.mark_token()
+        parts.append(token)
+        if on_token is not None:
+            on_token(token)
+    metrics.finish()
+    return "".join(parts), metrics
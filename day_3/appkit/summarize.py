@@ -0,0 +1,110 @@
+"""Token-aware map-reduce summarization.
+
+Short texts go to the model in one call, exactly as before. Longer texts are
+split on sentence boundaries into chunks of at most ``chunk_tokens`` tokens
+(counted with tiktoken), the chunks are summarized concurrently on a bounded
+thread pool, and the partial summaries are reduced with the caller's own
+system prompt so the final answer keeps its usual format. If the partial
+summaries are themselves too long they are reduced again.
+"""
+import functools
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import tiktoken
+
+MAP_PROMPT = (
+    "You are summarizing one part of a longer news article. Extract every fact needed for a final "
+    "summary: the main events, names, organizations, places, dates, figures and any direct quotes "
+    "with their attribution. Do not speculate or add information. Write plain sentences, no headline."
+)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+@functools.lru_cache(maxsize=8)
+def get_encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Newer model names are not known to older tiktoken releases
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def split_into_chunks(text, max_tokens, model="gpt-4o-mini"):
+    """Split ``text`` into pieces of at most ``max_tokens`` tokens, preferring sentence breaks."""
+    encoding = get_encoding(model)
+    chunks, current, current_tokens = [], [], 0
+    for sentence in SENTENCE_END.split(text):
+        if not sentence.strip():
+            continue
+        tokens = encoding.encode(sentence, disallowed_special=())
+        if len(tokens) > max_tokens:
+            # A single run-on "sentence" longer than the budget is cut by tokens
+            if current:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            for start in range(0, len(tokens), max_tokens):
+                chunks.append(encoding.decode(tokens[start:start + max_tokens]))
+            continue
+        if current_tokens + len(tokens) > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += len(tokens) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class SummaryResult:
+    def __init__(self, summary, mode, chunks, input_tokens, calls):
+        self.summary = summary
+        self.mode = mode
+        self.chunks = chunks
+        self.input_tokens = input_tokens
+        self.calls = calls
+
+
+def map_reduce_summarize(text, system_prompt, complete, model="gpt-4o-mini", chunk_tokens=3000,
+                         single_call_tokens=6000, max_workers=4,
+                         user_template="Please summarize the following news article: {text}"):
+    """Summarize ``text``; ``complete(messages)`` performs one chat completion and returns its text."""
+    input_tokens = count_tokens(text, model)
+    if input_tokens <= single_call_tokens:
+        summary = complete([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_template.format(text=text)},
+        ])
+        return SummaryResult(summary, "single", 1, input_tokens, 1)
+
+    chunks = split_into_chunks(text, chunk_tokens, model)
+    calls = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        partials = list(pool.map(lambda item: complete([
+            {"role": "system", "content": MAP_PROMPT},
+            {"role": "user", "content": f"Part {item[0] + 1} of {len(chunks)}:\n\n{item[1]}"},
+        ]), enumerate(chunks)))
+        calls += len(chunks)
+
+        # Collapse partial summaries until they fit in one reduce call
+        while count_tokens("\n\n".join(partials), model) > single_call_tokens and len(partials) > 1:
+            groups = split_into_chunks("\n".join(partials), chunk_tokens, model)
+            if len(groups) >= len(partials):
+                break
+            partials = list(pool.map(lambda group: complete([
+                {"role": "system", "content": MAP_PROMPT},
+                {"role": "user", "content": group},
+            ]), groups))
+            calls += len(groups)
+
+    combined = "\n\n".join(f"Part {i + 1}: {partial}" for i, partial in enumerate(partials))
+    summary = complete([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_template.format(
+            text=f"(condensed from {len(chunks)} consecutive parts of one article)\n\n{combined}")},
+    ])
+    return SummaryResult(summary, "map-reduce", len(chunks), input_tokens, calls + 1)
@@ -0,0 +1,82 @@
+"""Bytes sent per rerun for the apps' images and CSS, before and after appkit.assets.
+
+"Before" is what the original apps emitted on every rerun (the background
+inlined as base64 plus the unminified style blocks, and the logos read from
+disk as-is). "After" is what the asset layer emits once the image has been
+published to ``static/`` (or inlined as a shrunk data URI when static
+serving is off).
+
+    python day_3/benchmarks/bench_assets.py
+"""
+import base64
+import os
+import sys
+import tempfile
+import time
+
+DAY_3 = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(DAY_3)
+
+from appkit.assets import Image, image_url, load_image, minify_css
+
+VERSEFORGE = os.path.join(DAY_3, "ai-first-day-3-activity-5-6")
+NEWS = os.path.join(DAY_3, "ai-first-day-3-activity-4")
+BACKGROUND = os.path.join(VERSEFORGE, "images", "studio.jpg")
+LOGOS = [
+    (os.path.join(VERSEFORGE, "images", "logo.jpg"), 512),
+    (os.path.join(NEWS, "images", "White_AI Republic.png"), 600),
+]
+
+# Representative of the style blocks in activity-5-6/app.py
+STYLE_TEMPLATE = """
+    <style>
+    /* Overlay container for background dimming */
+    .stApp::before {{
+        content: "";
+        position: fixed;
+        background-image: url("{url}");
+        background-size: cover;
+        filter: brightness(0.3) blur(5px);
+    }}
+    /* Enhanced chat message styling */
+    .stChatMessage {{
+        width: 80%;
+        margin: 1rem auto !important;
+        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
+    }}
+    </style>
+"""
+
+
+def main():
+    if Image is None:
+        print("Pillow is not installed: images are passed through unchanged")
+
+    with open(BACKGROUND, "rb") as image_file:
+        inline = base64.b64encode(image_file.read()).decode("utf-8")
+    before_background = len(STYLE_TEMPLATE.format(url=f"data:image/jpg;base64,{inline}"))
+    before_logos = sum(os.path.getsize(path) for path, _ in LOGOS)
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as static_dir:
+        static_url = image_url(BACKGROUND, static_dir, max_width=1600, max_bytes=250_000)
+        first_call = time.perf_counter() - started
+        started = time.perf_counter()
+        image_url(BACKGROUND, static_dir, max_width=1600, max_bytes=250_000)
+        cached_call = time.perf_counter() - started
+        published = load_image(BACKGROUND, max_width=1600, max_bytes=250_000).size
+
+    after_static = len(minify_css(STYLE_TEMPLATE.format(url=static_url)))
+    after_inline = len(minify_css(STYLE_TEMPLATE.format(
+        url=image_url(BACKGROUND, max_width=1600, max_bytes=250_000))))
+    after_logos = sum(load_image(path, max_width=width).size for path, width in LOGOS)
+
+    print(f"background style per rerun: before {before_background:>10,} B")
+    print(f"                            static {after_static:>10,} B (+{published:,} B once per browser)")
+    print(f"                            inline {after_inline:>10,} B")
+    print(f"logos passed to st.image:  before {before_logos:>10,} B  after {after_logos:>10,} B")
+    print(f"background prepare: first {first_call * 1000:.1f} ms, cached {cached_call * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Throughput of bulk summarization against local mock servers.
+
+Serves synthetic articles from the bench_fetcher stand-in and answers
+completions from the mock OpenAI server, then summarizes ``--urls`` URLs at
+several concurrency levels (cold article cache each time).
+
+    python day_3/benchmarks/bench_bulk.py --urls 200 --concurrency 1 8 32 --rpm 3000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCH_DIR, os.pardir))
+sys.path.append(os.path.join(BENCH_DIR, os.pardir, "ai-first-day-3-activity-4"))
+
+import openai
+
+from appkit.fetcher import ArticleFetcher
+from appkit.mock_openai import MockCompletionServer
+from appkit.ratelimit import RateLimiter
+from bench_fetcher import StandInServer
+from bulk_summarize import summarize_urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rpm", type=int, default=6000)
+    parser.add_argument("--tpm", type=int, default=20_000_000)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--site-latency", type=float, default=0.05)
+    parser.add_argument("--fail-every", type=int, default=25, help="every Nth URL is a dead link (404)")
+    args = parser.parse_args()
+
+    site = StandInServer(args.site_latency, "max-age=300")
+    threading.Thread(target=site.serve_forever, daemon=True).start()
+    host, port = site.server_address
+    urls = [
+        f"http://{host}:{port}/{'missing' if args.fail_every and i % args.fail_every == 0 else 'news'}/{i}"
+        for i in range(args.urls)
+    ]
+    with MockCompletionServer(first_token_latency=args.llm_latency, token_latency=0) as llm:
+        openai.api_base = llm.url
+        openai.api_key = "sk-mock"
+        print(f"{'concurrency':>11} {'urls/s':>8} {'ok':>5} {'failed':>6} {'p50 s':>7} {'p95 s':>7} {'rate-limit wait s':>18}")
+        for concurrency in args.concurrency:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                fetcher = ArticleFetcher(cache_dir)
+                limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+                started = time.perf_counter()
+                results = asyncio.run(summarize_urls(urls, fetcher, limiter, concurrency))
+                elapsed = time.perf_counter() - started
+                fetcher.close()
+            ok = [r for r in results if r["ok"]]
+            latencies = sorted(r["fetch_seconds"] + r["summarize_seconds"] for r in ok)
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+            print(f"{concurrency:>11} {len(results) / elapsed:>8.2f} {len(ok):>5} {len(results) - len(ok):>6} "
+                  f"{statistics.median(latencies) if latencies else 0.0:>7.3f} {p95:>7.3f} {limiter.waited:>18.2f}")
+    site.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Escalation rate, agreement and throughput of the kNN -> LLM sentiment cascade.
+
+Uses synthetic reviews, the deterministic hashing embedder and a mock LLM
+that labels by counting sentiment words (standing in for gpt-4o-mini).
+Runs the LLM-only baseline and the cascade at several margins.
+
+    python day_3/benchmarks/bench_cascade.py --reviews 2000 --margins 0.2 0.4 0.6
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import numpy as np
+import openai
+
+from appkit.dedup import HashingEmbedder
+from appkit.mock_openai import MockCompletionServer
+from sentiment_batch import BatchSentimentClassifier
+from sentiment_cascade import CachedEmbedder, SentimentCascade
+
+POSITIVE = "loved brilliant moving superb hooked delightful masterpiece gripping".split()
+NEGATIVE = "boring awful wasted dull mess disappointing clumsy tedious".split()
+NEUTRAL = "the film plot actors scene director story camera music ending cinema".split()
+
+
+def review(rng):
+    positive_share = rng.choice([0.9, 0.8, 0.6, 0.4, 0.2, 0.1])
+    words = []
+    for _ in range(40):
+        if rng.random() < 0.35:
+            words.append(rng.choice(POSITIVE if rng.random() < positive_share else NEGATIVE))
+        else:
+            words.append(rng.choice(NEUTRAL))
+    return " ".join(words)
+
+
+def lexicon_label(text):
+    words = text.split()
+    return "Positive" if sum(w in POSITIVE for w in words) >= sum(w in NEGATIVE for w in words) else "Negative"
+
+
+def reply(payload):
+    content = payload["messages"][-1]["content"]
+    items = re.findall(r"\[id: (.*?)\]\n(.*?)(?=\n\n\[id: |\Z)", content, flags=re.S)
+    if not items:
+        return lexicon_label(content)
+    return json.dumps({"results": [{"id": key, "sentiment": lexicon_label(text)} for key, text in items]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=1000)
+    parser.add_argument("--examples", type=int, default=2000)
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.2, 0.4, 0.6])
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    examples = [review(rng) for _ in range(args.examples)]
+    reviews = [review(rng) for _ in range(args.reviews)]
+    hashing = HashingEmbedder(512)
+    embedder = CachedEmbedder(lambda texts: np.stack([hashing(text) for text in texts]))
+
+    with MockCompletionServer(reply=reply, first_token_latency=args.latency, token_latency=0) as server:
+        openai.api_base = server.url
+        openai.api_key = "sk-mock"
+
+        llm_only = BatchSentimentClassifier("Classify the sentiment.", pack_size=10, concurrency=8)
+        baseline = llm_only.classify({str(i): text for i, text in enumerate(reviews)})
+        baseline = [baseline[str(i)] for i in range(len(reviews))]
+        print(f"LLM only: {llm_only.stats['reviews_per_second']:.1f} reviews/s, {llm_only.stats['requests']} requests")
+
+        for margin in args.margins:
+            llm = BatchSentimentClassifier("Classify the sentiment.", pack_size=10, concurrency=8)
+            cascade = SentimentCascade(embedder, llm, k=15, margin=margin)
+            cascade.fit(examples, [lexicon_label(text) for text in examples])
+            cascade.classify(reviews, baseline=baseline)
+            stats = cascade.stats
+            print(f"margin {margin:.2f}: escalated {stats['escalation_rate']:.1%}, "
+                  f"agreement {stats['agreement']:.1%}, {stats['reviews_per_second']:.1f} reviews/s, "
+                  f"{llm.stats.get('requests', 0)} LLM requests")
+
+
+if __name__ == "__main__":
+    main()
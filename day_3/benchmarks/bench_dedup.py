@@ -0,0 +1,77 @@
+"""Near-duplicate detection quality and lookup cost with the hashing embedder.
+
+Builds ``--stories`` synthetic stories, indexes one copy of each, then looks
+up "syndicated" copies (reworded intro, extra sentences, a different
+boilerplate tail) and unrelated stories. Reports how many syndicated copies
+would reuse a summary, how many unrelated stories would wrongly do so, and
+lookup latency at that index size.
+
+    python day_3/benchmarks/bench_dedup.py --stories 2000 --threshold 0.8
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from appkit.dedup import HashingEmbedder, NearDuplicateIndex
+
+WORDS = ("council budget river storm market election school hospital transit court police festival "
+         "harbor bridge vaccine drought factory airport museum stadium senator mayor union strike "
+         "flood tariff startup satellite reactor wildfire").split()
+
+
+def story(rng, length=120):
+    return " ".join(rng.choice(WORDS) for _ in range(length)) + "."
+
+
+def syndicate(rng, text):
+    words = text.split()
+    words[:8] = [rng.choice(WORDS) for _ in range(8)]
+    tail = " ".join(rng.choice(WORDS) for _ in range(12))
+    return f"Reporting by wire staff. {' '.join(words)} {tail}. Copyright the publisher."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stories", type=int, default=1000)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--dim", type=int, default=512)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    originals = [story(rng) for _ in range(args.stories)]
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(os.path.join(directory, "summaries"), HashingEmbedder(args.dim), args.dim,
+                                   threshold=args.threshold)
+        started = time.perf_counter()
+        for i, text in enumerate(originals):
+            index.add(text, f"summary {i}", source=f"https://example.com/{i}")
+        index.flush()
+        add_seconds = time.perf_counter() - started
+
+        timings, caught, false_hits = [], 0, 0
+        for i in rng.sample(range(args.stories), min(args.probes, args.stories)):
+            started = time.perf_counter()
+            match = index.lookup(syndicate(rng, originals[i]))
+            timings.append(time.perf_counter() - started)
+            caught += match is not None and match[0]["summary"] == f"summary {i}"
+        for _ in range(args.probes):
+            false_hits += index.lookup(story(rng)) is not None
+
+        reopened = NearDuplicateIndex(index.path, index.embed, args.dim, threshold=args.threshold)
+        assert len(reopened) == len(index)
+
+    print(f"indexed {args.stories} stories in {add_seconds:.2f}s (saved every {index.save_interval:.0f}s and at the end)")
+    print(f"syndicated copies matched: {caught}/{len(timings)}")
+    print(f"unrelated stories matched: {false_hits}/{args.probes}")
+    print(f"lookup p50 {statistics.median(timings) * 1000:.2f} ms, max {max(timings) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
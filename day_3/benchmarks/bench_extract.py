@@ -0,0 +1,105 @@
+"""Extraction engines over a corpus of saved HTML pages.
+
+For each engine reports median/total parse time, peak RSS growth (each
+engine runs in its own process so libxml2 allocations are counted too) and
+the number of extracted tokens sent on to the LLM.
+
+    python day_3/benchmarks/bench_extract.py --corpus saved_pages/
+    python day_3/benchmarks/bench_extract.py            # synthetic pages
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from appkit.extract import EXTRACTORS, extract_article_text
+
+NAV = "<nav class='site-nav'><ul>" + "<li><a href='/s'>Section</a></li>" * 40 + "</ul></nav>"
+FOOTER = "<footer><p>Copyright. All rights reserved. <a href='/privacy'>Privacy</a></p>" + \
+    "<p>Subscribe to our newsletter for the latest updates every morning.</p></footer>"
+RELATED = "<div class='related-stories'>" + "<p><a href='/x'>Another story you may like</a></p>" * 15 + "</div>"
+BODY = "<p>Officials confirmed on Tuesday that the new transit line will open next year, " \
+    "citing strong ridership forecasts and completed safety inspections.</p>"
+
+
+def count_tokens(text):
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text.split())
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def write_synthetic_corpus(directory, pages):
+    for i in range(pages):
+        html = (f"<html><head><script>{'var x=1;' * 500}</script><style>{'p{margin:0}' * 200}</style></head>"
+                f"<body>{NAV}<article><h1>Story {i}</h1>{BODY * (20 + i % 40)}</article>"
+                f"{RELATED}{FOOTER}</body></html>")
+        with open(os.path.join(directory, f"page_{i}.html"), "w", encoding="utf-8") as page:
+            page.write(html)
+
+
+def run_worker(engine, corpus):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus, "*.html")) + glob.glob(os.path.join(corpus, "*.htm"))):
+        with open(path, "rb") as page:
+            pages.append(page.read())
+    # Import the engine before measuring so only parsing counts
+    extract_article_text(pages[0], engine=engine)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    timings, tokens = [], 0
+    for html in pages:
+        started = time.perf_counter()
+        text = extract_article_text(html, engine=engine)
+        timings.append(time.perf_counter() - started)
+        tokens += count_tokens(text)
+
+    print(json.dumps({
+        "engine": engine,
+        "pages": len(pages),
+        "median_ms": statistics.median(timings) * 1000,
+        "total_s": sum(timings),
+        "peak_rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline,
+        "tokens": tokens,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of saved .html pages")
+    parser.add_argument("--pages", type=int, default=100, help="synthetic pages when no corpus is given")
+    parser.add_argument("--engines", nargs="+", default=sorted(EXTRACTORS))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.corpus)
+        return
+
+    with tempfile.TemporaryDirectory() as synthetic:
+        corpus = args.corpus
+        if corpus is None:
+            write_synthetic_corpus(synthetic, args.pages)
+            corpus = synthetic
+        print(f"{'engine':<12} {'pages':>5} {'median ms':>10} {'total s':>8} {'peak RSS +KB':>13} {'tokens':>9}")
+        for engine in args.engines:
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", engine, "--corpus", corpus],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output)
+            print(f"{result['engine']:<12} {result['pages']:>5} {result['median_ms']:>10.2f} "
+                  f"{result['total_s']:>8.3f} {result['peak_rss_growth_kb']:>13} {result['tokens']:>9}")
+
+
+if __name__ == "__main__":
+    main()
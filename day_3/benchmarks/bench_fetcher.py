@@ -0,0 +1,120 @@
+"""ArticleFetcher against a local HTTP stand-in for news sites.
+
+The stand-in serves synthetic article pages with ETag/Last-Modified and a
+configurable ``Cache-Control`` header, honours conditional requests and
+counts TCP connections, so pooling and revalidation show up in the numbers.
+Compares bare ``requests.get`` (what the app used to do) with the fetcher
+on a cold cache, a fresh cache and a stale cache that revalidates.
+
+    python day_3/benchmarks/bench_fetcher.py --urls 50 --latency 0.02
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import requests
+
+from appkit.fetcher import ArticleFetcher
+
+PARAGRAPH = "<p>" + "The council approved the budget after a long debate. " * 20 + "</p>"
+
+
+class ArticleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't let Nagle delay keep-alive replies
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if self.path.startswith("/missing/"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = f"<html><body><h1>{self.path}</h1>{PARAGRAPH * 30}</body></html>".encode("utf-8")
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.server.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.server.count("full")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(usegmt=True))
+        self.send_header("Cache-Control", self.server.cache_control)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, cache_control):
+        super().__init__(("127.0.0.1", 0), ArticleHandler)
+        self.latency = latency
+        self.cache_control = cache_control
+        self.counts = {"connections": 0, "full": 0, "not_modified": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counts = dict.fromkeys(self.counts, 0)
+
+
+def timed(label, server, fetch, urls):
+    server.reset()
+    started = time.perf_counter()
+    for url in urls:
+        fetch(url)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:7.3f}s  {server.counts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    for cache_control, label in (("max-age=300", "fresh"), ("max-age=0", "revalidate")):
+        server = StandInServer(args.latency, cache_control)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        urls = [f"http://{host}:{port}/news/{i}" for i in range(args.urls)]
+        print(f"-- Cache-Control: {cache_control}")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            fetcher = ArticleFetcher(cache_dir)
+            timed("bare requests.get", server, lambda url: requests.get(url, timeout=10), urls)
+            timed("fetcher, cold cache", server, fetcher.fetch, urls)
+            timed(f"fetcher, warm ({label})", server, fetcher.fetch, urls)
+            fetcher.close()
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
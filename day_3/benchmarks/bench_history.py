@@ -0,0 +1,92 @@
+"""Rerun time of the VerseForge chat as the history grows: full replay vs windowed rendering.
+
+Each history length is rendered by a small Streamlit script under
+``streamlit.testing.v1.AppTest``: "full" replays every message on every
+rerun (the original app), "windowed" uses ``render_chat_history``, which
+draws the latest messages and leaves older ones to be paged in. Also
+reports the text a session keeps under the default ``ChatHistory`` cap.
+
+    python day_3/benchmarks/bench_history.py [--lengths 10 100 500 2000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+DAY_3 = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+VERSEFORGE = os.path.join(DAY_3, "ai-first-day-3-activity-5-6")
+sys.path.append(VERSEFORGE)
+
+from streamlit.logger import set_log_level
+from streamlit.testing.v1 import AppTest
+
+from chat_history import ChatHistory
+
+FULL_SCRIPT = """
+import streamlit as st
+for message in st.session_state.chat_history:
+    with st.chat_message(message['role']):
+        st.markdown(message['content'])
+"""
+
+WINDOWED_SCRIPT = f"""
+import sys
+import streamlit as st
+sys.path.append({VERSEFORGE!r})
+from chat_history import render_chat_history
+render_chat_history(st.session_state.chat_history)
+"""
+
+LYRICS = "\n".join(f"Line {line} of a verse that goes on for a while, la la la" for line in range(40))
+
+
+def conversation(length):
+    """Pairs of (role, text) alternating pasted lyrics and short replies."""
+    for turn in range(length):
+        if turn % 2:
+            yield 'assistant', f"Lyrics for Song {turn // 2 + 1} added. Please provide the next one."
+        else:
+            yield 'user', f"Song {turn // 2 + 1}\n{LYRICS}"
+
+
+def rerun_seconds(script, history, repeats):
+    app = AppTest.from_string(script, default_timeout=120)
+    app.session_state['chat_history'] = history
+    app.run()
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started)
+    assert not app.exception, app.exception
+    return statistics.median(timings), len(app.chat_message)
+
+
+def main():
+    # Session state is seeded outside a script run, which Streamlit warns about
+    set_log_level("error")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8}  {'full rerun':>10}  {'windowed':>9}  {'drawn':>5}  {'all text':>9}  {'kept':>7}  {'dropped':>7}")
+    for length in args.lengths:
+        messages = [{'role': role, 'content': text} for role, text in conversation(length)]
+        history = ChatHistory()
+        for role, text in conversation(length):
+            history.append(role, text)
+
+        full, full_drawn = rerun_seconds(FULL_SCRIPT, messages, args.repeats)
+        windowed, drawn = rerun_seconds(WINDOWED_SCRIPT, history, args.repeats)
+        all_bytes = sum(len(message['content'].encode('utf-8')) for message in messages)
+        print(
+            f"{length:>8}  {full * 1000:>8.1f}ms  {windowed * 1000:>7.1f}ms  {drawn:>5}  "
+            f"{all_bytes / 1024:>7.0f}KB  {history.stored_bytes / 1024:>5.0f}KB  {history.dropped:>7}"
+        )
+        assert full_drawn == length
+
+
+if __name__ == "__main__":
+    main()
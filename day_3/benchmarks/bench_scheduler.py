@@ -0,0 +1,167 @@
+"""Throughput and tail latency of LLM calls through appkit.scheduler.
+
+A bulk session queues many summaries while interactive sessions each ask
+for one streamed mix, all against the local mock server. Compared:
+
+- direct: every call on its own thread, as the apps did before; no cap
+  on concurrent requests.
+- fifo: the scheduler with every call under one session id, so the
+  interactive requests wait behind the whole bulk queue.
+- fair: the scheduler with real session ids, taking turns per session.
+
+Then floods the queue past its limit to count ``SchedulerBusy`` rejections,
+and reruns a session mid-stream to check its calls are cancelled.
+
+    python day_3/benchmarks/bench_scheduler.py --bulk 40 --interactive 20 --concurrency 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import openai
+
+from appkit.mock_openai import MockCompletionServer
+from appkit.scheduler import JobCancelled, LLMScheduler, SchedulerBusy
+from appkit.streaming import stream_chat_completion
+
+REPLY = " ".join(["la"] * 40)
+MESSAGES = [{"role": "user", "content": "Mix these songs"}]
+
+
+class InFlight:
+    """Wraps the completion call to track how many run at once."""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        try:
+            return stream_chat_completion(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.current -= 1
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_direct(calls, in_flight):
+    latencies = {}
+
+    def call(name):
+        started = time.perf_counter()
+        in_flight(MESSAGES, on_token=lambda token: None)
+        latencies[name] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=call, args=(name,)) for _, name in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_scheduled(calls, in_flight, concurrency, fair):
+    scheduler = LLMScheduler(max_concurrency=concurrency, max_queue=len(calls), max_queue_per_session=len(calls))
+    jobs = []
+    for session_id, name in calls:
+        jobs.append((name, scheduler.submit(session_id if fair else "everyone", in_flight, MESSAGES, stream=True)))
+    latencies = {}
+    for name, job in jobs:
+        job.wait()
+        latencies[name] = job.finished_at - job.submitted_at
+    scheduler.close()
+    return latencies
+
+
+def report(mode, latencies, elapsed, in_flight):
+    interactive = [seconds for name, seconds in latencies.items() if name.startswith("mix")]
+    bulk = [seconds for name, seconds in latencies.items() if name.startswith("bulk")]
+    print(
+        f"{mode:>7}  {len(latencies) / elapsed:>6.1f} req/s  peak in flight {in_flight.peak:>3}  "
+        f"interactive p50={statistics.median(interactive):.2f}s p95={percentile(interactive, 0.95):.2f}s  "
+        f"bulk p95={percentile(bulk, 0.95):.2f}s"
+    )
+
+
+def check_backpressure(concurrency, max_queue):
+    scheduler = LLMScheduler(max_concurrency=concurrency, max_queue=max_queue, max_queue_per_session=max_queue)
+    accepted = rejected = 0
+    for index in range(max_queue * 3):
+        try:
+            scheduler.submit(f"user-{index}", stream_chat_completion, MESSAGES)
+            accepted += 1
+        except SchedulerBusy:
+            rejected += 1
+    stats = scheduler.stats()
+    scheduler.close()
+    print(f"   busy  {accepted} accepted, {rejected} rejected straight away (queue limit {max_queue}); "
+          f"{stats['running']} running and {stats['queued']} waiting")
+
+
+def check_rerun(server, concurrency):
+    scheduler = LLMScheduler(max_concurrency=concurrency)
+    before = len(server.requests), server.disconnects
+    run = scheduler.session("listener")
+    jobs = [run.submit(stream_chat_completion, MESSAGES, stream=True) for _ in range(concurrency * 2)]
+    time.sleep(0.3)
+    # The next rerun opens a new queue for the same session
+    started = time.perf_counter()
+    scheduler.session("listener")
+    cancelled = 0
+    for job in jobs:
+        try:
+            job.wait()
+        except JobCancelled:
+            cancelled += 1
+    stopped = time.perf_counter() - started
+    scheduler.close()
+    time.sleep(0.1)
+    print(f"  rerun  {cancelled} of {len(jobs)} calls cancelled, all stopped within {stopped:.2f}s; "
+          f"{len(server.requests) - before[0]} reached the server, "
+          f"{server.disconnects - before[1]} streams closed early")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bulk", type=int, default=40, help="calls queued by one bulk session")
+    parser.add_argument("--interactive", type=int, default=20, help="sessions asking for one mix each")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    # The bulk session submits first, as when a user starts a bulk run just before others arrive
+    calls = [("bulk", f"bulk-{index}") for index in range(args.bulk)]
+    calls += [(f"listener-{index}", f"mix-{index}") for index in range(args.interactive)]
+
+    with MockCompletionServer(reply=REPLY, first_token_latency=args.first_token_latency,
+                              token_latency=args.token_latency) as server:
+        openai.api_base = server.url
+        openai.api_key = "sk-mock"
+        for mode in ("direct", "fifo", "fair"):
+            in_flight = InFlight()
+            started = time.perf_counter()
+            if mode == "direct":
+                latencies = run_direct(calls, in_flight)
+            else:
+                latencies = run_scheduled(calls, in_flight, args.concurrency, fair=mode == "fair")
+            report(mode, latencies, time.perf_counter() - started, in_flight)
+        check_backpressure(args.concurrency, max_queue=args.concurrency * 4)
+        check_rerun(server, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
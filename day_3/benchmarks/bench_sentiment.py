@@ -0,0 +1,70 @@
+"""Reviews/second of the batch sentiment classifier on the mock endpoint.
+
+Compares the notebook's serial one-review-per-request loop (pack size 1,
+concurrency 1) with packed, concurrent classification, then interrupts a
+run halfway and shows the rerun resuming from the checkpoint.
+
+    python day_3/benchmarks/bench_sentiment.py --reviews 500 --latency 0.3
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import openai
+
+from appkit.mock_openai import MockCompletionServer
+from sentiment_batch import BatchSentimentClassifier
+
+
+def label_for(text):
+    return "Positive" if hashlib.md5(text.encode("utf-8")).digest()[0] & 1 else "Negative"
+
+
+def reply(payload):
+    content = payload["messages"][-1]["content"]
+    items = re.findall(r"\[id: (.*?)\]\n(.*?)(?=\n\n\[id: |\Z)", content, flags=re.S)
+    if not items:
+        return label_for(content)
+    return json.dumps({"results": [{"id": key, "sentiment": label_for(text)} for key, text in items]})
+
+
+def run(label, reviews, **options):
+    classifier = BatchSentimentClassifier("Classify the sentiment.", **options)
+    classifier.classify(reviews)
+    stats = classifier.stats
+    print(f"{label:<34} {stats['reviews_per_second']:>8.1f} reviews/s  "
+          f"{stats['requests']:>5} requests  resumed {stats['resumed']}")
+    return classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    reviews = {str(i): f"Review number {i}: the plot was something else." for i in range(args.reviews)}
+    with MockCompletionServer(reply=reply, first_token_latency=args.latency, token_latency=0) as server:
+        openai.api_base = server.url
+        openai.api_key = "sk-mock"
+
+        serial = dict(list(reviews.items())[:max(1, args.reviews // 10)])
+        run("serial (pack 1, concurrency 1)", serial, pack_size=1, concurrency=1)
+        run("concurrent (pack 1, concurrency 8)", reviews, pack_size=1, concurrency=8)
+        run("packed (pack 10, concurrency 8)", reviews, pack_size=10, concurrency=8)
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = os.path.join(directory, "sentiment.jsonl")
+            half = dict(list(reviews.items())[:args.reviews // 2])
+            run("first half, checkpointed", half, pack_size=10, concurrency=8, checkpoint_path=checkpoint)
+            run("full rerun, resumed", reviews, pack_size=10, concurrency=8, checkpoint_path=checkpoint)
+
+
+if __name__ == "__main__":
+    main()
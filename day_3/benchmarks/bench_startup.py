@@ -0,0 +1,122 @@
+"""Cold-start cost of the Streamlit apps: import time, wall time and RSS.
+
+Runs each app's script once in a fresh interpreter under ``-X importtime``
+(in Streamlit's bare mode, so no server is started) and reports the wall
+time to the end of the first run, the total import time, peak RSS and the
+heaviest top-level imports. Repeats ``--runs`` times and keeps the median.
+``--save`` writes the numbers as JSON and ``--baseline`` compares against
+a saved run, exiting with status 1 when a figure grows by more than
+``--tolerance``.
+
+    python day_3/benchmarks/bench_startup.py --runs 3 --top 8
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DAY_3 = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+REPO_ROOT = os.path.dirname(DAY_3)
+APPS = {
+    "verseforge": os.path.join(DAY_3, "ai-first-day-3-activity-5-6", "app.py"),
+    "news": os.path.join(DAY_3, "ai-first-day-3-activity-4", "app.py"),
+}
+
+# Runs the script the way `streamlit run` would see it: its folder on sys.path, run as __main__
+RUNNER = """
+import resource, runpy, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[2])
+runpy.run_path(sys.argv[1], run_name="__main__")
+scale = 1 if sys.platform == "darwin" else 1024
+print(f"STARTUP {time.perf_counter() - started:.6f} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale}",
+      file=sys.stderr)
+"""
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def cold_start(script, cache_dir):
+    env = dict(os.environ, VERSEFORGE_CACHE_DIR=cache_dir, MIJIKAI_CACHE_DIR=cache_dir)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", RUNNER, script, os.path.dirname(script)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    top_level = {}
+    startup = None
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            _, cumulative, indent, module = match.groups()
+            # Two spaces of indent per nesting level; level 0 is imported by the script itself
+            if len(indent) == 1:
+                top_level[module] = int(cumulative) / 1e6
+        elif line.startswith("STARTUP "):
+            _, wall, rss = line.split()
+            startup = float(wall), int(rss)
+    if startup is None:
+        raise RuntimeError(f"{script} failed to start:\n{result.stderr[-2000:]}")
+    return {
+        "wall_seconds": startup[0],
+        "import_seconds": sum(top_level.values()),
+        "rss_mb": startup[1] / 2**20,
+        "imports": top_level,
+    }
+
+
+def measure(script, runs):
+    with tempfile.TemporaryDirectory(prefix="startup-") as cache_dir:
+        samples = [cold_start(script, cache_dir) for _ in range(runs)]
+    median = {key: statistics.median(sample[key] for sample in samples)
+              for key in ("wall_seconds", "import_seconds", "rss_mb")}
+    modules = samples[0]["imports"]
+    median["imports"] = {module: statistics.median(sample["imports"].get(module, 0.0) for sample in samples)
+                         for module in modules}
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("apps", nargs="*", metavar="app", help=f"any of {', '.join(sorted(APPS))} (default: all)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="heaviest imports to list")
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    unknown = set(args.apps) - set(APPS)
+    if unknown:
+        parser.error(f"unknown app: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.apps or sorted(APPS):
+        result = results[name] = measure(APPS[name], args.runs)
+        print(f"{name}: first run done after {result['wall_seconds']:.2f}s, "
+              f"{result['import_seconds']:.2f}s of it importing, peak RSS {result['rss_mb']:.0f}MB")
+        heaviest = sorted(result["imports"].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for module, seconds in heaviest:
+            print(f"  {seconds * 1000:>8.1f}ms  {module}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = [
+            f"{name} {key} {result[key]:.2f} vs {baseline[name][key]:.2f}"
+            for name, result in results.items() if name in baseline
+            for key in ("wall_seconds", "import_seconds", "rss_mb")
+            if result[key] > baseline[name][key] * (1 + args.tolerance)
+        ]
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
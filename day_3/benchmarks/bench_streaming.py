@@ -0,0 +1,58 @@
+"""Perceived latency of blocking vs streaming completions.
+
+Runs both modes against the local mock server and reports time-to-first-token
+(what the user waits before the chat shows anything) and total latency.
+
+    python day_3/benchmarks/bench_streaming.py --requests 20 --token-latency 0.02
+"""
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import openai
+
+from appkit.mock_openai import MockCompletionServer
+from appkit.streaming import blocking_chat_completion, stream_chat_completion
+
+SONG = " ".join(["la"] * 220)
+
+
+def run_mode(mode, count):
+    messages = [{"role": "user", "content": "Mix these songs"}]
+    results = []
+    for _ in range(count):
+        if mode == "stream":
+            _, metrics = stream_chat_completion(messages)
+        else:
+            _, metrics = blocking_chat_completion(messages)
+        results.append(metrics)
+    return results
+
+
+def summarize(mode, results):
+    ttft = [m.time_to_first_token for m in results]
+    total = [m.total_latency for m in results]
+    print(f"{mode:>8}  ttft p50={statistics.median(ttft):.3f}s max={max(ttft):.3f}s  "
+          f"total p50={statistics.median(total):.3f}s max={max(total):.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with MockCompletionServer(reply=SONG, first_token_latency=args.first_token_latency,
+                              token_latency=args.token_latency) as server:
+        openai.api_base = server.url
+        openai.api_key = "sk-mock"
+        for mode in ("blocking", "stream"):
+            summarize(mode, run_mode(mode, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Headless load test of the Streamlit apps against the local mock OpenAI API.
+
+Each simulated user drives one app through ``streamlit.testing.v1.AppTest``:
+
+- verseforge: the whole conversation on the Mix Songs page (start ->
+  song_count -> collecting_lyrics -> creative_direction), with lyrics
+  unique to the user so the mix cache doesn't answer for the API.
+- news: the Model page, summarizing articles from a local stand-in news
+  site (see bench_fetcher.py).
+
+``--concurrency`` users run at a time, each in a worker process: AppTest
+installs a process-wide runtime for every run, so two cannot share a
+process. The mock API and news site run in this process and see the
+combined load.
+
+The report gives users per second, latency percentiles per step, failures
+by kind and peak RSS per worker. ``--save`` writes it as JSON;
+``--baseline`` compares against a saved report and exits with status 1
+when throughput, a step's p95 or peak RSS is worse by more than
+``--tolerance``.
+
+    python day_3/benchmarks/loadtest.py verseforge --users 40 --concurrency 8
+    python day_3/benchmarks/loadtest.py news --users 20 --concurrency 4 --error 429=0.05
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DAY_3 = os.path.join(BENCHMARKS, os.pardir)
+REPO_ROOT = os.path.abspath(os.path.join(DAY_3, os.pardir))
+sys.path.append(DAY_3)
+
+import openai
+
+from appkit.mock_openai import MockCompletionServer
+from bench_fetcher import StandInServer
+
+APPS = {
+    "verseforge": os.path.join(REPO_ROOT, "day_3", "ai-first-day-3-activity-5-6", "app.py"),
+    "news": os.path.join(REPO_ROOT, "day_3", "ai-first-day-3-activity-4", "app.py"),
+}
+SONG_REPLY = " ".join(["Under city lights we wander slow,"] * 30)
+
+
+class StepFailed(Exception):
+    def __init__(self, step, kind, message):
+        super().__init__(f"{step}: {kind}: {message}")
+        self.step = step
+        self.kind = kind
+
+
+class User:
+    """One simulated user; records how long each rerun of the app takes."""
+
+    def __init__(self, app_name):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APPS[app_name], default_timeout=120)
+        self.latencies = collections.defaultdict(list)
+
+    def step(self, name):
+        """Rerun the app as step ``name`` and check it didn't fail."""
+        started = time.perf_counter()
+        self.app.run()
+        self.latencies[name].append(time.perf_counter() - started)
+        if self.app.exception:
+            raise StepFailed(name, "exception", self.app.exception[0].message)
+        for warning in self.app.warning:
+            if "busy" in warning.value:
+                raise StepFailed(name, "busy", warning.value)
+        for error in self.app.error:
+            raise StepFailed(name, "error", error.value)
+
+
+def verseforge_user(user, index, songs, **_):
+    app = user.app
+    app.query_params["page"] = "Mix Songs"
+    user.step("open")
+    app.sidebar.text_input[0].set_value(f"sk-load-{index}")
+    user.step("api_key")
+
+    def say(step, text):
+        app.chat_input[0].set_value(text)
+        user.step(step)
+
+    say("start", "Hi Melodia!")
+    say("song_count", str(songs))
+    for song in range(songs):
+        say("lyrics", f"Song {song + 1} for listener {index}\n" + "We sing along all night long\n" * 12)
+    say("creative_direction", f"A rainy night drive, take {index}")
+    reply = app.chat_message[-1].markdown[0].value
+    if not reply.startswith("Under city lights"):
+        raise StepFailed("creative_direction", "no-mix", reply[:80])
+
+
+def news_user(user, index, articles, site_url, **_):
+    app = user.app
+    app.query_params["page"] = "Model"
+    user.step("open")
+    app.sidebar.text_input[0].set_value(f"sk-load-{index}")
+    user.step("api_key")
+    for article in range(articles):
+        url_input = next(field for field in app.main.text_input if field.label == "News Article URL")
+        url_input.set_value(f"{site_url}/story-{index}-{article}")
+        next(button for button in app.main.button if button.label == "Generate Summary").click()
+        user.step("summarize")
+        if not app.success:
+            raise StepFailed("summarize", "no-summary", "no success message")
+
+
+DRIVERS = {"verseforge": verseforge_user, "news": news_user}
+
+
+def init_worker(api_base, cache_dir):
+    from streamlit.logger import set_log_level
+
+    set_log_level("error")
+    # The apps load their images by paths relative to the repository root
+    os.chdir(REPO_ROOT)
+    os.environ["VERSEFORGE_CACHE_DIR"] = os.path.join(cache_dir, "verseforge")
+    os.environ["MIJIKAI_CACHE_DIR"] = os.path.join(cache_dir, "news")
+    openai.api_base = api_base
+
+
+def run_user(app_name, index, options):
+    user = User(app_name)
+    failure = None
+    try:
+        DRIVERS[app_name](user, index, **options)
+    except StepFailed as e:
+        failure = (f"{e.step}/{e.kind}", str(e))
+    # ru_maxrss is the worker's peak so far, in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "latencies": dict(user.latencies),
+        "failure": failure,
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "pid": os.getpid(),
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def build_report(args, results, elapsed, server):
+    latencies = collections.defaultdict(list)
+    failures = collections.Counter()
+    examples = {}
+    peak_rss = {}
+    for result in results:
+        for name, values in result["latencies"].items():
+            latencies[name].extend(values)
+        if result["failure"] is not None:
+            kind, message = result["failure"]
+            failures[kind] += 1
+            examples.setdefault(kind, message)
+        peak_rss[result["pid"]] = max(peak_rss.get(result["pid"], 0), result["peak_rss"])
+    completed = len(results) - sum(failures.values())
+    return {
+        "app": args.app,
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "elapsed": round(elapsed, 3),
+        "users_per_second": round(completed / elapsed, 3),
+        "completed": completed,
+        "failures": dict(failures),
+        "failure_examples": examples,
+        "injected_errors": {str(status): count for status, count in server.errors.items()},
+        "api_requests": len(server.requests),
+        "steps": {
+            name: {
+                "count": len(values),
+                "p50": round(percentile(values, 0.5), 4),
+                "p95": round(percentile(values, 0.95), 4),
+                "p99": round(percentile(values, 0.99), 4),
+            }
+            for name, values in latencies.items()
+        },
+        "worker_peak_rss_mb": round(max(peak_rss.values()) / 2**20, 1),
+    }
+
+
+def print_report(report):
+    print(f"{report['app']}: {report['completed']}/{report['users']} users completed in {report['elapsed']:.1f}s "
+          f"at concurrency {report['concurrency']} ({report['users_per_second']:.2f} users/s, "
+          f"{report['api_requests']} API requests)")
+    print(f"  {'step':<20} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, stats in report["steps"].items():
+        print(f"  {name:<20} {stats['count']:>6} {stats['p50']:>7.3f}s {stats['p95']:>7.3f}s {stats['p99']:>7.3f}s")
+    for kind, count in sorted(report["failures"].items()):
+        print(f"  failed x{count}: {report['failure_examples'][kind][:160]}")
+    if report["injected_errors"]:
+        print("  injected: " + ", ".join(f"HTTP {status} x{count}" for status, count in report["injected_errors"].items()))
+    print(f"  peak RSS per worker {report['worker_peak_rss_mb']:.0f}MB")
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of ``report`` against ``baseline``, as readable lines."""
+    regressions = []
+    if report["users_per_second"] < baseline["users_per_second"] * (1 - tolerance):
+        regressions.append(f"throughput {report['users_per_second']:.2f} users/s vs {baseline['users_per_second']:.2f}")
+    for name, stats in report["steps"].items():
+        before = baseline["steps"].get(name)
+        if before and stats["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{name} p95 {stats['p95']:.3f}s vs {before['p95']:.3f}s")
+    if report["worker_peak_rss_mb"] > baseline["worker_peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {report['worker_peak_rss_mb']:.0f}MB vs {baseline['worker_peak_rss_mb']:.0f}MB")
+    return regressions
+
+
+def parse_error(value):
+    status, rate = value.split("=")
+    return int(status), float(rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("app", choices=sorted(APPS))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--songs", type=int, default=2, help="songs per VerseForge conversation")
+    parser.add_argument("--articles", type=int, default=2, help="articles per news user")
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error", type=parse_error, action="append", default=[],
+                        metavar="STATUS=RATE", help="inject an API error, e.g. 429=0.05 (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the report as JSON")
+    parser.add_argument("--baseline", help="compare with a report saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = MockCompletionServer(
+        reply=SONG_REPLY,
+        first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency,
+        latency_jitter=args.jitter,
+        error_rates=dict(args.error),
+        seed=args.seed,
+    )
+    site = StandInServer(latency=0.01, cache_control="max-age=300")
+    threading.Thread(target=site.serve_forever, daemon=True).start()
+    host, port = site.server_address[:2]
+    options = {"songs": args.songs, "articles": args.articles, "site_url": f"http://{host}:{port}"}
+
+    # AppTest runs each app as the worker's __main__, so hand the pool functions
+    # by this module's importable name rather than as __main__.run_user
+    import loadtest
+
+    with server, tempfile.TemporaryDirectory(prefix="loadtest-") as cache_dir:
+        started = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(
+            args.concurrency, initializer=loadtest.init_worker, initargs=(server.url, cache_dir)
+        ) as pool:
+            futures = [pool.submit(loadtest.run_user, args.app, index, options) for index in range(args.users)]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+    site.shutdown()
+
+    report = build_report(args, results, elapsed, server)
+    print_report(report)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+        for line in regressions:
+            print(f"  REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Concurrent, resumable batch sentiment classification.
+
+Turns the one-request-per-review loop from ai-first-day-3-activity-2 into a
+reusable classifier:
+
+- several reviews are packed into one prompt under short positional ids
+  (0, 1, ...; the caller's keys only name them in the results and the
+  checkpoint) and answered as JSON
+  ``{"results": [{"id": ..., "sentiment": "Positive"|"Negative"}]}``;
+  items missing from a packed answer are retried one at a time
+- packs run on a bounded thread pool
+- rate limits, timeouts and 5xx errors are retried with exponential backoff
+- every finished pack is appended to a JSONL checkpoint, so rerunning after
+  a crash only classifies what is left; an answer that is not one of
+  ``LABELS`` is left out of it and asked again on the next run
+
+    classifier = BatchSentimentClassifier(System_Prompt, checkpoint_path="sentiment.jsonl")
+    dataframed["Openai_Sentiment"] = classifier.classify_series(dataframed["review"])
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+
+LABELS = ("Positive", "Negative")
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+)
+PACKED_INSTRUCTIONS = """
+
+You will receive several reviews at once, each introduced by its id. Classify every review
+independently and reply with only a JSON object of the form
+{"results": [{"id": <id>, "sentiment": "Positive" or "Negative"}]} containing one entry per id."""
+
+
+def normalize_label(text):
+    # Accept "positive", "Positive.", "Classification: Negative", ...
+    lowered = text.strip().lower()
+    for label in LABELS:
+        if label.lower() in lowered:
+            return label
+    return None
+
+
+class BatchSentimentClassifier:
+    def __init__(self, system_prompt, model="gpt-4o-mini", pack_size=10, concurrency=8,
+                 max_retries=5, backoff=1.0, checkpoint_path=None, max_review_chars=6000):
+        self.system_prompt = system_prompt
+        self.model = model
+        self.pack_size = pack_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.checkpoint_path = checkpoint_path
+        self.max_review_chars = max_review_chars
+        self.stats = {"requests": 0, "retries": 0, "unpacked": 0}
+        self._lock = threading.Lock()
+
+    def classify_series(self, reviews):
+        """Classify a pandas Series of review texts; returns labels aligned to its index."""
+        import pandas as pd
+
+        results = self.classify(dict(zip(reviews.index.astype(str), reviews)))
+        return pd.Series([results.get(str(key)) for key in reviews.index], index=reviews.index)
+
+    def classify(self, reviews):
+        """Classify ``{id: text}`` and return ``{id: label}``, resuming from the checkpoint.
+
+        Reviews whose pack still failed after all retries, or whose answer
+        wasn't a label, map to None.
+        """
+        done = self.load_checkpoint()
+        pending = [(key, text) for key, text in reviews.items() if key not in done]
+        packs = [pending[i:i + self.pack_size] for i in range(0, len(pending), self.pack_size)]
+
+        started = time.perf_counter()
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self._classify_pack, pack): pack for pack in packs}
+            for future in as_completed(futures):
+                try:
+                    labels = future.result()
+                except Exception as e:
+                    # Leave the pack unlabelled; the next run retries it from the checkpoint
+                    failed += len(futures[future])
+                    self.stats["last_error"] = f"{type(e).__name__}: {e}"
+                    continue
+                self._checkpoint(labels)
+                done.update(labels)
+                failed += sum(label is None for label in labels.values())
+        elapsed = time.perf_counter() - started
+
+        self.stats["classified"] = len(pending) - failed
+        self.stats["failed"] = failed
+        self.stats["resumed"] = len(reviews) - len(pending)
+        self.stats["seconds"] = elapsed
+        self.stats["reviews_per_second"] = (len(pending) - failed) / elapsed if elapsed else 0.0
+        return {key: done.get(key) for key in reviews}
+
+    def load_checkpoint(self):
+        done = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as checkpoint:
+                for line in checkpoint:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash mid-write
+                        continue
+                    # Older checkpoints may hold raw answers; classify those again
+                    if record.get("sentiment") in LABELS:
+                        done[record["id"]] = record["sentiment"]
+        return done
+
+    def _checkpoint(self, labels):
+        if not self.checkpoint_path:
+            return
+        with self._lock, open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            for key, label in labels.items():
+                if label is None:
+                    continue
+                checkpoint.write(json.dumps({"id": key, "sentiment": label}) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+    def _classify_pack(self, pack):
+        if len(pack) == 1:
+            key, text = pack[0]
+            return {key: self._classify_one(text)}
+
+        # Positions rather than the caller's keys, which can be long hashes the model would have to echo
+        body = "\n\n".join(f"[id: {position}]\n{self._clip(text)}" for position, (_, text) in enumerate(pack))
+        keys = {str(position): key for position, (key, _) in enumerate(pack)}
+        content = self._complete([
+            {"role": "system", "content": self.system_prompt + PACKED_INSTRUCTIONS},
+            {"role": "user", "content": body},
+        ], response_format={"type": "json_object"})
+
+        labels = {}
+        try:
+            for item in json.loads(content).get("results", []):
+                label = normalize_label(str(item.get("sentiment", "")))
+                key = keys.get(str(item.get("id")))
+                if label is not None and key is not None:
+                    labels[key] = label
+        except (ValueError, AttributeError):
+            labels = {}
+
+        # Anything the packed answer dropped or garbled is asked about on its own
+        for key, text in pack:
+            if key not in labels:
+                with self._lock:
+                    self.stats["unpacked"] += 1
+                labels[key] = self._classify_one(text)
+        return {key: labels[key] for key, _ in pack}
+
+    def _classify_one(self, text):
+        content = self._complete([
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": self._clip(text)},
+        ])
+        # None rather than the raw answer, so it is neither checkpointed nor taken for a label
+        return normalize_label(content)
+
+    def _clip(self, text):
+        return text if len(text) <= self.max_review_chars else text[:self.max_review_chars]
+
+    def _complete(self, messages, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._lock:
+                    self.stats["requests"] += 1
+                chat = openai.ChatCompletion.create(model=self.model, messages=messages, temperature=0, **kwargs)
+                return chat.choices[0].message.content
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.stats["retries"] += 1
+                # Exponential backoff with jitter so parallel workers don't retry in lockstep
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
@@ -0,0 +1,142 @@
+"""Cascaded sentiment classification: local kNN first, LLM only when unsure.
+
+Reviews are embedded (through an on-disk embedding cache) and compared with
+a FAISS index of labelled examples. Each review's positive score is the
+similarity-weighted vote of its ``k`` nearest neighbours, computed for the
+whole batch at once with NumPy. Reviews whose margin ``|2 * score - 1|`` is
+below ``margin`` are escalated to the LLM prompt through
+``BatchSentimentClassifier``, keyed by a hash of their text so a
+checkpointed classifier never answers for a different review (the prompt
+itself numbers the reviews of each pack); the rest keep the kNN label.
+
+    cascade = SentimentCascade(CachedEmbedder(openai_embed_batch, "embeddings.sqlite"),
+                               BatchSentimentClassifier(System_Prompt))
+    cascade.fit(labelled["review"].tolist(), labelled["sentiment"].tolist())
+    labels = cascade.classify(dataframed["review"].tolist())
+    print(cascade.stats)
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from sentiment_batch import LABELS, normalize_label
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def openai_embed_batch(texts, model=EMBEDDING_MODEL):
+    import openai
+
+    response = openai.Embedding.create(input=[text[:8000] for text in texts], model=model)
+    return np.array([item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])],
+                    dtype="float32")
+
+
+class CachedEmbedder:
+    """Embeds texts in batches, keeping every vector in SQLite keyed by model and text hash."""
+
+    def __init__(self, embed_batch, path=":memory:", model=EMBEDDING_MODEL, batch_size=256):
+        self.embed_batch = embed_batch
+        self.model = model
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def __call__(self, texts):
+        keys = [hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest() for text in texts]
+        vectors = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                vectors.update((key, np.frombuffer(blob, dtype="float32")) for key, blob in rows)
+
+        missing = [(key, text) for key, text in dict(zip(keys, texts)).items() if key not in vectors]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            embedded = np.asarray(self.embed_batch([text for _, text in batch]), dtype="float32")
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for (key, _), vector in zip(batch, embedded)],
+                )
+                self._db.commit()
+            vectors.update((key, vector) for (key, _), vector in zip(batch, embedded))
+        return np.stack([vectors[key] for key in keys])
+
+
+def review_id(text):
+    # Stable across batches and runs, unlike a position in the current batch
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SentimentCascade:
+    def __init__(self, embedder, llm_classifier=None, k=15, margin=0.4):
+        self.embedder = embedder
+        self.llm_classifier = llm_classifier
+        self.k = k
+        self.margin = margin
+        self.index = None
+        self.labels = None
+        self.stats = {}
+
+    def fit(self, texts, labels):
+        """Index labelled examples; labels may be any casing of Positive/Negative."""
+        vectors = self._normalized(texts)
+        self.index = faiss.IndexFlatIP(vectors.shape[1])
+        self.index.add(vectors)
+        self.labels = np.array([normalize_label(str(label)) == "Positive" for label in labels], dtype="float32")
+        return self
+
+    def score(self, texts):
+        """Return ``(positive_score, margin)`` arrays for ``texts``."""
+        similarities, neighbours = self.index.search(self._normalized(texts), min(self.k, self.index.ntotal))
+        weights = np.clip(similarities, 0.0, None)
+        votes = self.labels[neighbours]
+        totals = weights.sum(axis=1)
+        # Fall back to an unweighted vote when every neighbour is dissimilar
+        positive = np.where(totals > 0, (weights * votes).sum(axis=1) / np.maximum(totals, 1e-12), votes.mean(axis=1))
+        return positive, np.abs(2 * positive - 1)
+
+    def classify(self, texts, baseline=None):
+        """Label ``texts``, escalating low-margin reviews to the LLM classifier.
+
+        ``baseline`` (LLM-only labels for the same texts) adds agreement to ``stats``.
+        """
+        started = time.perf_counter()
+        positive, margins = self.score(texts)
+        labels = np.where(positive >= 0.5, LABELS[0], LABELS[1]).astype(object)
+        escalate = np.flatnonzero(margins < self.margin)
+        if len(escalate) and self.llm_classifier is not None:
+            llm_labels = self.llm_classifier.classify({review_id(texts[i]): texts[i] for i in escalate})
+            for i in escalate:
+                labels[i] = llm_labels.get(review_id(texts[i])) or labels[i]
+        elapsed = time.perf_counter() - started
+
+        self.stats = {
+            "reviews": len(texts),
+            "escalated": int(len(escalate)),
+            "escalation_rate": len(escalate) / len(texts) if len(texts) else 0.0,
+            "seconds": elapsed,
+            "reviews_per_second": len(texts) / elapsed if elapsed else 0.0,
+        }
+        if baseline is not None:
+            expected = np.array([normalize_label(str(label)) for label in baseline], dtype=object)
+            self.stats["agreement"] = float(np.mean(labels == expected))
+        return labels.tolist()
+
+    def _normalized(self, texts):
+        vectors = np.ascontiguousarray(self.embedder(texts), dtype="float32")
+        faiss.normalize_L2(vectors)
+        return vectors
@@ -0,0 +1,94 @@
+"""A stopped script cancels the news summaries it started through ``SessionQueue.call``.
+
+    python -m pytest day_3/tests
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+
+DAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(DAY_DIR)
+sys.path.append(os.path.join(DAY_DIR, "ai-first-day-3-activity-4"))
+
+from appkit.mock_openai import MockCompletionServer
+from appkit.scheduler import JobCancelled, LLMScheduler
+from news_summarizer import complete
+
+CHUNKS = 8
+
+
+class StopScript(BaseException):
+    """Stands in for the exception Streamlit raises in the script thread on a rerun."""
+
+
+@pytest.fixture
+def server():
+    with MockCompletionServer(reply="A summary.", first_token_latency=0.5, token_latency=0) as server:
+        previous = openai.api_base
+        openai.api_base = server.url
+        yield server
+        openai.api_base = previous
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = LLMScheduler(max_concurrency=2)
+    yield scheduler
+    scheduler.close()
+
+
+def map_chunks(llm_queue, outcome):
+    # Like map_reduce_summarize: every chunk waits on the queue from a pool thread
+    messages = [{"role": "user", "content": "Summarize this."}]
+    try:
+        with ThreadPoolExecutor(CHUNKS) as pool:
+            outcome["summaries"] = list(pool.map(
+                lambda _: complete(messages, queue=llm_queue, api_key="sk-test"), range(CHUNKS)
+            ))
+    except BaseException as e:
+        outcome["error"] = e
+        raise
+    finally:
+        outcome["ended"] = time.perf_counter()
+    return outcome["summaries"]
+
+
+def test_call_returns_the_result(server, scheduler):
+    llm_queue = scheduler.session("reader")
+    waits = []
+    summaries = llm_queue.call(map_chunks, llm_queue, {}, on_wait=lambda: waits.append(1))
+    assert summaries == ["A summary."] * CHUNKS
+    assert waits
+    assert scheduler.stats()["completed"] == CHUNKS
+
+
+def test_stopping_the_waiting_script_cancels_the_pool_threads(server, scheduler):
+    llm_queue = scheduler.session("reader")
+    outcome = {}
+    waits = []
+
+    def on_wait():
+        waits.append(threading.current_thread())
+        if len(waits) == 2:
+            raise StopScript()
+
+    started = time.perf_counter()
+    with pytest.raises(StopScript):
+        llm_queue.call(map_chunks, llm_queue, outcome, on_wait=on_wait)
+    # on_wait ran on the waiting thread, where Streamlit calls are allowed
+    assert waits == [threading.current_thread()] * 2
+
+    # Only the calls already running finish; the rest are dropped from the queue
+    deadline = time.monotonic() + 5
+    while "ended" not in outcome and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert isinstance(outcome.get("error"), JobCancelled)
+    assert outcome["ended"] - started < 1.5
+    assert llm_queue.closed
+    assert len(server.requests) == scheduler.max_concurrency < CHUNKS
+    assert scheduler.stats()["cancelled"] == CHUNKS - scheduler.max_concurrency
@@ -0,0 +1,137 @@
+"""Parcel lookups: pandas read_csv plus filtering vs the indexed ParcelStore.
+
+Generates ``--rows`` parcels like day_4/parcel_data.csv but with a few
+hundred receiver cities and some rare statuses, so filters are selective,
+converts them into a ParcelStore, and times:
+
+- ParcelID point lookups, status/city/carrier filters and a filter on a
+  non-indexed column
+- each answered by pandas as the notebooks do (``read_csv`` then a boolean
+  mask), by pandas on a frame already in memory, and by the store opened
+  fresh (cold) and kept open (warm)
+- appending ``--append`` new rows
+
+Every store answer is checked against pandas.
+
+    python day_4/benchmarks/bench_parcel_store.py --rows 2000000 --lookups 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+DAY_4 = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(DAY_4)
+
+from parcel_store import ParcelStore
+
+STATUSES = ["In Transit", "Delivered", "Processing", "Out for Delivery", "Delayed", "Returned"]
+STATUS_WEIGHTS = [0.35, 0.4, 0.12, 0.1, 0.02, 0.01]
+CARRIERS = ["UPS", "FedEx", "DHL", "USPS", "LBC"]
+
+
+def generate_parcels(path, rows, seed=0, start=0, chunk=500_000):
+    """Write ``rows`` parcels to ``path``, numbered from ``start``."""
+    sample = pd.read_csv(os.path.join(DAY_4, "parcel_data.csv"))
+    rng = np.random.default_rng(seed)
+    cities = np.array([f"{city} {district}" for city in sample["ReceiverCity"] for district in range(15)])
+    for offset in range(0, rows, chunk):
+        size = min(chunk, rows - offset)
+        ids = np.arange(start + offset, start + offset + size) + 1000
+        frame = pd.DataFrame({
+            column: sample[column].to_numpy()[rng.integers(len(sample), size=size)]
+            for column in sample.columns
+        })
+        frame["ParcelID"] = [f"PCL{i}" for i in ids]
+        frame["ReceiverCity"] = cities[rng.integers(len(cities), size=size)]
+        frame["ParcelWeight"] = rng.uniform(0.1, 30.0, size).round(2)
+        frame["CurrentStatus"] = rng.choice(STATUSES, size=size, p=STATUS_WEIGHTS)
+        frame["DeliveryService"] = rng.choice(CARRIERS, size=size)
+        frame["TrackingURL"] = [f"https://tracking.example.com/{i}" for i in ids]
+        frame.to_csv(path, mode="w" if offset == 0 else "a", header=offset == 0, index=False)
+
+
+def pandas_filter(frame, filters):
+    mask = np.ones(len(frame), dtype=bool)
+    for column, value in filters.items():
+        mask &= frame[column].isin(value if isinstance(value, list) else [value]).to_numpy()
+    return frame[mask]
+
+
+def best_of(runs, fn):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--lookups", type=int, default=1000, help="ParcelID point lookups")
+    parser.add_argument("--append", type=int, default=50_000, help="rows to append at the end")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="parcel-store-") as tmp:
+        csv_path = os.path.join(tmp, "parcels.csv")
+        store_path = os.path.join(tmp, "store")
+        generate_parcels(csv_path, args.rows, seed=args.seed)
+        started = time.perf_counter()
+        ParcelStore.from_csv(csv_path, store_path)
+        store_bytes = sum(os.path.getsize(os.path.join(root, name))
+                          for root, _, names in os.walk(store_path) for name in names)
+        print(f"{args.rows:,} rows: CSV {os.path.getsize(csv_path) / 2**20:.0f}MB, store {store_bytes / 2**20:.0f}MB, "
+              f"built in {time.perf_counter() - started:.1f}s")
+
+        read_seconds, frame = best_of(1, lambda: pd.read_csv(csv_path))
+        store = ParcelStore(store_path)
+        rng = np.random.default_rng(args.seed + 1)
+        ids = [f"PCL{i}" for i in rng.integers(args.rows, size=args.lookups) + 1000]
+        city = frame["ReceiverCity"].iloc[0]
+        queries = {
+            "status=Returned": {"CurrentStatus": "Returned"},
+            "status+city": {"CurrentStatus": "Delayed", "ReceiverCity": city},
+            "carrier+2 statuses": {"DeliveryService": "DHL", "CurrentStatus": ["Delayed", "Returned"]},
+            "sender (no index)": {"SenderName": "Bob Lee", "DeliveryService": "UPS"},
+        }
+
+        print(f"  pandas read_csv: {read_seconds:.2f}s per run of the notebook, "
+              f"{frame.memory_usage(deep=True).sum() / 2**20:.0f}MB in memory")
+        print(f"  {'query':<20} {'rows':>9} {'read_csv+mask':>14} {'pandas mask':>12} {'store cold':>11} {'store warm':>11}")
+
+        mask_seconds, expected = best_of(args.runs, lambda: [pandas_filter(frame, {"ParcelID": i}) for i in ids])
+        cold_seconds, _ = best_of(args.runs, lambda: ParcelStore(store_path).get(ids[0]))
+        warm_seconds, found = best_of(args.runs, lambda: [store.get(i) for i in ids])
+        assert [row["TrackingURL"] for row in found] == [rows["TrackingURL"].iloc[0] for rows in expected]
+        print(f"  {'ParcelID lookup':<20} {1:>9} {read_seconds + mask_seconds / len(ids):>13.3f}s "
+              f"{mask_seconds / len(ids) * 1000:>10.2f}ms {cold_seconds * 1000:>9.2f}ms "
+              f"{warm_seconds / len(ids) * 1e6:>9.1f}us")
+
+        for label, filters in queries.items():
+            mask_seconds, expected = best_of(args.runs, lambda: pandas_filter(frame, filters))
+            cold_seconds, _ = best_of(args.runs, lambda: ParcelStore(store_path).query(**filters))
+            warm_seconds, result = best_of(args.runs, lambda: store.query(**filters))
+            assert result["ParcelID"].tolist() == expected["ParcelID"].tolist(), label
+            print(f"  {label:<20} {len(result):>9,} {read_seconds + mask_seconds:>13.2f}s "
+                  f"{mask_seconds * 1000:>10.1f}ms {cold_seconds * 1000:>9.1f}ms {warm_seconds * 1000:>9.1f}ms")
+
+        new_path = os.path.join(tmp, "new.csv")
+        generate_parcels(new_path, args.append, seed=args.seed + 2, start=args.rows)
+        new_rows = pd.read_csv(new_path)
+        started = time.perf_counter()
+        store.append(new_rows)
+        print(f"  appended {args.append:,} rows in {time.perf_counter() - started:.2f}s "
+              f"({len(store):,} rows in {len(store.meta['segments'])} segments)")
+        assert store.get(new_rows["ParcelID"].iloc[-1])["TrackingURL"] == new_rows["TrackingURL"].iloc[-1]
+
+
+if __name__ == "__main__":
+    main()
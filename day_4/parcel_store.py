@@ -0,0 +1,454 @@
+"""Indexed, memory-mapped columnar store for the parcel data.
+
+The parcel notebooks read ``parcel_data.csv`` with pandas on every run, and
+every lookup after that is a full scan. ``ParcelStore`` converts the CSV
+once into a directory of ``.npy`` columns that are memory-mapped on open,
+so a query only pages in the parts of the columns it touches:
+
+- categorical columns (cities, countries, status, carrier) are
+  dictionary-encoded: small integer codes per row, values listed once in
+  ``meta.json``
+- dates are int32 days, numbers keep their dtype (worked out over the
+  whole CSV, or given as ``dtypes``; a value that doesn't fit it is an
+  error, never rounded), and other text is UTF-8 bytes with an offsets
+  array
+- ``ParcelID`` has a hash index (sorted 64-bit BLAKE2b hashes plus the row
+  of each), so a point lookup is a binary search
+- ``CurrentStatus``, ``ReceiverCity`` and ``DeliveryService`` have
+  secondary indexes: each segment's rows grouped by code (CSR), so a
+  filter reads only the matching rows' positions
+
+Rows are stored in append-only segments. ``append`` writes a new segment
+and then swaps in a new ``meta.json``, so readers never see half an append.
+
+    store = ParcelStore.from_csv("day_4/parcel_data.csv", "parcel_store")
+    store.get("PCL1001")
+    store.query(CurrentStatus="In Transit", ReceiverCity=["Miami", "Boston"])
+    store.append(new_rows_frame)
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+KEY = "ParcelID"
+CATEGORICAL = ("SenderCity", "SenderCountry", "ReceiverCity", "ReceiverCountry", "CurrentStatus", "DeliveryService")
+DATES = ("ShipmentDate", "EstimatedDeliveryDate")
+INDEXED = ("CurrentStatus", "ReceiverCity", "DeliveryService")
+META = "meta.json"
+# Dates are stored as int32 days since 1970-01-01, with this for a missing date
+NO_DATE = np.iinfo(np.int32).min
+
+
+def _hash(key):
+    # 64 bits of BLAKE2b: stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _write_atomic_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out_file:
+        json.dump(data, out_file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _csv_dtypes(csv_path, chunksize):
+    # pandas infers each chunk's dtypes on its own (whole numbers in one
+    # chunk, decimals in the next); widen them over the whole file
+    numeric, text = {}, set()
+    for frame in pd.read_csv(csv_path, chunksize=chunksize):
+        for name, dtype in frame.dtypes.items():
+            if pd.api.types.is_numeric_dtype(dtype):
+                numeric[name] = np.result_type(numeric.get(name, dtype), dtype)
+            else:
+                text.add(name)
+    # A column that isn't numeric in every chunk is text throughout
+    return {name: str if name in text else dtype for name, dtype in numeric.items()}
+
+
+def _to_number(column, values, dtype):
+    if values.hasnans and dtype.kind in "iu":
+        raise ValueError(f"{column} is stored as integers but has missing values")
+    array = values.to_numpy()
+    try:
+        stored = array.astype(dtype)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{column} can't be stored as {dtype}: {e}") from None
+    same = stored == array
+    if dtype.kind == "f":
+        same |= np.isnan(stored) & values.isna().to_numpy()
+    if not same.all():
+        raise ValueError(f"{column} is stored as {dtype}, which would change {array[~same][0]!r}")
+    return stored
+
+
+def _code_dtype(size):
+    return np.int16 if size < 2**15 else np.int32
+
+
+def _position_dtype(size):
+    # Row numbers and byte offsets within a segment
+    return np.int32 if size < 2**31 else np.int64
+
+
+class ParcelStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META), encoding="utf-8") as meta_file:
+            self.meta = json.load(meta_file)
+        self._arrays = {}
+        # Per categorical column: {value: code} and its CategoricalDtype,
+        # both rebuilt after an append adds values
+        self._codes = {}
+        self._dtypes = {}
+
+    @classmethod
+    def create(cls, path, frame, key=KEY, categorical=CATEGORICAL, dates=DATES, indexed=INDEXED, dtypes=None):
+        """A new store at ``path`` whose columns are typed after ``frame``, holding its rows.
+
+        ``dtypes`` overrides the dtype of any numeric column, e.g. when
+        ``frame`` is only the first part of the data.
+        """
+        columns = {}
+        for name, dtype in frame.dtypes.items():
+            dtype = (dtypes or {}).get(name, dtype)
+            if name in categorical:
+                columns[name] = {"kind": "category", "values": []}
+            elif name in dates:
+                columns[name] = {"kind": "date"}
+            elif pd.api.types.is_numeric_dtype(dtype) and name != key:
+                columns[name] = {"kind": "number", "dtype": np.dtype(dtype).str}
+            else:
+                columns[name] = {"kind": "string"}
+        not_indexable = [name for name in indexed if columns.get(name, {}).get("kind") != "category"]
+        if key not in columns or not_indexable:
+            raise ValueError(f"The key and indexed columns must be in the data, and indexed ones categorical: "
+                             f"{', '.join([key] * (key not in columns) + not_indexable)}")
+        os.makedirs(os.path.join(path, "segments"))
+        _write_atomic_json(os.path.join(path, META), {
+            "key": key,
+            "indexed": list(indexed),
+            "columns": columns,
+            "segments": [],
+        })
+        store = cls(path)
+        store.append(frame)
+        return store
+
+    @classmethod
+    def from_csv(cls, csv_path, path, chunksize=1_000_000, dtypes=None, **options):
+        """Convert ``csv_path`` into a store at ``path``, one segment per ``chunksize`` rows.
+
+        Without ``dtypes`` (column -> dtype) the CSV is read twice: once to
+        type the columns over every row, then to store them.
+        """
+        if dtypes is None:
+            dtypes = _csv_dtypes(csv_path, chunksize)
+        store = None
+        for frame in pd.read_csv(csv_path, chunksize=chunksize, dtype=dtypes):
+            if store is None:
+                store = cls.create(path, frame, dtypes=dtypes, **options)
+            else:
+                store.append(frame)
+        return store
+
+    def __len__(self):
+        return sum(segment["rows"] for segment in self.meta["segments"])
+
+    @property
+    def columns(self):
+        return list(self.meta["columns"])
+
+    def append(self, frame):
+        """Add ``frame``'s rows as a new segment; their keys must be new."""
+        columns = self.meta["columns"]
+        if list(frame.columns) != list(columns):
+            raise ValueError(f"Expected the columns {list(columns)}, got {list(frame.columns)}")
+        if not len(frame):
+            return
+        key = self.meta["key"]
+        if frame[key].isna().any():
+            raise ValueError(f"Every row needs a {key}")
+        keys = frame[key].astype(str)
+        if keys.duplicated().any():
+            raise ValueError(f"{key} must be unique")
+        existing = self._stored_keys(keys)
+        if existing:
+            raise ValueError(f"{len(existing)} {key}s are already stored, e.g. {existing[0]}")
+
+        # Work on a copy, so a failed append leaves no new dictionary values behind
+        meta = json.loads(json.dumps(self.meta))
+        name = f"{len(meta['segments']):06d}"
+        segment_dir = os.path.join(self.path, "segments", name)
+        tmp_dir = f"{segment_dir}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir)
+        missing = []
+        try:
+            for column, spec in meta["columns"].items():
+                if self._write_column(tmp_dir, column, spec, frame[column]):
+                    missing.append(column)
+            self._write_key_index(tmp_dir, key, keys)
+            for column in meta["indexed"]:
+                codes = np.load(os.path.join(tmp_dir, f"{column}.npy"))
+                self._write_secondary_index(tmp_dir, column, codes, len(meta["columns"][column]["values"]))
+            os.replace(tmp_dir, segment_dir)
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir)
+        meta["segments"].append({"name": name, "rows": len(frame), "missing": missing})
+        _write_atomic_json(os.path.join(self.path, META), meta)
+        self.meta = meta
+        self._codes.clear()
+        self._dtypes.clear()
+
+    def get(self, key):
+        """The row with this key as a dict, or None."""
+        location = self.locate(key)
+        if location is None:
+            return None
+        segment, row = location
+        values = {}
+        for column, spec in self.meta["columns"].items():
+            if spec["kind"] == "category":
+                code = int(self._array(segment, column)[row])
+                values[column] = spec["values"][code] if code >= 0 else None
+            elif spec["kind"] == "string":
+                values[column] = self._string(segment, column, row)
+            elif spec["kind"] == "date":
+                values[column] = pd.Timestamp(self._dates(segment, column, [row])[0])
+            else:
+                values[column] = self._array(segment, column)[row].item()
+        return values
+
+    def locate(self, key):
+        """``(segment, row)`` of the row with this key, or None."""
+        # Keys are stored as text, whatever their type in the CSV
+        key = str(key)
+        target = np.uint64(_hash(key))
+        key_column = self.meta["key"]
+        for segment in range(len(self.meta["segments"])):
+            hashes = self._array(segment, f"{key_column}.hash")
+            order = self._array(segment, f"{key_column}.rows")
+            start = np.searchsorted(hashes, target)
+            # Equal hashes are adjacent; compare the keys themselves in case of a collision
+            while start < len(hashes) and hashes[start] == target:
+                row = int(order[start])
+                if self._string(segment, key_column, row) == key:
+                    return segment, row
+                start += 1
+        return None
+
+    def where(self, **filters):
+        """Per segment, the sorted rows matching every filter.
+
+        A filter is a value or a list of values (matching any of them).
+        Filters on indexed columns read the index; other categorical
+        columns compare codes; anything else is checked row by row.
+        """
+        unknown = [column for column in filters if column not in self.meta["columns"]]
+        if unknown:
+            raise KeyError(f"Unknown columns: {', '.join(unknown)}")
+        wanted = {column: value if isinstance(value, (list, tuple, set)) else [value]
+                  for column, value in filters.items()}
+        indexed = [column for column in wanted if column in self.meta["indexed"]]
+        matches = []
+        for segment, info in enumerate(self.meta["segments"]):
+            rows = None
+            # Start from the indexed filter with the fewest rows, then narrow
+            for column in sorted(indexed, key=lambda column: self._index_count(segment, column, wanted[column])):
+                found = self._index_rows(segment, column, wanted[column])
+                rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+                if not len(rows):
+                    break
+            if rows is None:
+                rows = np.arange(info["rows"])
+            for column, values in wanted.items():
+                if column in indexed or not len(rows):
+                    continue
+                rows = rows[self._matches(segment, column, values, rows)]
+            matches.append(rows)
+        return matches
+
+    def query(self, columns=None, **filters):
+        """The rows matching ``filters`` as a DataFrame, with ``columns`` (default all)."""
+        frames = [self._rows(segment, rows, columns)
+                  for segment, rows in enumerate(self.where(**filters)) if len(rows)]
+        if not frames:
+            return self._rows(0, np.array([], dtype=np.int64), columns) if self.meta["segments"] else pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def count(self, **filters):
+        return sum(len(rows) for rows in self.where(**filters))
+
+    def to_frame(self, columns=None):
+        return self.query(columns)
+
+    def _stored_keys(self, keys):
+        # The keys that are already in some segment, checked by hash a segment at a time
+        key_column = self.meta["key"]
+        keys = keys.tolist()
+        hashes = np.fromiter(map(_hash, keys), dtype=np.uint64, count=len(keys))
+        stored = []
+        for segment in range(len(self.meta["segments"])):
+            segment_hashes = self._array(segment, f"{key_column}.hash")
+            for position in np.flatnonzero(np.isin(hashes, segment_hashes)):
+                if self.locate(keys[position]) is not None:
+                    stored.append(keys[position])
+        return stored
+
+    def _array(self, segment, name):
+        cache_key = segment, name
+        if cache_key not in self._arrays:
+            path = os.path.join(self.path, "segments", self.meta["segments"][segment]["name"], f"{name}.npy")
+            # A plain ndarray over the mapping; np.memmap's subclass hooks slow every lookup
+            self._arrays[cache_key] = np.load(path, mmap_mode="r").view(np.ndarray)
+        return self._arrays[cache_key]
+
+    def _write_column(self, segment_dir, column, spec, values):
+        # Returns whether a missing-value mask was written
+        kind = spec["kind"]
+        if kind == "category":
+            known = set(spec["values"])
+            spec["values"] += sorted(value for value in values.dropna().unique().tolist() if value not in known)
+            codes = pd.Categorical(values, categories=spec["values"]).codes
+            np.save(os.path.join(segment_dir, f"{column}.npy"), codes.astype(_code_dtype(len(spec["values"]))))
+            return False
+        if kind == "date":
+            dates = pd.to_datetime(values, errors="raise").to_numpy().astype("datetime64[D]")
+            days = np.where(np.isnat(dates), NO_DATE, dates.astype(np.int64)).astype(np.int32)
+            np.save(os.path.join(segment_dir, f"{column}.npy"), days)
+            return False
+        if kind == "number":
+            stored = _to_number(column, values, np.dtype(spec["dtype"]))
+            np.save(os.path.join(segment_dir, f"{column}.npy"), stored)
+            return False
+        missing = values.isna().to_numpy()
+        encoded = [b"" if absent else str(value).encode("utf-8")
+                   for value, absent in zip(values.tolist(), missing)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        np.save(os.path.join(segment_dir, f"{column}.offsets.npy"), offsets.astype(_position_dtype(offsets[-1])))
+        np.save(os.path.join(segment_dir, f"{column}.data.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        if not missing.any():
+            return False
+        np.save(os.path.join(segment_dir, f"{column}.missing.npy"), missing)
+        return True
+
+    def _write_key_index(self, segment_dir, column, keys):
+        hashes = np.fromiter(map(_hash, keys.tolist()), dtype=np.uint64, count=len(keys))
+        order = np.argsort(hashes, kind="stable")
+        np.save(os.path.join(segment_dir, f"{column}.hash.npy"), hashes[order])
+        np.save(os.path.join(segment_dir, f"{column}.rows.npy"), order.astype(_position_dtype(len(keys))))
+
+    def _write_secondary_index(self, segment_dir, column, codes, size):
+        present = codes >= 0
+        order = np.argsort(codes, kind="stable")[np.count_nonzero(~present):]
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes[present], minlength=size), out=offsets[1:])
+        np.save(os.path.join(segment_dir, f"{column}.index.offsets.npy"), offsets)
+        np.save(os.path.join(segment_dir, f"{column}.index.rows.npy"), order.astype(_position_dtype(len(codes))))
+
+    def _codes_for(self, column, values):
+        if column not in self._codes:
+            self._codes[column] = {value: code for code, value in enumerate(self.meta["columns"][column]["values"])}
+        lookup = self._codes[column]
+        return [lookup[value] for value in values if value in lookup]
+
+    def _index_ranges(self, segment, column, values):
+        offsets = self._array(segment, f"{column}.index.offsets")
+        # Codes added by later appends are past the end of older segments' offsets
+        return [(offsets[code], offsets[code + 1]) for code in self._codes_for(column, values)
+                if code + 1 < len(offsets)]
+
+    def _index_count(self, segment, column, values):
+        return sum(end - start for start, end in self._index_ranges(segment, column, values))
+
+    def _index_rows(self, segment, column, values):
+        rows = self._array(segment, f"{column}.index.rows")
+        found = [rows[start:end] for start, end in self._index_ranges(segment, column, values)]
+        return np.sort(np.concatenate(found)) if found else np.array([], dtype=np.int64)
+
+    def _matches(self, segment, column, values, rows):
+        kind = self.meta["columns"][column]["kind"]
+        if kind == "category":
+            return np.isin(self._array(segment, column)[rows], self._codes_for(column, values))
+        if kind == "string":
+            return self._string_matches(segment, column, values, rows)
+        if kind == "date":
+            return np.isin(self._dates(segment, column, rows), pd.to_datetime(list(values)).to_numpy().astype("datetime64[D]"))
+        return np.isin(self._array(segment, column)[rows], list(values))
+
+    def _string_matches(self, segment, column, values, rows):
+        # Compares bytes without decoding: only rows of the right length are
+        # read, as one (rows x length) block per value
+        offsets = self._array(segment, f"{column}.offsets")
+        data = self._array(segment, f"{column}.data")
+        starts = offsets[rows].astype(np.int64)
+        lengths = offsets[rows + 1] - starts
+        matches = np.zeros(len(rows), dtype=bool)
+        for value in values:
+            target = np.frombuffer(str(value).encode("utf-8"), dtype=np.uint8)
+            candidates = np.flatnonzero(lengths == len(target))
+            if len(candidates) and len(target):
+                block = data[starts[candidates, None] + np.arange(len(target))]
+                candidates = candidates[(block == target).all(axis=1)]
+            matches[candidates] = True
+        if column in self.meta["segments"][segment]["missing"]:
+            matches &= ~self._array(segment, f"{column}.missing")[rows]
+        return matches
+
+    def _dates(self, segment, column, rows):
+        days = self._array(segment, column)[rows].astype(np.int64)
+        days[days == NO_DATE] = np.iinfo(np.int64).min  # NaT
+        return days.view("datetime64[D]")
+
+    def _string(self, segment, column, row):
+        if column in self.meta["segments"][segment]["missing"] and self._array(segment, f"{column}.missing")[row]:
+            return None
+        offsets = self._array(segment, f"{column}.offsets")
+        return self._array(segment, f"{column}.data")[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def _strings(self, segment, column, rows):
+        offsets = self._array(segment, f"{column}.offsets")
+        data = self._array(segment, f"{column}.data")
+        if not len(rows):
+            return []
+        starts = offsets[rows].astype(np.int64)
+        ends = offsets[rows + 1].astype(np.int64)
+        low, high = int(starts.min()), int(ends.max())
+        if high - low <= 4 * int((ends - starts).sum()) + 4096:
+            # Dense enough to copy the whole span once
+            buffer = data[low:high].tobytes()
+            starts -= low
+            ends -= low
+        else:
+            # Gather just the rows' bytes, back to back, in one read
+            lengths = ends - starts
+            ends = np.cumsum(lengths)
+            buffer = data[np.arange(ends[-1]) + np.repeat(starts - (ends - lengths), lengths)].tobytes()
+            starts = ends - lengths
+        strings = [buffer[start:end].decode("utf-8") for start, end in zip(starts.tolist(), ends.tolist())]
+        if column in self.meta["segments"][segment]["missing"]:
+            for position in np.flatnonzero(self._array(segment, f"{column}.missing")[rows]):
+                strings[position] = None
+        return strings
+
+    def _rows(self, segment, rows, columns=None):
+        data = {}
+        for column in columns or self.columns:
+            spec = self.meta["columns"][column]
+            if spec["kind"] == "category":
+                if column not in self._dtypes:
+                    self._dtypes[column] = pd.CategoricalDtype(spec["values"])
+                codes = np.asarray(self._array(segment, column)[rows])
+                data[column] = pd.Categorical.from_codes(codes, dtype=self._dtypes[column])
+            elif spec["kind"] == "string":
+                data[column] = self._strings(segment, column, rows)
+            elif spec["kind"] == "date":
+                data[column] = self._dates(segment, column, rows)
+            else:
+                data[column] = np.asarray(self._array(segment, column)[rows])
+        return pd.DataFrame(data)
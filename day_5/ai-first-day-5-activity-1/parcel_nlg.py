@@ -0,0 +1,141 @@
+"""Chunked, column-wise rendering of the Day 5 NLG template.
+
+The notebook fills the generated template with
+``df.apply(lambda row: populate_template(template, row), axis=1)``, which
+builds a dict per row and keeps every paragraph in memory before
+``save_content_to_txt`` writes them out. Here the template is compiled once
+into a positional format string, the CSV is read ``chunksize`` rows at a
+time (only the columns the template uses, with dtypes worked out over the
+whole file first, since pandas infers them per chunk), missing values are
+replaced by ``"N/A"`` a column at a time, and each chunk's paragraphs are
+written to the txt file before the next chunk is read, so memory stays
+bounded by the chunk size however long the file is.
+
+    template = generate_template(...)
+    count = render_csv_to_txt(template, "parcel_data.csv", "nlg.txt")
+
+The output matches ``populate_template`` plus ``save_content_to_txt``:
+format specs and conversions (``{ParcelWeight:.1f}``, ``{SenderName!r}``)
+behave as in ``str.format``, and paragraphs are separated by a blank line.
+"""
+import os
+import re
+import string
+
+import numpy as np
+import pandas as pd
+
+MISSING = "N/A"
+SEPARATOR = "\n\n"
+# A field name up to its first attribute or index lookup: "Parcel.weight" -> "Parcel"
+FIELD_COLUMN = re.compile(r"[^.\[]*")
+
+
+def _escape(literal):
+    return literal.replace("{", "{{").replace("}", "}}")
+
+
+def compile_template(template):
+    """Return ``(format_string, columns)`` with each field replaced by its column's position.
+
+    ``format_string.format(*values)`` with one value per entry of ``columns``
+    gives the same text as ``template.format(**row)``.
+    """
+    pieces = []
+    columns = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(template):
+        pieces.append(_escape(literal))
+        if field_name is None:
+            continue
+        column = FIELD_COLUMN.match(field_name).group()
+        if not column or column.isdigit():
+            raise ValueError(f"Template fields must name a column, got {{{field_name}}}")
+        if "{" in format_spec:
+            raise ValueError(f"Nested fields in format specs are not supported: {{{field_name}:{format_spec}}}")
+        if column not in columns:
+            columns.append(column)
+        field = str(columns.index(column)) + field_name[len(column):]
+        if conversion:
+            field += "!" + conversion
+        if format_spec:
+            field += ":" + format_spec
+        pieces.append("{" + field + "}")
+    return "".join(pieces), columns
+
+
+def render_frame(template, frame, missing=MISSING):
+    """The paragraphs for every row of ``frame``, as a list of strings."""
+    format_string, columns = compile_template(template)
+    return _render(format_string, columns, frame, missing)
+
+
+def _render(format_string, columns, frame, missing):
+    absent = [column for column in columns if column not in frame.columns]
+    if absent:
+        raise KeyError(f"Template uses columns missing from the data: {', '.join(absent)}")
+    values = []
+    for column in columns:
+        series = frame[column]
+        if series.hasnans:
+            series = series.astype(object).where(series.notna(), missing)
+        values.append(series.tolist())
+    return list(map(format_string.format, *values))
+
+
+def csv_dtypes(csv_path, chunksize=20_000, **read_csv_kwargs):
+    """The dtypes ``pd.read_csv`` would give ``csv_path``'s columns if read whole, found a chunk at a time.
+
+    A column read in chunks can come out as int64 in one chunk and float64
+    (a gap) or text in another, which changes how its values render.
+    Numeric columns get the widest dtype seen; a column that is text in any
+    chunk is text throughout.
+    """
+    numeric, text = {}, set()
+    for frame in pd.read_csv(csv_path, chunksize=chunksize, **read_csv_kwargs):
+        for column, dtype in frame.dtypes.items():
+            if pd.api.types.is_numeric_dtype(dtype):
+                numeric[column] = np.result_type(numeric.get(column, dtype), dtype)
+            else:
+                text.add(column)
+    return {column: str if column in text else dtype for column, dtype in numeric.items()}
+
+
+def iter_paragraphs(template, csv_path, chunksize=20_000, missing=MISSING, **read_csv_kwargs):
+    """Yield the paragraphs of ``csv_path`` one chunk (a list of strings) at a time.
+
+    Without a ``dtype`` in ``read_csv_kwargs`` the CSV is read twice, the
+    first time by ``csv_dtypes``, so every chunk renders like a full read.
+    """
+    format_string, columns = compile_template(template)
+    read_csv_kwargs.setdefault("usecols", columns)
+    if "dtype" not in read_csv_kwargs:
+        read_csv_kwargs["dtype"] = csv_dtypes(csv_path, chunksize, **read_csv_kwargs)
+    for frame in pd.read_csv(csv_path, chunksize=chunksize, **read_csv_kwargs):
+        yield _render(format_string, columns, frame, missing)
+
+
+def write_paragraphs(chunks, txt_path, separator=SEPARATOR):
+    """Write each chunk of paragraphs to ``txt_path`` as it arrives and return the count.
+
+    The file is written under a temporary name and renamed when complete,
+    so an interrupted run never leaves a truncated ``txt_path`` behind.
+    """
+    count = 0
+    tmp_path = f"{txt_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as txt_file:
+            for paragraphs in chunks:
+                if paragraphs:
+                    txt_file.write(separator.join(paragraphs) + separator)
+                    count += len(paragraphs)
+        os.replace(tmp_path, txt_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def render_csv_to_txt(template, csv_path, txt_path, chunksize=20_000, missing=MISSING, **read_csv_kwargs):
+    """Render every row of ``csv_path`` into ``txt_path``; returns the number of paragraphs."""
+    chunks = iter_paragraphs(template, csv_path, chunksize=chunksize, missing=missing, **read_csv_kwargs)
+    return write_paragraphs(chunks, txt_path)
@@ -0,0 +1,217 @@
+"""Sharded, parallel PDF export of the parcel paragraphs.
+
+``save_content_to_pdf`` in the notebook adds every paragraph to one FPDF
+document on a single core and only writes it out at the end, so the whole
+document sits in memory. ``export_pdf`` instead cuts the paragraphs into
+shards of ``shard_size``, renders each shard to its own PDF on a process
+pool (same page layout as the notebook) and then either
+
+- leaves them as numbered files of at most ``max_pages`` pages each
+  (split between paragraphs, so a single paragraph longer than a page can
+  still overflow), named after ``out_path``:
+  ``report.pdf`` -> ``report-00001-001.pdf``, ``report-00001-002.pdf``, ...
+- or, with ``max_pages=None``, merges the shards, in order, into one PDF at
+  ``out_path`` (needs ``pypdf``). pypdf holds every page of the merged
+  document until it is written, so the parent's memory grows with the
+  output again; the split is the default for that reason.
+
+At most two shards per worker are in flight, so paragraphs can be streamed
+from ``parcel_nlg.iter_paragraphs`` without holding them all.
+``on_progress`` is called in the parent as each shard finishes, with a
+dict of the shard's number, paragraph and page counts, files and seconds.
+If a shard fails, shards not yet started are cancelled and the files of
+every submitted shard are removed before the error propagates.
+
+    paragraphs = itertools.chain.from_iterable(iter_paragraphs(template, "parcel_data.csv"))
+    export_pdf(paragraphs, "nlg.pdf", on_progress=print)
+"""
+import concurrent.futures
+import glob
+import itertools
+import math
+import os
+import time
+
+from fpdf import FPDF
+
+from parcel_nlg import iter_paragraphs
+
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+FONT = "Arial"
+FONT_SIZE = 12
+LINE_HEIGHT = 10
+MARGIN = 15
+# Pages per file unless export_pdf is asked to merge
+MAX_PAGES = 500
+
+
+def _new_document():
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=MARGIN)
+    pdf.set_font(FONT, size=FONT_SIZE)
+    return pdf
+
+
+def _add_paragraph(pdf, para):
+    pdf.multi_cell(0, LINE_HEIGHT, para)
+    pdf.ln()  # Add a line break between paragraphs
+
+
+def write_pdf(paragraphs, pdf_filename):
+    """One PDF with every paragraph, laid out like the notebook's; returns its page count."""
+    pdf = _new_document()
+    for para in paragraphs:
+        _add_paragraph(pdf, para)
+    pdf.output(pdf_filename)
+    return pdf.page_no()
+
+
+def _fits(pdf, para):
+    # Whether para certainly fits on the current page. Wrapping at spaces
+    # leaves less than the widest word unused per line, so this errs short.
+    width = pdf.w - pdf.l_margin - pdf.r_margin - 2 * pdf.c_margin
+    lines = 0
+    for line in para.split("\n"):
+        words = line.split(" ")
+        slack = min(max(pdf.get_string_width(word) for word in words), width / 2)
+        lines += max(1, math.ceil(pdf.get_string_width(line) / (width - slack)))
+    return pdf.get_y() + lines * LINE_HEIGHT <= pdf.page_break_trigger
+
+
+def _shards(paragraphs, shard_size):
+    paragraphs = iter(paragraphs)
+    while True:
+        shard = list(itertools.islice(paragraphs, shard_size))
+        if not shard:
+            return
+        yield shard
+
+
+def _shard_path(stem, number, part=None):
+    if part is None:
+        return f"{stem}-{number:05d}.pdf"
+    return f"{stem}-{number:05d}-{part:03d}.pdf"
+
+
+def _shard_files(stem, number, max_pages):
+    # Whatever a shard may have written so far, collected or not
+    if max_pages is None:
+        paths = [_shard_path(stem, number)]
+    else:
+        paths = glob.glob(f"{glob.escape(stem)}-{number:05d}-[0-9]*.pdf")
+    return [path for path in paths if os.path.exists(path)]
+
+
+def _render_shard(number, paragraphs, stem, max_pages):
+    # Runs in a worker process. fpdf's exceptions don't unpickle, which would
+    # break the whole pool, so failures come back as a plain RuntimeError
+    try:
+        return _write_shard(number, paragraphs, stem, max_pages)
+    except Exception as e:
+        raise RuntimeError(f"Shard {number} failed: {type(e).__name__}: {e}") from None
+
+
+def _write_shard(number, paragraphs, stem, max_pages):
+    # Writes <stem>-<shard>.pdf, or with max_pages <stem>-<shard>-<part>.pdf
+    # files of at most max_pages pages each
+    started = time.perf_counter()
+    files = []
+    pages = 0
+    pdf = _new_document()
+    for para in paragraphs:
+        # Start the next part on a paragraph boundary, before the last allowed page overflows
+        if max_pages is not None and pdf.page_no() >= max_pages and not _fits(pdf, para):
+            files.append(_shard_path(stem, number, len(files) + 1))
+            pdf.output(files[-1])
+            pages += pdf.page_no()
+            pdf = _new_document()
+        _add_paragraph(pdf, para)
+    files.append(_shard_path(stem, number, None if max_pages is None else len(files) + 1))
+    pdf.output(files[-1])
+    pages += pdf.page_no()
+    return {
+        "shard": number,
+        "paragraphs": len(paragraphs),
+        "pages": pages,
+        "files": files,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def merge_pdfs(paths, out_path):
+    """Concatenate ``paths`` in order into ``out_path``."""
+    if PdfWriter is None:
+        raise ImportError("Merging shards needs pypdf (pip install pypdf), or pass max_pages to keep them as files")
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(path)
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as out_file:
+            writer.write(out_file)
+        os.replace(tmp_path, out_path)
+    finally:
+        writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def export_pdf(paragraphs, out_path, shard_size=2000, workers=None, max_pages=MAX_PAGES, on_progress=None):
+    """Render ``paragraphs`` into page-bounded files (or one merged ``out_path``) on a process pool.
+
+    Returns the list of files written, in reading order.
+    """
+    if max_pages is None and PdfWriter is None:
+        raise ImportError("Merging shards needs pypdf (pip install pypdf), or pass max_pages to keep them as files")
+    stem = os.path.splitext(out_path)[0] if max_pages is not None else f"{out_path}.shard"
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    submitted = 0
+    complete = False
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            try:
+                pending = set()
+                for number, shard in enumerate(_shards(paragraphs, shard_size), start=1):
+                    pending.add(pool.submit(_render_shard, number, shard, stem, max_pages))
+                    submitted = number
+                    if len(pending) >= 2 * workers:
+                        finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        _collect(finished, results, on_progress)
+                _collect(concurrent.futures.as_completed(pending), results, on_progress)
+            except BaseException:
+                # Drop the shards not started yet; leaving the block waits for the running ones
+                pool.shutdown(cancel_futures=True)
+                raise
+        files = [path for number in sorted(results) for path in results[number]["files"]]
+        if max_pages is not None:
+            complete = True
+            return files
+        merge_pdfs(files, out_path)
+        return [out_path]
+    finally:
+        # Shards are only kept when they are the whole output. By now no worker
+        # is writing, so this also catches files of shards never collected.
+        if max_pages is None or not complete:
+            for number in range(1, submitted + 1):
+                for path in _shard_files(stem, number, max_pages):
+                    os.remove(path)
+
+
+def _collect(futures, results, on_progress):
+    for future in futures:
+        shard = future.result()
+        results[shard["shard"]] = shard
+        if on_progress is not None:
+            on_progress(shard)
+
+
+def render_csv_to_pdf(template, csv_path, out_path, chunksize=20_000, **export_options):
+    """Render every row of ``csv_path`` and export it with ``export_pdf``."""
+    paragraphs = itertools.chain.from_iterable(iter_paragraphs(template, csv_path, chunksize=chunksize))
+    return export_pdf(paragraphs, out_path, **export_options)
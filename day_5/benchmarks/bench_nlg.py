@@ -0,0 +1,136 @@
+"""Rows/second and peak memory of the parcel NLG renderer on generated data.
+
+Writes ``--rows`` synthetic parcels shaped like day_4/parcel_data.csv (a
+few percent of receiver addresses left blank), then renders them to a txt
+file with the notebook's approach (read the whole CSV, ``df.apply`` row
+by row, then ``save_content_to_txt``) on the first ``--baseline-rows``
+rows, and with ``parcel_nlg.render_csv_to_txt`` on all of them. Each run
+happens in a fresh process so its peak RSS is its own; the two outputs are
+checked to agree on the rows both rendered.
+
+    python day_5/benchmarks/bench_nlg.py --rows 2000000 --baseline-rows 200000
+"""
+import argparse
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+DAY_5 = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(os.path.join(DAY_5, "ai-first-day-5-activity-1"))
+
+from parcel_nlg import render_csv_to_txt
+
+SAMPLE_CSV = os.path.join(DAY_5, os.pardir, "day_4", "parcel_data.csv")
+# The template the notebook's generate_template produced for nlg.txt
+TEMPLATE = (
+    '"Parcel {ParcelID}, sent by {SenderName} from {SenderAddress}, {SenderCity}, {SenderCountry}, '
+    "is currently {CurrentStatus}. It is addressed to {ReceiverName} at {ReceiverAddress}, "
+    "{ReceiverCity}, {ReceiverCountry}. The parcel weighs {ParcelWeight} kg and has dimensions of "
+    "{ParcelDimensions}. It was shipped on {ShipmentDate} and is estimated to be delivered by "
+    "{EstimatedDeliveryDate} via {DeliveryService}. You can track it using the following link: "
+    '{TrackingURL}."'
+)
+
+
+def generate_parcels(path, rows, seed=0, chunk=500_000):
+    """Write ``rows`` parcels to ``path``, drawing names and places from the sample data."""
+    sample = pd.read_csv(SAMPLE_CSV)
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk):
+        size = min(chunk, rows - start)
+        ids = np.arange(start, start + size)
+        frame = pd.DataFrame({
+            column: sample[column].to_numpy()[rng.integers(len(sample), size=size)]
+            for column in sample.columns
+        })
+        frame["ParcelID"] = [f"PCL{i}" for i in ids + 1000]
+        frame["ParcelWeight"] = rng.uniform(0.1, 30.0, size).round(2)
+        dimensions = rng.integers(10, 100, size=(size, 3))
+        frame["ParcelDimensions"] = [f"{a}x{b}x{c}" for a, b, c in dimensions]
+        frame["TrackingURL"] = [f"https://tracking.example.com/{i}" for i in ids + 1000]
+        frame.loc[rng.random(size) < 0.02, "ReceiverAddress"] = np.nan
+        frame.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def populate_template(template, row):
+    # The notebook's version
+    row_dict = row.to_dict()
+    for key, value in row_dict.items():
+        if pd.isna(value):
+            row_dict[key] = "N/A"
+    return template.format(**row_dict)
+
+
+def notebook_render(csv_path, txt_path, rows):
+    df = pd.read_csv(csv_path, nrows=rows)
+    df["paragraph"] = df.apply(lambda row: populate_template(TEMPLATE, row), axis=1)
+    with open(txt_path, "w", encoding="utf-8") as txt_file:
+        for para in df["paragraph"].to_list():
+            txt_file.write(para + "\n\n")
+    return len(df)
+
+
+def render_csv(csv_path, txt_path, chunksize):
+    return render_csv_to_txt(TEMPLATE, csv_path, txt_path, chunksize=chunksize)
+
+
+def timed(render, *args):
+    started = time.perf_counter()
+    count = render(*args)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return count, time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def in_fresh_process(render, *args):
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(timed, render, *args).result()
+
+
+def same_prefix(path_a, path_b, lines):
+    with open(path_a, encoding="utf-8") as a, open(path_b, encoding="utf-8") as b:
+        return all(x == y for x, y in itertools.islice(zip(a, b), lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--baseline-rows", type=int, default=200_000, help="rows for the row-by-row notebook version")
+    parser.add_argument("--chunksize", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="nlg-") as tmp:
+        csv_path = os.path.join(tmp, "parcels.csv")
+        started = time.perf_counter()
+        # Also in its own process: on Linux a child's peak RSS starts from its parent's
+        in_fresh_process(generate_parcels, csv_path, args.rows, args.seed)
+        print(f"generated {args.rows:,} parcels ({os.path.getsize(csv_path) / 2**20:.0f}MB) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        results = {}
+        for label, render, extra in (
+            ("notebook", notebook_render, (min(args.baseline_rows, args.rows),)),
+            ("chunked", render_csv, (args.chunksize,)),
+        ):
+            txt_path = os.path.join(tmp, f"{label}.txt")
+            count, seconds, peak = in_fresh_process(render, csv_path, txt_path, *extra)
+            results[label] = txt_path
+            print(f"{label:<9} {count:>10,} rows in {seconds:7.2f}s  {count / seconds:>10,.0f} rows/s  "
+                  f"peak RSS {peak / 2**20:6.0f}MB  output {os.path.getsize(txt_path) / 2**20:.0f}MB")
+
+        # Each paragraph is one line followed by a blank one
+        compared = 2 * min(args.baseline_rows, args.rows)
+        print("outputs match" if same_prefix(results["notebook"], results["chunked"], compared) else "OUTPUTS DIFFER")
+
+
+if __name__ == "__main__":
+    main()
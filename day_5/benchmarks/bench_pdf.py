@@ -0,0 +1,112 @@
+"""Paragraphs/second and peak memory of the PDF export, single document vs sharded.
+
+Generates ``--rows`` parcels (see bench_nlg.py) and exports their
+paragraphs three ways, each in a fresh process:
+
+- single: the notebook's ``save_content_to_pdf``, one FPDF document
+- merged: ``export_pdf`` on ``--workers`` processes, merged with pypdf
+  (skipped when pypdf isn't installed)
+- split: ``export_pdf`` with ``--max-pages`` per file, no merge
+
+Peak RSS is reported for the exporting process and for its largest
+worker. Shard progress is printed as it arrives with ``--progress``.
+
+    python day_5/benchmarks/bench_pdf.py --rows 50000 --workers 4 --max-pages 500
+"""
+import argparse
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "ai-first-day-5-activity-1"))
+
+import parcel_pdf
+from bench_nlg import TEMPLATE, generate_parcels
+from parcel_nlg import iter_paragraphs
+
+# ru_maxrss is in KiB on Linux and bytes on macOS
+RSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+
+def paragraphs_of(csv_path):
+    return itertools.chain.from_iterable(iter_paragraphs(TEMPLATE, csv_path))
+
+
+def export_single(csv_path, out_path, **_):
+    # The notebook's path: every paragraph in memory, then one document
+    paragraphs = list(paragraphs_of(csv_path))
+    parcel_pdf.write_pdf(paragraphs, out_path)
+    return len(paragraphs), [out_path]
+
+
+def export_sharded(csv_path, out_path, progress=False, **options):
+    paragraphs = 0
+
+    def on_progress(shard):
+        nonlocal paragraphs
+        paragraphs += shard["paragraphs"]
+        if progress:
+            print(f"    shard {shard['shard']:>4}: {shard['paragraphs']} paragraphs, {shard['pages']} pages "
+                  f"in {shard['seconds']:.2f}s", flush=True)
+
+    files = parcel_pdf.export_pdf(paragraphs_of(csv_path), out_path, on_progress=on_progress, **options)
+    return paragraphs, files
+
+
+def timed(export, *args, **kwargs):
+    started = time.perf_counter()
+    paragraphs, files = export(*args, **kwargs)
+    return {
+        "paragraphs": paragraphs,
+        "seconds": time.perf_counter() - started,
+        "files": len(files),
+        "bytes": sum(os.path.getsize(path) for path in files),
+        "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_SCALE,
+        # Pool workers have exited by now, so they are counted here
+        "worker_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * RSS_SCALE,
+    }
+
+
+def in_fresh_process(fn, *args, **kwargs):
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args, **kwargs).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-size", type=int, default=2000, help="paragraphs per shard")
+    parser.add_argument("--max-pages", type=int, default=parcel_pdf.MAX_PAGES, help="pages per file in the split mode")
+    parser.add_argument("--progress", action="store_true", help="print each shard as it finishes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pdf-") as tmp:
+        csv_path = os.path.join(tmp, "parcels.csv")
+        in_fresh_process(generate_parcels, csv_path, args.rows)
+        sharding = {"workers": args.workers, "shard_size": args.shard_size, "progress": args.progress}
+        modes = [("single", export_single, {})]
+        if parcel_pdf.PdfWriter is not None:
+            modes.append(("merged", export_sharded, dict(sharding, max_pages=None)))
+        else:
+            print("pypdf is not installed; skipping the merged mode")
+        modes.append(("split", export_sharded, dict(sharding, max_pages=args.max_pages)))
+
+        for label, export, options in modes:
+            print(f"{label}:", flush=True)
+            result = in_fresh_process(timed, export, csv_path, os.path.join(tmp, f"{label}.pdf"), **options)
+            line = (f"  {result['paragraphs']:,} paragraphs in {result['seconds']:.1f}s "
+                    f"({result['paragraphs'] / result['seconds']:,.0f}/s) -> {result['files']} file(s), "
+                    f"{result['bytes'] / 2**20:.0f}MB; peak RSS {result['rss'] / 2**20:.0f}MB")
+            if result["worker_rss"]:
+                line += f", largest worker {result['worker_rss'] / 2**20:.0f}MB"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Chunked rendering matches rendering the whole CSV, whichever chunk a value lands in.
+
+    python -m pytest day_5/tests
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "ai-first-day-5-activity-1"))
+
+from parcel_nlg import iter_paragraphs, render_csv_to_txt
+
+TEMPLATE = "Parcel {ParcelID} weighs {ParcelWeight} kg ({Boxes} boxes, {Boxes:>3}), code {Code}."
+# Boxes is whole numbers except for one gap, Code is numbers until its last row
+CSV = """ParcelID,ParcelWeight,Boxes,Code
+PCL1,1,1,10
+PCL2,2,2,20
+PCL3,3.5,,30
+PCL4,4,4,40
+PCL5,5,5,X50
+"""
+
+
+def populate_template(template, row):
+    # The notebook's row-at-a-time version
+    row_dict = row.to_dict()
+    for key, value in row_dict.items():
+        if pd.isna(value):
+            row_dict[key] = "N/A"
+    return template.format(**row_dict)
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "parcels.csv"
+    path.write_text(CSV, encoding="utf-8")
+    return str(path)
+
+
+def test_chunked_output_matches_the_notebook(csv_path):
+    df = pd.read_csv(csv_path)
+    expected = df.apply(lambda row: populate_template(TEMPLATE, row), axis=1).tolist()
+    assert expected[0] == "Parcel PCL1 weighs 1.0 kg (1.0 boxes, 1.0), code 10."
+    for chunksize in (1, 2, 3, 10):
+        rendered = [paragraph for chunk in iter_paragraphs(TEMPLATE, csv_path, chunksize=chunksize)
+                    for paragraph in chunk]
+        assert rendered == expected, chunksize
+
+
+def test_given_dtypes_skip_the_schema_pass(csv_path, tmp_path):
+    txt_path = str(tmp_path / "nlg.txt")
+    count = render_csv_to_txt(TEMPLATE, csv_path, txt_path, chunksize=2,
+                              dtype={"ParcelWeight": "float64", "Boxes": "float64", "Code": str})
+    assert count == 5
+    with open(txt_path, encoding="utf-8") as txt_file:
+        assert txt_file.read().split("\n\n")[2] == "Parcel PCL3 weighs 3.5 kg (N/A boxes, N/A), code 30."